@@ -16,24 +16,156 @@ class Settings:
     PINECONE_ENVIRONMENT: str = os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "email-assistant")
     PINECONE_DIMENSION: int = 768  # Gemini embedding dimension
+    PINECONE_HOST: str = os.getenv("PINECONE_HOST", "")  # index host; skips index lookup/creation when set
     
     # File Paths
     BASE_DIR: Path = Path(__file__).resolve().parent.parent
-    DATA_DIR: Path = BASE_DIR / "data"
+    DATA_DIR: Path = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
     INBOX_FILE: Path = DATA_DIR / "inbox.json"
     DRAFTS_FILE: Path = DATA_DIR / "drafts.json"
     PROMPTS_FILE: Path = DATA_DIR / "prompts.json"
+    PREPARED_REPLIES_FILE: Path = DATA_DIR / "prepared_replies.json"
+    
+    # Inbox Snapshot (binary copy of inbox.json that every worker memory-maps)
+    INBOX_SNAPSHOT: bool = os.getenv("INBOX_SNAPSHOT", "true").lower() == "true"
+    INBOX_SNAPSHOT_FILE: Path = DATA_DIR / "inbox.snapshot"  # rewritten on every inbox write
+    
+    # Multi-Tenancy (the X-Tenant-ID header routes /api requests to a mailbox)
+    TENANT_HEADER: str = os.getenv("TENANT_HEADER", "X-Tenant-ID")
+    DEFAULT_TENANT: str = os.getenv("DEFAULT_TENANT", "default")  # requests without the header; uses the files above
+    TENANT_REQUIRED: bool = os.getenv("TENANT_REQUIRED", "false").lower() == "true"  # reject requests without it
+    TENANTS_DIR: Path = Path(os.getenv("TENANTS_DIR", DATA_DIR / "tenants"))  # one directory per other tenant
+    TENANT_CACHE_SIZE: int = int(os.getenv("TENANT_CACHE_SIZE", "64"))  # tenants kept in memory (LRU)
+    
+    # Startup: build services and connect to Pinecone in the background after boot
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    
+    # Health Probes (run in the background; /health/ready serves cached results)
+    HEALTH_PROBE_INTERVAL: float = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+    HEALTH_PROBE_TIMEOUT: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+    HEALTH_FAILURE_THRESHOLD: int = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "2"))  # consecutive failures before 'failing'
     
     # AI Configuration
     GEMINI_MODEL: str = "gemini-2.5-pro"
+    GEMINI_FAST_MODEL: str = os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite")
+    
+    # Per-task model routing; each route can be overridden with MODEL_<TASK>
+    MODEL_ROUTES: dict = {
+        "categorization_fast": os.getenv("MODEL_CATEGORIZATION_FAST", GEMINI_FAST_MODEL),
+        "categorization": os.getenv("MODEL_CATEGORIZATION", GEMINI_MODEL),
+        "reply": os.getenv("MODEL_REPLY", GEMINI_MODEL),
+        "rag": os.getenv("MODEL_RAG", GEMINI_MODEL),
+        "digest_map": os.getenv("MODEL_DIGEST_MAP", GEMINI_FAST_MODEL),
+        "digest_reduce": os.getenv("MODEL_DIGEST_REDUCE", GEMINI_FAST_MODEL),
+    }
+    
+    # Categorization cascade: fast model first, escalate below this confidence
+    CATEGORIZATION_CASCADE: bool = os.getenv("CATEGORIZATION_CASCADE", "true").lower() == "true"
+    CATEGORIZATION_CONFIDENCE_THRESHOLD: float = float(os.getenv("CATEGORIZATION_CONFIDENCE_THRESHOLD", "0.7"))
     GEMINI_EMBEDDING_MODEL: str = "models/embedding-001"
     TEMPERATURE_CATEGORIZATION: float = 0.3
     TEMPERATURE_REPLY: float = 0.7
     MAX_TOKENS: int = 1024
     
+    # Default AI prompts (written on first run and restored by /prompts/reset)
+    DEFAULT_PROMPTS: dict = {
+        "categorization": "Categorize emails as: Urgent (requires immediate action), To-Do (actionable but not urgent), Newsletter (informational), or other. Consider tone, sender authority, and keywords. Return ONLY a JSON array of tag labels like [\"Urgent\", \"To-Do\"].",
+        "reply": "Generate professional, concise replies that are slightly formal but friendly. Keep replies to 2-3 sentences. Match the tone of the original email.",
+        "rag": "You are a helpful assistant with access to the user's email history. Answer questions about tasks, projects, and conversations based on the email content. Be concise and accurate. Only use information from the provided emails."
+    }
+    PROMPTS_RELOAD_INTERVAL: float = float(os.getenv("PROMPTS_RELOAD_INTERVAL", "1.0"))  # seconds between prompts.json mtime checks
+    
+    # Gemini HTTP Client (one pooled async transport shared by all services)
+    GEMINI_API_BASE: str = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    EMBEDDING_TIMEOUT_SECONDS: float = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "15"))
+    INGEST_CONCURRENCY: int = int(os.getenv("INGEST_CONCURRENCY", "32"))  # parallel LLM calls per ingest
+    
+    # Upstream Rate Limiting & Retries (ceilings; limiters back off adaptively)
+    GEMINI_GENERATE_RPS: float = float(os.getenv("GEMINI_GENERATE_RPS", "10"))
+    GEMINI_EMBED_RPS: float = float(os.getenv("GEMINI_EMBED_RPS", "25"))
+    PINECONE_RPS: float = float(os.getenv("PINECONE_RPS", "50"))
+    UPSTREAM_MAX_CONCURRENCY: int = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "64"))
+    RETRY_MAX_ATTEMPTS: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "6"))
+    RETRY_BASE_DELAY: float = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY: float = float(os.getenv("RETRY_MAX_DELAY", "30"))
+    UPSTREAM_DEADLINE_SECONDS: float = float(os.getenv("UPSTREAM_DEADLINE_SECONDS", "120"))
+    
+    # Speculative Replies (pre-generated after ingest for high-priority emails)
+    SPECULATIVE_REPLIES_ENABLED: bool = os.getenv("SPECULATIVE_REPLIES_ENABLED", "true").lower() == "true"
+    SPECULATIVE_REPLY_TAGS: tuple = ("urgent", "to-do")
+    SPECULATIVE_REPLY_BUDGET: int = int(os.getenv("SPECULATIVE_REPLY_BUDGET", "20"))  # max generations per ingest
+    SPECULATIVE_REPLY_CONCURRENCY: int = int(os.getenv("SPECULATIVE_REPLY_CONCURRENCY", "4"))
+    
+    # Local Classifier (tags confident emails during ingest without an LLM call)
+    CLASSIFIER_ENABLED: bool = os.getenv("CLASSIFIER_ENABLED", "true").lower() == "true"
+    CLASSIFIER_FILE: Path = DATA_DIR / "classifier.npz"
+    CLASSIFIER_CONFIDENCE_THRESHOLD: float = float(os.getenv("CLASSIFIER_CONFIDENCE_THRESHOLD", "0.9"))
+    CLASSIFIER_MIN_EXAMPLES: int = int(os.getenv("CLASSIFIER_MIN_EXAMPLES", "50"))  # LLM-tagged emails before first training
+    CLASSIFIER_RETRAIN_EVERY: int = int(os.getenv("CLASSIFIER_RETRAIN_EVERY", "100"))  # new LLM-tagged emails between retrains
+    
     # RAG Configuration
     TOP_K_RESULTS: int = 3
     
+    # Local Vector Index (in-memory search over the embeddings sent to Pinecone)
+    LOCAL_VECTOR_INDEX: bool = os.getenv("LOCAL_VECTOR_INDEX", "false").lower() == "true"
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")  # none | float16 | int8
+    VECTOR_PCA_DIM: int = int(os.getenv("VECTOR_PCA_DIM", "0"))  # 0 = keep all 768 dims
+    VECTOR_RERANK_FACTOR: int = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))  # candidates per result re-ranked in float32
+    VECTORS_FILE: Path = DATA_DIR / "vectors.f32"  # private temp files for the float32 re-rank copies are created beside it
+    VECTOR_CHANGES_FILE: Path = DATA_DIR / "vector_changes.log"  # one byte per change to the namespace, shared by worker processes
+    
+    # Tracing (per-request spans returned in a Server-Timing header)
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_LOG_FILE: str = os.getenv("TRACE_LOG_FILE", "")  # JSON lines, one trace per request; empty = off
+    TRACE_LOG_SAMPLE_RATE: float = float(os.getenv("TRACE_LOG_SAMPLE_RATE", "1.0"))  # slow requests are always logged
+    TRACE_SLOW_MS: float = float(os.getenv("TRACE_SLOW_MS", "2000"))
+    TRACE_PROFILE_SAMPLE_RATE: float = float(os.getenv("TRACE_PROFILE_SAMPLE_RATE", "0"))  # requests stack-sampled
+    TRACE_PROFILE_INTERVAL_MS: float = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5"))
+    TRACE_PROFILE_DIR: Path = Path(os.getenv("TRACE_PROFILE_DIR", DATA_DIR / "profiles"))  # profiles of slow requests
+    
+    # Record / Replay (Gemini and Pinecone calls captured to cassettes for offline runs)
+    CASSETTE_MODE: str = os.getenv("CASSETTE_MODE", "off")  # off | record | replay
+    CASSETTE_DIR: Path = Path(os.getenv("CASSETTE_DIR", DATA_DIR / "cassettes"))
+    CASSETTE_LATENCY: str = os.getenv("CASSETTE_LATENCY", "recorded")  # replay delay: recorded | none | milliseconds
+    
+    # Background Jobs (SQLite queue drained by worker processes)
+    JOB_DB_FILE: Path = Path(os.getenv("JOB_DB_FILE", DATA_DIR / "jobs.sqlite3"))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "1"))  # processes started with the API; 0 = run app.worker yourself
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))  # seconds between polls of an empty queue
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # running jobs not renewed in time are retried
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BACKOFF: float = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # seconds before a retry, doubled per attempt
+    
+    # Mailbox Import (mbox files and EML directories)
+    IMPORT_WORKERS: int = int(os.getenv("IMPORT_WORKERS", "0"))  # parser processes; 0 = one per core
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "500"))  # messages parsed per batch
+    
+    # Conversation Threads (replies grouped by reply headers and normalized subject)
+    THREADING_ENABLED: bool = os.getenv("THREADING_ENABLED", "true").lower() == "true"  # categorize and retrieve per thread
+    THREAD_CONTEXT_CHARS: int = int(os.getenv("THREAD_CONTEXT_CHARS", "6000"))  # conversation text sent to the LLM per thread
+    
+    # Near-Duplicate Detection (SimHash signatures looked up in an LSH index at upload)
+    NEAR_DUPLICATES_ENABLED: bool = os.getenv("NEAR_DUPLICATES_ENABLED", "true").lower() == "true"  # duplicates inherit their cluster's tags
+    NEAR_DUPLICATE_MAX_DISTANCE: int = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "4"))  # SimHash bits (of 64) that may differ
+    NEAR_DUPLICATE_EMBEDDINGS: bool = os.getenv("NEAR_DUPLICATE_EMBEDDINGS", "true").lower() == "true"  # reuse the representative's embedding
+    
+    # Inbox Digest (map: a cached summary per thread; reduce: per day and per tag), refreshed after ingest
+    DIGEST_ENABLED: bool = os.getenv("DIGEST_ENABLED", "true").lower() == "true"
+    DIGEST_FILE: Path = DATA_DIR / "digest.json"
+    DIGEST_MAP_BUDGET: int = int(os.getenv("DIGEST_MAP_BUDGET", "200"))  # max thread summaries per refresh, newest first
+    DIGEST_REDUCE_BATCH: int = int(os.getenv("DIGEST_REDUCE_BATCH", "40"))  # summaries combined per reduce call
+    DIGEST_DAYS: int = int(os.getenv("DIGEST_DAYS", "30"))  # most recent days with a section
+    DIGEST_CONCURRENCY: int = int(os.getenv("DIGEST_CONCURRENCY", "4"))
+    
+    # Draft Autosave (saves coalesced in memory, drafts.json written once per interval and on shutdown)
+    DRAFT_WRITE_BEHIND: bool = os.getenv("DRAFT_WRITE_BEHIND", "true").lower() == "true"  # false: write drafts.json on every save
+    DRAFT_FLUSH_INTERVAL: float = float(os.getenv("DRAFT_FLUSH_INTERVAL", "2.0"))  # seconds a save may wait before reaching disk
+    
     def validate(self) -> None:
         """Validate that required environment variables are set"""
         if not self.GEMINI_API_KEY:
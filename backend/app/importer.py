@@ -0,0 +1,67 @@
+"""
+Import a mailbox export into the inbox
+
+Streams an mbox file, an .eml file or a directory of .eml files (searched
+recursively) message by message, parsing across all cores and writing in
+batches, and reports throughput as it goes:
+
+    python -m app.importer ~/Takeout/Mail/All.mbox
+    python -m app.importer ~/export/eml/ --tenant acme --workers 8
+    python -m app.importer archive.mbox --replace --batch-size 2000
+    
+Run POST /api/emails/ingest (or an "ingest" job) afterwards to tag and
+index the new emails.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from app.services import file_service, tenants
+from app.services.mail_import import FORMATS, ImportReport, import_mailbox
+from app.services.tenancy import validate_tenant_id
+
+
+def print_progress(report: ImportReport) -> None:
+    print(
+        f"\r{report.messages} messages, {report.failed} unreadable "
+        f"({report.messages_per_second:.0f} msgs/sec)",
+        end="", file=sys.stderr, flush=True
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="mbox file, .eml file or directory of .eml files")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: detected from the path)")
+    parser.add_argument("--tenant", help="Mailbox to import into (default: the default tenant)")
+    parser.add_argument("--replace", action="store_true", help="Replace the inbox instead of adding to it")
+    parser.add_argument("--workers", type=int, help="Parser processes (default IMPORT_WORKERS; 0 = one per core)")
+    parser.add_argument("--batch-size", type=int, help="Messages per batch (default IMPORT_BATCH_SIZE)")
+    args = parser.parse_args()
+    
+    if not args.path.exists():
+        parser.error(f"{args.path} does not exist")
+    if args.tenant:
+        try:
+            validate_tenant_id(args.tenant)
+        except ValueError as e:
+            parser.error(str(e))
+        tenants.activate(args.tenant)
+    
+    file_service.ensure_files_exist()
+    report = import_mailbox(
+        args.path,
+        file_service.resolve(),
+        mailbox_format=args.format,
+        replace=args.replace,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        progress=print_progress
+    )
+    print(file=sys.stderr)
+    print(json.dumps(report.to_dict(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
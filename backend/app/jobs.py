@@ -0,0 +1,192 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from app.config import settings
+from app.models import EmailIngestResponse, EmailInternal, Prompts, Tag
+from app.services import (
+    file_service, llm_service, prompt_registry, vector_service,
+    speculative_service, classifier_service, digest_service
+)
+from app.services.metrics import record_cache
+from app.services.near_duplicates import assign_near_duplicates
+from app.services.threads import assign_threads, conversation_text, group_by_thread
+
+
+async def ingest_inbox(prompts: Prompts) -> Tuple[EmailIngestResponse, List[EmailInternal]]:
+    """
+    Categorize emails without tags, save them and update the vector index
+    
+    Shared by POST /api/emails/ingest and the "ingest" job.
+    
+    Returns:
+        The ingest summary and the updated inbox
+    """
+    # Read emails (internal format with ISO timestamps)
+    emails_data = file_service._read_json(file_service.inbox_path)
+    emails_internal = [EmailInternal(**e) for e in emails_data]
+    
+    total_count = len(emails_internal)
+    
+    # Process emails without tags (LLM calls run concurrently)
+    untagged = [email for email in emails_internal if not email.tags]
+    
+    # Near-duplicates of another inbox email take its tags once it has some
+    duplicates = []
+    if settings.NEAR_DUPLICATES_ENABLED:
+        assign_near_duplicates(emails_internal, settings.NEAR_DUPLICATE_MAX_DISTANCE)
+        by_id = {email.id: email for email in emails_internal}
+        duplicates = [(email, by_id[email.duplicateOf]) for email in untagged if email.duplicateOf in by_id]
+        duplicate_ids = {email.id for email, _ in duplicates}
+        for email in untagged:
+            record_cache("near_duplicate", hit=email.id in duplicate_ids)
+        to_categorize = [email for email in untagged if email.id not in duplicate_ids]
+    else:
+        to_categorize = untagged
+    
+    # Local classifier first; only uncertain emails go to the LLM
+    needs_llm = []
+    for email in to_categorize:
+        labels, confidence = (
+            classifier_service.predict(email) if settings.CLASSIFIER_ENABLED else ([], 0.0)
+        )
+        confident = confidence >= settings.CLASSIFIER_CONFIDENCE_THRESHOLD
+        if settings.CLASSIFIER_ENABLED:
+            record_cache("local_classifier", hit=confident)
+        if confident:
+            email.tags = [Tag(label=label, color=llm_service._get_tag_color(label)) for label in labels]
+            email.tagSource = "classifier"
+        else:
+            needs_llm.append(email)
+    
+    # Untagged emails of one thread share a single LLM call on the whole conversation
+    if settings.THREADING_ENABLED:
+        assign_threads(emails_internal)
+        threads = group_by_thread(emails_internal)
+        needs_llm_ids = {email.id for email in needs_llm}
+        groups = {}
+        for thread_id, thread in threads.items():
+            group = [email for email in thread if email.id in needs_llm_ids]
+            if group:
+                groups[thread_id] = group
+        for group in groups.values():
+            for i in range(len(group)):
+                record_cache("thread_categorization", hit=i > 0)
+    else:
+        threads = {}
+        groups = {email.id: [email] for email in needs_llm}
+    
+    semaphore = asyncio.Semaphore(settings.INGEST_CONCURRENCY)
+    
+    async def categorize(thread_id: str, group: List[EmailInternal]) -> None:
+        async with semaphore:
+            # Categorize using LLM and update emails with tags
+            latest = group[-1]
+            thread = threads.get(thread_id, group)
+            tags = await llm_service.categorize_email_async(
+                email_body=conversation_text(thread, settings.THREAD_CONTEXT_CHARS) if len(thread) > 1 else latest.body,
+                subject=latest.subject,
+                categorization_prompt=prompts.categorization
+            )
+            for email in group:
+                email.tags = list(tags)
+                email.tagSource = "llm"
+    
+    groups = list(groups.items())
+    results = await asyncio.gather(
+        *(categorize(thread_id, group) for thread_id, group in groups),
+        return_exceptions=True
+    )
+    
+    # Emails whose LLM call failed keep empty tags so the next ingest retries them
+    failures = [r for r in results if isinstance(r, Exception)]
+    for error in failures[:3]:
+        print(f"Warning: Failed to categorize email: {error}")
+    failed_count = sum(
+        len(group) for (_, group), result in zip(groups, results) if isinstance(result, Exception)
+    )
+    
+    # Duplicates of a representative left untagged are retried with it
+    inherited_count = 0
+    for email, representative in duplicates:
+        if representative.tags:
+            email.tags = list(representative.tags)
+            email.tagSource = "duplicate"
+            inherited_count += 1
+    failed_count += len(duplicates) - inherited_count
+    processed_count = len(untagged) - failed_count
+    
+    # Save updated emails, merged into the inbox as it is now (it may have
+    # changed while the LLM calls were awaited)
+    emails_internal = file_service.merge_categorized_emails(emails_internal)
+    
+    # Update vector index for RAG
+    try:
+        await vector_service.upsert_emails_async(emails_internal)
+    except Exception as e:
+        print(f"Warning: Failed to update vector index: {e}")
+        # Continue even if vector update fails
+    
+    message = f"Processed {processed_count} out of {total_count} emails"
+    if inherited_count:
+        message += f" ({inherited_count} near-duplicates tagged like their cluster)"
+    if len(to_categorize) > len(needs_llm):
+        message += f" ({len(to_categorize) - len(needs_llm)} by the local classifier)"
+    if len(groups) < len(needs_llm):
+        message += f" ({len(needs_llm)} in {len(groups)} threads)"
+    if failed_count:
+        message += f" ({failed_count} failed and will be retried on the next ingest)"
+    
+    response = EmailIngestResponse(
+        status="partial" if failed_count else "success",
+        message=message,
+        processed_count=processed_count,
+        total_count=total_count,
+        failed_count=failed_count
+    )
+    return response, emails_internal
+
+
+# ========== Job Handlers ==========
+# Each takes the job payload and returns a JSON-serializable result; an
+# exception fails the attempt (retried per JOB_MAX_ATTEMPTS). They run in a
+# worker process with the job's tenant active.
+
+async def run_ingest(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Ingest, then prepare replies, retrain the classifier and refresh the digest (the route's background tasks)"""
+    prompts = prompt_registry.get()
+    response, emails = await ingest_inbox(prompts)
+    await speculative_service.pregenerate(emails, prompts.reply)
+    if settings.CLASSIFIER_ENABLED:
+        await classifier_service.retrain_if_needed(emails)
+    await digest_service.refresh(emails)
+    return response.model_dump()
+
+
+async def run_rebuild_index(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-embed the whole inbox into an emptied index"""
+    emails = [EmailInternal(**e) for e in file_service._read_json(file_service.inbox_path)]
+    await vector_service.rebuild_index_async(emails)
+    return {"indexed": len(emails)}
+
+
+async def run_embed(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Embed and upsert the emails in payload["emailIds"] (all emails if absent)"""
+    emails = [EmailInternal(**e) for e in file_service._read_json(file_service.inbox_path)]
+    if payload.get("emailIds") is not None:
+        wanted = set(payload["emailIds"])
+        emails = [email for email in emails if email.id in wanted]
+    await vector_service.upsert_emails_async(emails)
+    return {"embedded": len(emails)}
+
+
+async def run_digest(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize new and changed conversations and update the digest sections"""
+    emails = [EmailInternal(**e) for e in file_service._read_json(file_service.inbox_path)]
+    return await digest_service.refresh(emails)
+
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+    "ingest": run_ingest,
+    "rebuild_index": run_rebuild_index,
+    "embed": run_embed,
+    "digest": run_digest,
+}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 # ==================== Tag Model ====================
@@ -21,6 +21,7 @@ class Email(BaseModel):
     tags: List[Tag] = Field(default_factory=list)
     read: bool = False
     preview: str = Field(..., description="First 50 characters of body")
+    threadId: Optional[str] = None  # conversation this email belongs to
 
 class EmailUploadRequest(BaseModel):
     """Request model for uploading emails"""
@@ -32,6 +33,45 @@ class EmailIngestResponse(BaseModel):
     message: str
     processed_count: int
     total_count: int
+    failed_count: int = 0  # left untagged after upstream errors; retried on next ingest
+
+class EmailImportResponse(BaseModel):
+    """Response model for importing an mbox / EML export"""
+    status: str
+    message: str
+    format: str  # mbox | eml
+    messages: int  # messages read from the export
+    imported_count: int
+    duplicate_count: int = 0  # already in the inbox
+    failed_count: int = 0  # could not be parsed
+    messages_per_second: float
+
+class EmailThread(BaseModel):
+    """A conversation in the thread-grouped inbox view"""
+    id: str
+    subject: str  # of the first email
+    participants: List[str]  # senders, in order of first message
+    emailIds: List[str]  # oldest first
+    count: int
+    unreadCount: int
+    tags: List[Tag] = Field(default_factory=list)  # all tags in the thread, deduplicated by label
+    senderAvatar: str  # of the latest email
+    preview: str  # of the latest email
+    timestamp: str = Field(..., description="ISO 8601 timestamp of the latest email")
+    date: str = Field(default="", description="Human-readable date of the latest email - computed on GET")
+
+class EmailSearchHit(BaseModel):
+    """One full-text search result"""
+    email: Email
+    snippet: str  # body excerpt around the first match; HTML-escaped, matches wrapped in <mark>
+    subjectHighlight: str  # subject, HTML-escaped, matches wrapped in <mark>
+
+class EmailSearchResponse(BaseModel):
+    """Response model for full-text search"""
+    query: str
+    total: int  # matches before limit / offset
+    hits: List[EmailSearchHit]
+    tookMs: float
 
 # ==================== Draft Models ====================
 class Draft(BaseModel):
@@ -42,17 +82,44 @@ class Draft(BaseModel):
     content: str
     timestamp: str = Field(..., description="ISO 8601 timestamp (e.g., '2024-01-15T11:20:00Z')")
     lastSaved: str = Field(default="", description="Human-readable timestamp - computed on GET (e.g., 'Today, 11:20 AM')")
+    revision: int = Field(default=0, description="Incremented on every save; send it back as baseRevision")
 
 class GenerateReplyRequest(BaseModel):
     """Request model for generating a reply"""
     emailId: str
 
+class StreamReplyRequest(GenerateReplyRequest):
+    """Request model for streaming a reply, optionally saving it as a draft when done"""
+    saveDraft: bool = False
+    draftId: Optional[str] = None  # update this draft instead of creating one
+
 class SaveDraftRequest(BaseModel):
     """Request model for saving/updating a draft"""
     id: Optional[str] = None  # None for new drafts
     emailReferenceId: str
     emailSubject: str
     content: str
+    baseRevision: Optional[int] = None  # revision the edit started from; None overwrites unconditionally
+
+class DraftEdit(BaseModel):
+    """Replace content[start:end] with text (offsets in characters)"""
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    text: str = ""
+
+class PatchDraftRequest(BaseModel):
+    """Request model for saving a draft as edits against the revision the client has"""
+    baseRevision: int
+    edits: List[DraftEdit] = Field(default_factory=list, description="Applied in order, each to the result of the previous")
+    emailSubject: Optional[str] = None  # unchanged when omitted
+
+class DraftRevision(BaseModel):
+    """Response model for a draft save: the new revision, without the content"""
+    id: str
+    revision: int
+    length: int = Field(..., description="Characters of content after the save")
+    timestamp: str
+    lastSaved: str
 
 # ==================== Prompts Models ====================
 class Prompts(BaseModel):
@@ -71,6 +138,58 @@ class ChatQueryResponse(BaseModel):
     answer: str
     sources: Optional[List[str]] = None  # Email IDs used as context
 
+# ==================== Digest Models ====================
+class DigestItem(BaseModel):
+    """One conversation (or email, with threading off) in the digest"""
+    id: str  # thread ID, or email ID
+    subject: str
+    summary: str
+    emailIds: List[str]
+    tags: List[str] = Field(default_factory=list)
+    timestamp: str  # latest email, ISO 8601 format
+
+class DigestSection(BaseModel):
+    """Digest of one day or one tag"""
+    key: str  # "2024-11-24" (UTC day) or tag label
+    summary: str
+    emailCount: int
+    itemCount: int
+    items: List[DigestItem] = Field(default_factory=list)  # newest first
+
+class InboxDigest(BaseModel):
+    """Response model for the inbox digest"""
+    by: str = Field(..., description="day | tag")
+    generatedAt: Optional[str] = None  # None until the first refresh
+    emailCount: int = 0  # emails covered by a summary
+    pendingCount: int = 0  # emails not summarized yet (over budget or failed)
+    sections: List[DigestSection] = Field(default_factory=list)
+
+# ==================== Job Models ====================
+class JobCreateRequest(BaseModel):
+    """Request model for queueing a background job"""
+    type: str = Field(..., description="ingest | rebuild_index | embed | digest")
+    payload: Dict[str, Any] = Field(default_factory=dict)  # e.g. {"emailIds": [...]} for embed
+    priority: int = 0  # higher runs first
+    idempotencyKey: Optional[str] = None  # repeats with the same key return the existing job
+    maxAttempts: Optional[int] = None  # default settings.JOB_MAX_ATTEMPTS
+
+class Job(BaseModel):
+    """A queued, running or finished background job"""
+    id: str
+    type: str
+    tenant: str
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    priority: int = 0
+    status: str = Field(..., description="queued | running | succeeded | failed | cancelled")
+    attempts: int = 0
+    maxAttempts: int
+    idempotencyKey: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None  # last failure
+    createdAt: str  # ISO 8601 format
+    updatedAt: str  # ISO 8601 format
+    finishedAt: Optional[str] = None
+
 # ==================== Generic Response Models ====================
 class SuccessResponse(BaseModel):
     """Generic success response"""
@@ -95,6 +214,43 @@ class EmailInternal(BaseModel):
     tags: List[Tag] = Field(default_factory=list)
     read: bool = False
     preview: str
+    tagSource: Optional[str] = None  # "llm" | "classifier" | "duplicate"; None for uploaded tags
+    threadId: Optional[str] = None  # assigned when written to the inbox
+    messageId: Optional[str] = None  # RFC 822 Message-ID, when known (imported mail)
+    inReplyTo: Optional[str] = None
+    references: List[str] = Field(default_factory=list)  # Message-IDs earlier in the conversation
+    simhash: Optional[str] = None  # SimHash of subject and body (hex), "" when too short to compare
+    duplicateOf: Optional[str] = None  # representative of the email's near-duplicate cluster
+
+class PreparedReply(BaseModel):
+    """Reply generated ahead of time, valid while the email and reply prompt are unchanged"""
+    emailId: str
+    content: str
+    promptVersion: str  # version of the reply prompt it was generated with
+    emailHash: str  # hash of sender, subject and body at generation time
+    timestamp: str  # ISO 8601 format
+
+class DigestItemInternal(DigestItem):
+    """Map stage result, valid while its conversation and the digest prompts are unchanged"""
+    contentHash: str
+
+class DigestSectionInternal(BaseModel):
+    """Reduce stage result over the items in itemIds"""
+    key: str
+    summary: str
+    itemIds: List[str]
+    emailCount: int
+    contentHash: str
+
+class InboxDigestInternal(BaseModel):
+    """Stored digest (digest.json)"""
+    generatedAt: Optional[str] = None
+    emailCount: int = 0
+    pendingCount: int = 0
+    items: Dict[str, DigestItemInternal] = Field(default_factory=dict)
+    days: List[DigestSectionInternal] = Field(default_factory=list)
+    tags: List[DigestSectionInternal] = Field(default_factory=list)
+    reductions: Dict[str, str] = Field(default_factory=dict)  # content hash -> partial summary of a batch
 
 class DraftInternal(BaseModel):
     """Internal draft model for storage (with ISO timestamps)"""
@@ -102,4 +258,5 @@ class DraftInternal(BaseModel):
     emailReferenceId: str
     emailSubject: str
     content: str
-    timestamp: str  # ISO 8601 format
\ No newline at end of file
+    timestamp: str  # ISO 8601 format
+    revision: int = 0
\ No newline at end of file
@@ -5,6 +5,8 @@ from .emails import router as emails_router
 from .drafts import router as drafts_router
 from .settings import router as settings_router
 from .chat import router as chat_router
+from .jobs import router as jobs_router
+from .digest import router as digest_router
 
 # Create the main router instance
 main_router = APIRouter()
@@ -15,5 +17,7 @@ main_router.include_router(emails_router, prefix="/emails", tags=["📧 Emails"]
 main_router.include_router(drafts_router, prefix="/drafts", tags=["📝 Drafts"])
 main_router.include_router(settings_router, prefix="/settings", tags=["⚙️ Settings"])
 main_router.include_router(chat_router, prefix="/chat", tags=["💬 Chat Agent"])
+main_router.include_router(jobs_router, prefix="/jobs", tags=["⏳ Jobs"])
+main_router.include_router(digest_router, prefix="/digest", tags=["📰 Digest"])
 
 # The main application will import the 'main_router' object from this file.
\ No newline at end of file
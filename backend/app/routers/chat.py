@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, status
+from app.config import settings
 from app.models import ChatQueryRequest, ChatQueryResponse
-from app.services import file_service, llm_service, vector_service
+from app.services import file_service, llm_service, prompt_registry, vector_service
+from app.services.resilience import UpstreamUnavailableError
 from app.models import (
     Draft, DraftInternal, GenerateReplyRequest, 
     SaveDraftRequest, SuccessResponse, EmailInternal
@@ -16,8 +18,9 @@ async def query_chat(request: ChatQueryRequest):
     Process:
     1. Convert question to embedding
     2. Search Pinecone for most relevant emails
-    3. Pass question + relevant emails to LLM
-    4. Return AI-generated answer
+    3. Expand hits to their conversations (one entry per thread)
+    4. Pass question + relevant emails to LLM
+    5. Return AI-generated answer
     
     Examples:
     - "What tasks are due this week?"
@@ -32,11 +35,11 @@ async def query_chat(request: ChatQueryRequest):
         AI answer with optional source email IDs
     """
     try:
-        # Get current prompts
-        prompts = file_service.read_prompts()
+        # Current prompts (in memory)
+        prompts = prompt_registry.get()
         
         # Search for relevant emails using vector similarity
-        relevant_emails = vector_service.search_relevant_emails(request.query)
+        relevant_emails = await vector_service.search_relevant_emails_async(request.query)
         
         if not relevant_emails:
             return ChatQueryResponse(
@@ -44,21 +47,34 @@ async def query_chat(request: ChatQueryRequest):
                 sources=[]
             )
         
+        if settings.THREADING_ENABLED:
+            relevant_emails = file_service.thread_contexts(relevant_emails)
+        
         # Generate answer using LLM with context
-        answer = llm_service.answer_with_context(
+        answer = await llm_service.answer_with_context_async(
             question=request.query,
             context_emails=relevant_emails,
             rag_prompt=prompts.rag
         )
         
-        # Extract source IDs
-        source_ids = [email['id'] for email in relevant_emails]
+        # Extract source IDs (every email of a conversation used as context)
+        source_ids = list(dict.fromkeys(
+            email_id
+            for email in relevant_emails
+            for email_id in email.get('emailIds', [email['id']])
+        ))
         
         return ChatQueryResponse(
             answer=answer,
             sources=source_ids
         )
         
+    except UpstreamUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Chat is temporarily unavailable: {str(e)}",
+            headers={"Retry-After": str(int(e.retry_after or 5))}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -87,7 +103,7 @@ async def rebuild_index():
         emails_internal = [EmailInternal(**e) for e in emails_data]
         
         # Rebuild index
-        vector_service.rebuild_index(emails_internal)
+        await vector_service.rebuild_index_async(emails_internal)
         
         return SuccessResponse(
             message=f"Successfully rebuilt index with {len(emails_internal)} emails"
@@ -0,0 +1,65 @@
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, status
+from app.config import settings
+from app.models import EmailInternal, InboxDigest, SuccessResponse
+from app.services import digest_service, file_service
+from app.services.digest_service import GROUPINGS
+
+router = APIRouter()
+
+
+@router.get("/", response_model=InboxDigest)
+async def get_digest(
+    by: str = Query("day", description="day | tag"),
+    items: int = Query(10, ge=0, le=100, description="Conversations listed per section")
+):
+    """
+    Get the inbox digest, grouped by day or by tag
+    
+    Served from the digest precomputed after each ingest, so it answers
+    instantly and covers the whole inbox (every conversation has a cached
+    summary, and each section a digest of them). Nothing is generated here:
+    pendingCount says how many emails still wait for a summary, and
+    generatedAt when the digest was last refreshed.
+    
+    Examples:
+    - GET /api/digest/ - today's and earlier days' mail, newest first
+    - GET /api/digest/?by=tag - one digest per tag, largest first
+    """
+    if by not in GROUPINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown grouping '{by}' (choose from {', '.join(GROUPINGS)})"
+        )
+    try:
+        return await asyncio.to_thread(digest_service.resolve().get_digest, by, items)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read digest: {str(e)}"
+        )
+
+
+@router.post("/refresh", response_model=SuccessResponse, status_code=status.HTTP_202_ACCEPTED)
+async def refresh_digest(background_tasks: BackgroundTasks):
+    """
+    Refresh the digest in the background
+    
+    Ingest already does this; use it after changing the inbox another way
+    (e.g. an import), or to work through emails left pending by
+    DIGEST_MAP_BUDGET. Only new and changed conversations are summarized.
+    """
+    if not settings.DIGEST_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The digest is disabled (DIGEST_ENABLED=false)"
+        )
+    try:
+        emails = [EmailInternal(**e) for e in file_service._read_json(file_service.inbox_path)]
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read emails: {str(e)}"
+        )
+    background_tasks.add_task(digest_service.refresh, emails)
+    return SuccessResponse(message=f"Refreshing the digest of {len(emails)} emails")
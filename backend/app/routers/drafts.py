@@ -1,10 +1,16 @@
 from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
 from app.models import (
-    Draft, DraftInternal, GenerateReplyRequest, 
-    SaveDraftRequest, SuccessResponse
+    Draft, DraftInternal, DraftRevision, EmailInternal, GenerateReplyRequest, 
+    PatchDraftRequest, SaveDraftRequest, StreamReplyRequest, SuccessResponse
 )
-from app.services import file_service, llm_service, vector_service
+from app.services import (
+    draft_store, file_service, llm_service, prompt_registry, vector_service, speculative_service
+)
+from app.services.draft_store import DraftConflictError
+from app.services.resilience import UpstreamUnavailableError
+import json
 import uuid
 
 router = APIRouter()
@@ -19,8 +25,7 @@ async def get_drafts():
         List of drafts with 'lastSaved' field computed from 'timestamp'
     """
     try:
-        drafts = file_service.read_drafts()
-        return drafts
+        return [_to_api_draft(draft) for draft in draft_store.list()]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -28,6 +33,26 @@ async def get_drafts():
         )
 
 
+@router.get("/{draft_id}", response_model=Draft)
+async def get_draft(draft_id: str):
+    """
+    Get one draft, e.g. to reload it after a revision conflict
+    """
+    try:
+        draft = draft_store.get(draft_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read draft: {str(e)}"
+        )
+    if draft is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Draft with id '{draft_id}' not found"
+        )
+    return _to_api_draft(draft)
+
+
 @router.post("/generate", response_model=dict)
 async def generate_reply(request: GenerateReplyRequest):
     """
@@ -36,6 +61,9 @@ async def generate_reply(request: GenerateReplyRequest):
     Does NOT save the draft - just returns the generated text
     Frontend can then edit and save it using POST /drafts
     
+    Replies pre-generated after ingest are returned immediately while the
+    email and reply prompt are unchanged
+    
     Args:
         emailId: ID of the email to reply to
         
@@ -51,11 +79,16 @@ async def generate_reply(request: GenerateReplyRequest):
                 detail=f"Email with id '{request.emailId}' not found"
             )
         
-        # Get current prompts
-        prompts = file_service.read_prompts()
+        # Current prompts (in memory)
+        prompts = prompt_registry.get()
+        
+        # Serve a pre-generated reply when one is still valid
+        prepared = speculative_service.get_prepared_reply(email, prompts.reply)
+        if prepared is not None:
+            return {"content": prepared}
         
         # Generate reply using LLM
-        reply_content = llm_service.generate_reply(
+        reply_content = await llm_service.generate_reply_async(
             sender=email.sender,
             subject=email.subject,
             email_body=email.body,
@@ -66,11 +99,100 @@ async def generate_reply(request: GenerateReplyRequest):
         
     except HTTPException:
         raise
+    except UpstreamUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Reply generation is temporarily unavailable: {str(e)}",
+            headers={"Retry-After": str(int(e.retry_after or 5))}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate reply: {str(e)}"
+        )
+
+
+@router.post("/generate/stream")
+async def generate_reply_stream(request: StreamReplyRequest):
+    """
+    Stream an AI reply as server-sent events while Gemini generates it
+    
+    Events:
+        chunk: {"text": "..."} for each piece of text as it arrives
+        done:  {"content": "Full reply...", "draft": Draft or null}
+        error: {"detail": "..."} if generation fails mid-stream
+        
+    With saveDraft=true the finished reply is saved as a draft (replacing
+    draftId when given). Nothing is saved if the client
+    disconnects or generation fails.
+    
+    Args:
+        emailId: ID of the email to reply to
+        saveDraft: Save the completed reply as a draft
+        draftId: Existing draft to update
+    """
+    email = file_service.get_email_by_id(request.emailId)
+    if not email:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Email with id '{request.emailId}' not found"
+        )
+    
+    prompts = prompt_registry.get()
+    
+    # A valid pre-generated reply is sent as a single chunk
+    prepared = speculative_service.get_prepared_reply(email, prompts.reply)
+    if prepared is not None:
+        chunks = _single_chunk(prepared)
+    else:
+        chunks = llm_service.stream_reply(
+            sender=email.sender,
+            subject=email.subject,
+            email_body=email.body,
+            reply_prompt=prompts.reply
+        )
+    
+    # Wait for the first chunk so failures before any text get a real status code
+    try:
+        first = await anext(chunks, "")
+    except UpstreamUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Reply generation is temporarily unavailable: {str(e)}",
+            headers={"Retry-After": str(int(e.retry_after or 5))}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate reply: {str(e)}"
         )
+    
+    async def events() -> AsyncIterator[str]:
+        parts = [first]
+        if first:
+            yield _sse("chunk", {"text": first})
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield _sse("chunk", {"text": chunk})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Failed to generate reply: {str(e)}"})
+            return
+        
+        content = "".join(parts).strip()
+        draft = None
+        if request.saveDraft:
+            try:
+                draft = _save_reply_draft(email, content, request.draftId).model_dump()
+            except Exception as e:
+                yield _sse("error", {"detail": f"Failed to save draft: {str(e)}"})
+        yield _sse("done", {"content": content, "draft": draft})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.post("/", response_model=Draft)
@@ -81,11 +203,15 @@ async def save_draft(request: SaveDraftRequest):
     If draft.id is provided and exists: UPDATE
     If draft.id is None or doesn't exist: CREATE with new UUID
     
+    With baseRevision, the save is refused (409) if the draft has been
+    saved since that revision. Autosave should prefer PATCH /drafts/{id},
+    which sends only the edits.
+    
     Args:
         Draft object with emailReferenceId, emailSubject, content
         
     Returns:
-        Saved draft with updated lastSaved timestamp
+        Saved draft with updated lastSaved timestamp and revision
     """
     try:
         # Generate ID if not provided
@@ -100,26 +226,61 @@ async def save_draft(request: SaveDraftRequest):
             timestamp=file_service.generate_current_timestamp()
         )
         
-        # Upsert (create or update)
-        saved_draft = file_service.upsert_draft(draft_internal)
+        # Upsert (create or update); written to disk behind the save
+        saved_draft = draft_store.save(draft_internal, base_revision=request.baseRevision)
         
         # Convert to API format with computed lastSaved
-        draft_api = Draft(
-            id=saved_draft.id,
-            emailReferenceId=saved_draft.emailReferenceId,
-            emailSubject=saved_draft.emailSubject,
-            content=saved_draft.content,
-            timestamp=saved_draft.timestamp,
-            lastSaved=file_service.format_relative_date(saved_draft.timestamp)
-        )
-        
-        return draft_api
+        return _to_api_draft(saved_draft)
         
+    except DraftConflictError as e:
+        raise _conflict(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save draft: {str(e)}"
+        )
+
+
+@router.patch("/{draft_id}", response_model=DraftRevision)
+async def patch_draft(draft_id: str, request: PatchDraftRequest):
+    """
+    Save a draft as edits against the revision the client has (autosave)
+    
+    Each edit replaces content[start:end] with text, offsets counted in
+    characters (Unicode code points) of the content as left by the
+    previous edit. Only the new revision comes back, not the content.
+    
+    A 409 means the draft was saved elsewhere since baseRevision: reload
+    it with GET /drafts/{id} and reapply the local edits.
+    
+    Args:
+        baseRevision: Revision the edits were made against
+        edits: [{"start": 12, "end": 17, "text": "Thursday"}, ...]
+        emailSubject: New subject (optional)
+    """
+    try:
+        saved_draft = draft_store.patch(draft_id, request.baseRevision, request.edits, request.emailSubject)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Draft with id '{draft_id}' not found"
+        )
+    except DraftConflictError as e:
+        raise _conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save draft: {str(e)}"
         )
+    return DraftRevision(
+        id=saved_draft.id,
+        revision=saved_draft.revision,
+        length=len(saved_draft.content),
+        timestamp=saved_draft.timestamp,
+        lastSaved=file_service.format_relative_date(saved_draft.timestamp)
+    )
 
 
 @router.delete("/{draft_id}", response_model=SuccessResponse)
@@ -128,22 +289,12 @@ async def delete_draft(draft_id: str):
     Delete a draft by ID
     """
     try:
-        # Read current drafts
-        drafts_data = file_service._read_json(file_service.drafts_path)
-        
-        # Find and remove draft
-        original_count = len(drafts_data)
-        drafts_data = [d for d in drafts_data if d.get('id') != draft_id]
-        
-        if len(drafts_data) == original_count:
+        if not draft_store.delete(draft_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Draft with id '{draft_id}' not found"
             )
         
-        # Save updated list
-        file_service._write_json(file_service.drafts_path, drafts_data)
-        
         return SuccessResponse(message=f"Draft {draft_id} deleted successfully")
         
     except HTTPException:
@@ -152,4 +303,49 @@ async def delete_draft(draft_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete draft: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+# ========== Helpers ==========
+
+def _to_api_draft(draft: DraftInternal) -> Draft:
+    """Convert a stored draft to API format with computed lastSaved"""
+    return Draft(
+        id=draft.id,
+        emailReferenceId=draft.emailReferenceId,
+        emailSubject=draft.emailSubject,
+        content=draft.content,
+        timestamp=draft.timestamp,
+        lastSaved=file_service.format_relative_date(draft.timestamp),
+        revision=draft.revision
+    )
+
+
+def _conflict(error: DraftConflictError) -> HTTPException:
+    """409 carrying the draft's current revision"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"{error}; reload it and reapply your edits",
+        headers={"X-Draft-Revision": str(error.revision)}
+    )
+
+
+def _save_reply_draft(email: EmailInternal, content: str, draft_id: Optional[str]) -> Draft:
+    """Upsert a generated reply as a draft for the email"""
+    saved_draft = draft_store.save(DraftInternal(
+        id=draft_id or str(uuid.uuid4()),
+        emailReferenceId=email.id,
+        emailSubject=f"Re: {email.subject}",
+        content=content,
+        timestamp=file_service.generate_current_timestamp()
+    ))
+    return _to_api_draft(saved_draft)
+
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
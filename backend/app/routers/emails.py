@@ -1,12 +1,25 @@
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, UploadFile, File, status
+from typing import List, Optional
+from datetime import datetime, timezone
+import asyncio
 import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from app.config import settings
 from app.models import (
     Email, EmailInternal, EmailUploadRequest, 
-    EmailIngestResponse, SuccessResponse, Tag
+    EmailImportResponse, EmailIngestResponse, EmailSearchHit, EmailSearchResponse,
+    EmailThread, SuccessResponse
 )
-from app.services import file_service, llm_service, vector_service
+from app.services import (
+    file_service, prompt_registry, vector_service,
+    speculative_service, classifier_service, digest_service
+)
+from app.jobs import ingest_inbox
+from app.services.mail_import import import_mailbox
 
 router = APIRouter()
 
@@ -29,6 +42,101 @@ async def get_emails():
         )
 
 
+def _parse_date(value: Optional[str], name: str) -> Optional[datetime]:
+    """ISO 8601 date or datetime query parameter (UTC unless it has an offset)"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid '{name}' date '{value}' (expected ISO 8601, e.g. 2024-11-24)"
+        )
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@router.get("/search", response_model=EmailSearchResponse)
+async def search_emails(
+    q: str = "",
+    tag: Optional[List[str]] = Query(None),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Full-text search over sender, subject and body, newest first
+    
+    Query syntax (all parts must match):
+    - budget review: both words
+    - "budget review": the exact phrase
+    - budg*: any word starting with "budg"
+    
+    Args:
+        q: Search query (empty returns every email matching the filters)
+        tag: Only emails with this tag (repeat for several)
+        after: Only emails at or after this ISO 8601 date / time
+        before: Only emails before this ISO 8601 date / time
+        
+    Each hit has a body snippet and the subject with matches in <mark>.
+    """
+    after_date = _parse_date(after, "after")
+    before_date = _parse_date(before, "before")
+    start = time.perf_counter()
+    try:
+        total, results = await asyncio.to_thread(
+            file_service.resolve().search_emails,
+            q, tags=tag, after=after_date, before=before_date, limit=limit, offset=offset
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search emails: {str(e)}"
+        )
+    
+    return EmailSearchResponse(
+        query=q,
+        total=total,
+        hits=[
+            EmailSearchHit(email=file_service.to_api_email(email), snippet=snippet, subjectHighlight=subject)
+            for email, snippet, subject in results
+        ],
+        tookMs=round((time.perf_counter() - start) * 1000, 2)
+    )
+
+
+@router.get("/threads", response_model=List[EmailThread])
+async def get_threads():
+    """
+    Get the inbox grouped into conversations, most recently active first
+    
+    Replies are grouped by their In-Reply-To / References headers when
+    present, otherwise by subject with Re:/Fwd: prefixes removed.
+    """
+    try:
+        return file_service.read_threads()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read threads: {str(e)}"
+        )
+
+
+@router.get("/threads/{thread_id}", response_model=List[Email])
+async def get_thread(thread_id: str):
+    """
+    Get the emails of one conversation, oldest first
+    """
+    emails = file_service.read_thread(thread_id)
+    if not emails:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Thread with id '{thread_id}' not found"
+        )
+    return [file_service.to_api_email(email) for email in emails]
+
+
 @router.post("/upload", response_model=SuccessResponse)
 async def upload_emails(file: UploadFile = File(...)):
     """
@@ -51,6 +159,11 @@ async def upload_emails(file: UploadFile = File(...)):
     - preview (first 50 chars of body)
     - read (defaults to false)
     - tags (defaults to empty array)
+    - messageId / inReplyTo / references (reply headers used for threading)
+    
+    Each email is signed with a SimHash and matched against the inbox;
+    near-duplicates (newsletters, notifications) later take the tags of
+    the first email of their cluster instead of being categorized again.
     """
     try:
         # Read file content
@@ -98,12 +211,14 @@ async def upload_emails(file: UploadFile = File(...)):
                     detail=f"Invalid email at index {i}: {str(e)}"
                 )
         
-        # Save to inbox.json
+        # Save to inbox.json (signs and clusters near-duplicates)
         file_service.write_emails(processed_emails)
         
-        return SuccessResponse(
-            message=f"Successfully uploaded {len(processed_emails)} emails"
-        )
+        message = f"Successfully uploaded {len(processed_emails)} emails"
+        duplicate_count = sum(1 for email in processed_emails if email.duplicateOf)
+        if duplicate_count:
+            message += f" ({duplicate_count} near-duplicates)"
+        return SuccessResponse(message=message)
         
     except json.JSONDecodeError:
         raise HTTPException(
@@ -117,62 +232,96 @@ async def upload_emails(file: UploadFile = File(...)):
         )
 
 
+@router.post("/import", response_model=EmailImportResponse)
+async def import_emails(file: UploadFile = File(...), replace: bool = False):
+    """
+    Import an mbox file or a single .eml message
+    
+    Messages are decoded (MIME bodies, encoded headers) into emails with
+    generated avatars and previews, parsed in parallel across cores and
+    written in batches. Messages already in the inbox are skipped.
+    For EML directories and very large exports use `python -m app.importer`.
+    
+    Args:
+        replace: Replace the inbox instead of adding to it
+        
+    Returns counts and parsing throughput; run /ingest afterwards to tag
+    and index the new emails
+    """
+    mailbox_format = "eml" if (file.filename or "").lower().endswith(".eml") else "mbox"
+    # Spool to disk next to the inbox; the importer streams it from there
+    fd, temp_name = tempfile.mkstemp(suffix=f".{mailbox_format}", dir=file_service.inbox_path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            while chunk := await file.read(1024 * 1024):
+                temp.write(chunk)
+        
+        report = await asyncio.to_thread(
+            import_mailbox, Path(temp_name), file_service.resolve(),
+            mailbox_format=mailbox_format, replace=replace
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import emails: {str(e)}"
+        )
+    finally:
+        Path(temp_name).unlink(missing_ok=True)
+    
+    message = f"Imported {report.imported} of {report.messages} messages"
+    if report.duplicates:
+        message += f" ({report.duplicates} already in the inbox)"
+    if report.failed:
+        message += f" ({report.failed} could not be parsed)"
+    return EmailImportResponse(
+        status="partial" if report.failed else "success",
+        message=message,
+        format=report.format,
+        messages=report.messages,
+        imported_count=report.imported,
+        duplicate_count=report.duplicates,
+        failed_count=report.failed,
+        messages_per_second=round(report.messages_per_second, 1)
+    )
+
+
 @router.post("/ingest", response_model=EmailIngestResponse)
-async def ingest_emails():
+async def ingest_emails(background_tasks: BackgroundTasks):
     """
     Categorize emails without tags and update vector index
     
     This endpoint:
     1. Reads all emails from inbox
     2. For each email with empty tags array:
-       - Calls LLM to categorize
+       - Uses the local classifier when it is confident
+       - Otherwise calls LLM to categorize
        - Adds Tag objects (with label and color)
     3. Saves updated emails
     4. Updates Pinecone vector index
-    
+    5. In the background, pre-generates replies for Urgent / To-Do emails,
+       retrains the local classifier once enough new LLM tags exist and
+       refreshes the inbox digest
+       
     Returns count of processed emails
     """
     try:
-        # Read current prompts
-        prompts = file_service.read_prompts()
+        # Current prompts (in memory)
+        prompts = prompt_registry.get()
         
-        # Read emails (internal format with ISO timestamps)
-        emails_data = file_service._read_json(file_service.inbox_path)
-        emails_internal = [EmailInternal(**e) for e in emails_data]
+        response, emails_internal = await ingest_inbox(prompts)
         
-        processed_count = 0
-        total_count = len(emails_internal)
-        
-        # Process emails without tags
-        for email in emails_internal:
-            if not email.tags or len(email.tags) == 0:
-                # Categorize using LLM
-                tags = llm_service.categorize_email(
-                    email_body=email.body,
-                    subject=email.subject,
-                    categorization_prompt=prompts.categorization
-                )
-                
-                # Update email with tags
-                email.tags = tags
-                processed_count += 1
+        # Prepare replies for high-priority emails after the response is sent
+        background_tasks.add_task(
+            speculative_service.pregenerate, emails_internal, prompts.reply
+        )
         
-        # Save updated emails
-        file_service.write_emails(emails_internal)
+        if settings.CLASSIFIER_ENABLED:
+            background_tasks.add_task(classifier_service.retrain_if_needed, emails_internal)
         
-        # Update vector index for RAG
-        try:
-            vector_service.upsert_emails(emails_internal)
-        except Exception as e:
-            print(f"Warning: Failed to update vector index: {e}")
-            # Continue even if vector update fails
-        
-        return EmailIngestResponse(
-            status="success",
-            message=f"Processed {processed_count} out of {total_count} emails",
-            processed_count=processed_count,
-            total_count=total_count
-        )
+        if settings.DIGEST_ENABLED:
+            background_tasks.add_task(digest_service.refresh, emails_internal)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -181,6 +330,37 @@ async def ingest_emails():
         )
 
 
+@router.get("/classifier")
+async def get_classifier_report():
+    """
+    Get the local classifier's last training report
+    
+    Includes held-out accuracy, and the share of held-out emails the
+    classifier was confident enough to tag without the LLM.
+    """
+    return {
+        "enabled": settings.CLASSIFIER_ENABLED,
+        "trained": classifier_service.ready,
+        "report": classifier_service.report
+    }
+
+
+@router.post("/classifier/train")
+async def train_classifier():
+    """
+    Retrain the local classifier now on all LLM-tagged emails
+    """
+    try:
+        emails_data = file_service._read_json(file_service.inbox_path)
+        emails_internal = [EmailInternal(**e) for e in emails_data]
+        return await asyncio.to_thread(classifier_service.train, emails_internal)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to train classifier: {str(e)}"
+        )
+
+
 @router.delete("/{email_id}", response_model=SuccessResponse)
 async def delete_email(email_id: str):
     """
@@ -206,10 +386,13 @@ async def delete_email(email_id: str):
         
         # Delete from vector index
         try:
-            vector_service.index.delete(ids=[email_id])
+            vector_service.delete_emails([email_id])
         except Exception as e:
             print(f"Warning: Failed to delete from vector index: {e}")
         
+        # Stop any reply being prepared for it
+        speculative_service.cancel(email_id)
+        
         return SuccessResponse(message=f"Email {email_id} deleted successfully")
         
     except HTTPException:
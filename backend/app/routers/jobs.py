@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from typing import List, Optional
+from app.jobs import HANDLERS
+from app.models import Job, JobCreateRequest, SuccessResponse
+from app.services import job_queue, tenants
+
+router = APIRouter()
+
+
+def _get_own_job(job_id: str) -> Job:
+    """The job with this ID if it belongs to the current tenant, else 404"""
+    job = job_queue.get(job_id)
+    if job is None or job.tenant != tenants.current().id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with id '{job_id}' not found"
+        )
+    return job
+
+
+@router.post("/", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: JobCreateRequest, response: Response):
+    """
+    Queue a background job for the worker processes
+    
+    Job types:
+    - ingest: categorize untagged emails and update the index
+    - rebuild_index: re-embed every email into an emptied index
+    - embed: embed payload.emailIds (every email if omitted)
+    - digest: refresh the inbox digest
+    
+    Higher priority jobs run first. Repeating a request with the same
+    idempotencyKey returns the original job (200) instead of queueing a new one.
+    """
+    if request.type not in HANDLERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job type '{request.type}' (choose from {', '.join(HANDLERS)})"
+        )
+    if request.maxAttempts is not None and request.maxAttempts < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="maxAttempts must be at least 1"
+        )
+    try:
+        job, created = job_queue.enqueue(
+            request.type,
+            tenants.current().id,
+            payload=request.payload,
+            priority=request.priority,
+            idempotency_key=request.idempotencyKey,
+            max_attempts=request.maxAttempts
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to queue job: {str(e)}"
+        )
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return job
+
+
+@router.get("/", response_model=List[Job])
+async def list_jobs(status_filter: Optional[str] = Query(None, alias="status"), limit: int = 50):
+    """
+    List this mailbox's jobs, newest first
+    
+    Args:
+        status: queued | running | succeeded | failed | cancelled
+        limit: Maximum number of jobs returned
+    """
+    return job_queue.list(tenants.current().id, status=status_filter, limit=limit)
+
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """
+    Get a job's status, attempts, result or last error
+    """
+    return _get_own_job(job_id)
+
+
+@router.delete("/{job_id}", response_model=SuccessResponse)
+async def cancel_job(job_id: str):
+    """
+    Cancel a job that has not started yet
+    """
+    job = _get_own_job(job_id)
+    if not job_queue.cancel(job.id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job '{job_id}' is {job_queue.get(job_id).status} and can no longer be cancelled"
+        )
+    return SuccessResponse(message=f"Job {job_id} cancelled")
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, status
-from app.models import Prompts, SuccessResponse
-from app.services import file_service, llm_service, vector_service
+from fastapi import APIRouter, HTTPException, Response, status
+from app.config import settings
+from app.models import Prompts
+from app.services import llm_service, prompt_registry
 
 router = APIRouter()
 
 
 @router.get("/prompts", response_model=Prompts)
-async def get_prompts():
+async def get_prompts(response: Response):
     """
     Get current AI prompt configurations
     
@@ -14,9 +15,12 @@ async def get_prompts():
     - categorization: How to tag emails
     - reply: How to generate responses
     - rag: How to answer questions using email context
+    
+    The X-Prompts-Version header carries the prompt set's version
     """
     try:
-        prompts = file_service.read_prompts()
+        prompts = prompt_registry.get()
+        response.headers["X-Prompts-Version"] = prompt_registry.version
         return prompts
     except Exception as e:
         raise HTTPException(
@@ -59,10 +63,8 @@ async def update_prompts(prompts: Prompts):
                 detail="RAG prompt cannot be empty"
             )
         
-        # Save prompts
-        file_service.write_prompts(prompts)
-        
-        return prompts
+        # Save prompts (assigns a new version)
+        return prompt_registry.update(prompts)
         
     except HTTPException:
         raise
@@ -81,15 +83,7 @@ async def reset_prompts():
     Useful if custom prompts aren't working well
     """
     try:
-        default_prompts = Prompts(
-            categorization="Categorize emails as: Urgent (requires immediate action), To-Do (actionable but not urgent), Newsletter (informational), or other. Consider tone, sender authority, and keywords. Return ONLY a JSON array of tag labels like [\"Urgent\", \"To-Do\"].",
-            reply="Generate professional, concise replies that are slightly formal but friendly. Keep replies to 2-3 sentences. Match the tone of the original email.",
-            rag="You are a helpful assistant with access to the user's email history. Answer questions about tasks, projects, and conversations based on the email content. Be concise and accurate. Only use information from the provided emails."
-        )
-        
-        file_service.write_prompts(default_prompts)
-        
-        return default_prompts
+        return prompt_registry.reset()
         
     except Exception as e:
         raise HTTPException(
@@ -97,3 +91,28 @@ async def reset_prompts():
             detail=f"Failed to reset prompts: {str(e)}"
         )
 
+
+@router.get("/prompts/version", response_model=dict)
+async def get_prompts_version():
+    """
+    Get content-hash versions of the prompt set and of each prompt
+    
+    Use these as cache keys for LLM output derived from a prompt; a version
+    changes whenever its prompt text does (via the API or a file edit).
+    """
+    return prompt_registry.versions()
+
+
+@router.get("/models", response_model=dict)
+async def get_model_routing():
+    """
+    Get per-task model routing and categorization cascade statistics
+    
+    Returns:
+    - routes: model used for each task
+    - cascade: per-tier call counts, p50/p95 latency and escalation rate
+    """
+    return {
+        "routes": {task: llm_service.model_for(task) for task in settings.MODEL_ROUTES},
+        "cascade": llm_service.cascade_stats()
+    }
@@ -1,11 +1,57 @@
-from app.services.file_service import FileService
+from app.services.draft_store import DraftFlusher
+from app.services.gemini_client import GeminiClient
+from app.services.health_service import HealthMonitor
+from app.services.job_queue import JobQueue
+from app.services.lazy import LazyService
 from app.services.llm_service import LLMService
-from app.services.vector_service import VectorService
+from app.services.tenancy import TenantRegistry, TenantScoped
 
-# Global service instances (initialized once)
-file_service = FileService()
-llm_service = LLMService()
-vector_service = VectorService()
+# Global service instances, built on first use (see LazyService) so importing
+# the app does no network I/O; main.py warms them up in the background.
+# Service modules only import their SDKs (Pinecone, google.generativeai)
+# when first needed.
+gemini_client = LazyService(GeminiClient)  # shared pooled async transport
+llm_service = LazyService(lambda: LLMService(gemini_client.resolve()))
+
+# Mailbox services are per tenant (see app/services/tenancy.py); these
+# resolve to the tenant of the current request, or the default tenant.
+tenants = TenantRegistry(gemini_client, llm_service)
+file_service = TenantScoped(tenants, "file_service")
+prompt_registry = TenantScoped(tenants, "prompt_registry")  # in-memory, versioned prompts
+vector_service = TenantScoped(tenants, "vector_service")
+speculative_service = TenantScoped(tenants, "speculative_service")
+digest_service = TenantScoped(tenants, "digest_service")  # inbox digest, refreshed after ingest
+draft_store = TenantScoped(tenants, "draft_store")  # drafts in memory, written behind autosaves
+classifier_service = TenantScoped(tenants, "classifier_service")
+health_monitor = LazyService(lambda: HealthMonitor(file_service, vector_service, gemini_client))
+job_queue = LazyService(JobQueue)  # SQLite, shared with the worker processes (app/worker.py)
+draft_flusher = LazyService(lambda: DraftFlusher(tenants))
+
+
+def warm_up() -> None:
+    """
+    Build every service and open slow connections ahead of the first request
+    
+    Blocking; main.py runs it in a worker thread after startup. Failures
+    (e.g. no network) are logged and retried lazily on first use.
+    """
+    steps = [
+        ("services", lambda: [gemini_client.resolve(), llm_service.resolve(), tenants.default]),
+        ("prompts", lambda: prompt_registry.get()),
+        ("pinecone", lambda: vector_service.warm_up()),
+        ("classifier", lambda: classifier_service.ready),
+        ("search index", lambda: file_service.sync_search_index()),
+    ]
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"Warning: Warm-up of {name} failed, will retry on first use: {e}")
+    print("✓ Services warmed up")
 
 # Export them so other files can just do: from app.services import file_service
-__all__ = ["file_service", "llm_service", "vector_service"]
\ No newline at end of file
+__all__ = [
+    "file_service", "prompt_registry", "gemini_client", "llm_service", "vector_service",
+    "speculative_service", "classifier_service", "health_monitor", "tenants",
+    "job_queue", "digest_service", "draft_store", "draft_flusher"
+]
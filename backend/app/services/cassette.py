@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import httpx
+from app.config import settings
+from app.services.metrics import record_cache
+
+
+class CassetteMissError(Exception):
+    """Replay mode got a request that was never recorded"""
+
+
+class Cassette:
+    """
+    Recorded upstream request/response pairs for one upstream (JSON lines)
+    
+    In record mode every exchange is appended to `<CASSETTE_DIR>/<name>.jsonl`
+    as it completes. In replay mode the file is loaded once and requests are
+    matched on a hash of their method, path and canonical JSON body; repeats
+    of the same request are served in recorded order (the last one repeats).
+    """
+    
+    def __init__(self, name: str, mode: str, directory: Path, latency: str = "recorded"):
+        self.name = name
+        self.mode = mode
+        self.path = Path(directory) / f"{name}.jsonl"
+        self.latency = latency
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        
+        if mode == "replay":
+            if not self.path.exists():
+                raise FileNotFoundError(f"No cassette recorded at {self.path}")
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+        elif mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def make_key(method: str, path: str, body: Any) -> str:
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(f"{method} {path} {canonical}".encode('utf-8')).hexdigest()
+    
+    def record(self, key: str, request: Dict[str, Any], response: Dict[str, Any], latency_ms: float) -> None:
+        line = json.dumps({
+            "key": key,
+            "request": request,
+            "response": response,
+            "latency_ms": round(latency_ms, 2),
+        }, ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    
+    def lookup(self, key: str, description: str) -> Dict[str, Any]:
+        """Next recorded entry for key; raises CassetteMissError if there is none"""
+        with self._lock:
+            entries = self._entries.get(key)
+            record_cache(f"cassette_{self.name}", hit=bool(entries))
+            if not entries:
+                raise CassetteMissError(f"No recording in {self.path.name} for {description}")
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            return entries[min(served, len(entries) - 1)]
+    
+    def replay_delay(self, entry: Dict[str, Any]) -> float:
+        """Seconds to wait before serving an entry: recorded, none, or a fixed ms value"""
+        if self.latency == "recorded":
+            return entry["latency_ms"] / 1000
+        if self.latency == "none":
+            return 0.0
+        return float(self.latency) / 1000
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records or replays Gemini REST calls
+    
+    Recording reads each response body in full before returning it, so
+    streamed replies arrive in one piece while recording (and on replay).
+    """
+    
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.inner = inner
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content) if request.content else None
+        path = request.url.path + (f"?{request.url.query.decode()}" if request.url.query else "")
+        key = Cassette.make_key(request.method, path, body)
+        
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key, f"{request.method} {path}")
+            await asyncio.sleep(self.cassette.replay_delay(entry))
+            recorded = entry["response"]
+            return httpx.Response(
+                recorded["status_code"],
+                headers={"content-type": recorded["content_type"]},
+                content=recorded["body"].encode('utf-8'),
+                request=request
+            )
+        
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        latency_ms = (time.perf_counter() - start) * 1000
+        content_type = response.headers.get("content-type", "application/json")
+        self.cassette.record(
+            key,
+            {"method": request.method, "path": path},
+            {"status_code": response.status_code, "content_type": content_type, "body": content.decode('utf-8')},
+            latency_ms
+        )
+        # Body is already decoded; drop headers describing the wire encoding
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=content,
+            request=request
+        )
+    
+    async def aclose(self) -> None:
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+class CassetteIndex:
+    """
+    Records or replays the Pinecone Index calls VectorService makes
+    
+    Responses are stored as plain dicts (the SDK's `to_dict()`), which is all
+    VectorService reads from them. In replay mode no Pinecone connection is
+    needed at all.
+    """
+    
+    OPERATIONS = ("upsert", "query", "delete", "describe_index_stats", "list_paginated", "fetch")
+    
+    def __init__(self, cassette: Cassette, inner: Any = None):
+        self.cassette = cassette
+        self.inner = inner
+    
+    def __getattr__(self, name: str):
+        if name not in self.OPERATIONS:
+            raise AttributeError(name)
+        return lambda **kwargs: self._call(name, kwargs)
+    
+    def _call(self, operation: str, kwargs: Dict[str, Any]) -> Any:
+        key = Cassette.make_key("CALL", operation, kwargs)
+        
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key, operation)
+            time.sleep(self.cassette.replay_delay(entry))
+            return entry["response"]
+        
+        start = time.perf_counter()
+        result = getattr(self.inner, operation)(**kwargs)
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.cassette.record(key, {"operation": operation}, self._to_plain(result), latency_ms)
+        return result
+    
+    @staticmethod
+    def _to_plain(result: Any) -> Any:
+        if result is None:
+            return None
+        if hasattr(result, "to_dict"):
+            result = result.to_dict()
+        if isinstance(result, dict):
+            result = {k: v for k, v in result.items() if k != "response_info"}
+        return json.loads(json.dumps(result, default=str))
+
+
+def cassette_for(name: str) -> Optional[Cassette]:
+    """Cassette for an upstream per CASSETTE_MODE, or None when disabled"""
+    if settings.CASSETTE_MODE == "off":
+        return None
+    if settings.CASSETTE_MODE not in ("record", "replay"):
+        raise ValueError(f"CASSETTE_MODE must be off, record or replay, not {settings.CASSETTE_MODE!r}")
+    return Cassette(name, settings.CASSETTE_MODE, settings.CASSETTE_DIR, settings.CASSETTE_LATENCY)
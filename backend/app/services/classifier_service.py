@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import re
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.models import EmailInternal
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Tags that carry no signal to learn from
+IGNORED_LABELS = {"uncategorized"}
+
+# Tag sources that are not the LLM or the user (not learned from)
+DERIVED_TAG_SOURCES = {"classifier", "duplicate"}
+
+
+class ClassifierService:
+    """
+    Local fast-path email classifier trained on LLM-assigned tags
+    
+    Emails are turned into hashed word uni/bigram features (no vocabulary to
+    store) and scored by one-vs-rest logistic regression, so a prediction is
+    a few dozen array lookups. `ingest_emails` uses a prediction only when
+    every per-label decision is at least CLASSIFIER_CONFIDENCE_THRESHOLD sure,
+    and falls back to the LLM otherwise.
+    """
+    
+    NUM_FEATURES = 2 ** 18
+    EPOCHS = 8
+    LEARNING_RATE = 0.5
+    MIN_LABEL_EXAMPLES = 5  # labels seen fewer times are not learned
+    HOLDOUT_FRACTION = 0.2
+    
+    def __init__(self, model_path=None):
+        self.model_path = model_path or settings.CLASSIFIER_FILE
+        # (labels, weights [labels x features], bias), swapped as one object
+        # so predictions never see a half-replaced model during retraining
+        self._model: Optional[Tuple[List[str], np.ndarray, np.ndarray]] = None
+        self.report: Dict = {}
+        self._loaded = False
+        self._training = False
+    
+    # ========== Prediction ==========
+    
+    @property
+    def ready(self) -> bool:
+        self._ensure_loaded()
+        return self._model is not None
+    
+    def predict(self, email: EmailInternal) -> Tuple[List[str], float]:
+        """
+        Predict tag labels for an email
+        
+        Returns:
+            (labels, confidence) where confidence is the least certain of the
+            per-label yes/no decisions; ([], 0.0) when no model is trained
+        """
+        if not self.ready:
+            return [], 0.0
+        
+        model_labels, weights, bias = self._model
+        indices, values = self._features(email)
+        probabilities = self._sigmoid(weights[:, indices] @ values + bias)
+        
+        labels = [label for label, p in zip(model_labels, probabilities) if p >= 0.5]
+        if not labels:
+            return [], 0.0
+        confidence = float(np.min(np.maximum(probabilities, 1.0 - probabilities)))
+        return labels, confidence
+    
+    # ========== Training ==========
+    
+    def train(self, emails: List[EmailInternal]) -> Dict:
+        """
+        Train on emails tagged by the LLM, report held-out accuracy, then
+        refit on all examples and save the model
+        
+        Args:
+            emails: Inbox emails (only LLM-tagged ones are used)
+            
+        Returns:
+            Training report (also available as `self.report`)
+        """
+        examples = [
+            (email, [tag.label for tag in email.tags if tag.label.lower() not in IGNORED_LABELS])
+            for email in emails
+            if email.tags and email.tagSource not in DERIVED_TAG_SOURCES
+        ]
+        examples = [(email, labels) for email, labels in examples if labels]
+        
+        if len(examples) < settings.CLASSIFIER_MIN_EXAMPLES:
+            return {
+                "status": "skipped",
+                "reason": f"need {settings.CLASSIFIER_MIN_EXAMPLES} LLM-tagged emails, have {len(examples)}"
+            }
+        
+        labels = self._select_labels([labels for _, labels in examples])
+        features = [self._features(email) for email, _ in examples]
+        targets = np.array(
+            [[label.lower() in {l.lower() for l in email_labels} for label in labels] for _, email_labels in examples],
+            dtype=np.float32
+        )
+        
+        # Deterministic held-out split by email ID
+        holdout = np.array([
+            zlib.crc32(email.id.encode('utf-8')) % 100 < self.HOLDOUT_FRACTION * 100
+            for email, _ in examples
+        ])
+        train_rows, test_rows = np.flatnonzero(~holdout), np.flatnonzero(holdout)
+        
+        weights, bias = self._fit([features[i] for i in train_rows], targets[train_rows])
+        evaluation = self._evaluate(weights, bias, [features[i] for i in test_rows], targets[test_rows])
+        
+        # Serve the model fitted on every example
+        weights, bias = self._fit(features, targets)
+        self._model = (labels, weights, bias)
+        self.report = {
+            "status": "trained",
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "examples": len(examples),
+            "labels": labels,
+            **evaluation,
+        }
+        self._loaded = True
+        self._save()
+        print(f"✓ Trained local classifier on {len(examples)} emails "
+              f"(held-out accuracy {evaluation['holdout_accuracy']})")
+        return self.report
+    
+    def needs_retraining(self, emails: List[EmailInternal]) -> bool:
+        """True when enough new LLM-tagged emails arrived since the last training"""
+        self._ensure_loaded()
+        llm_tagged = sum(1 for email in emails if email.tags and email.tagSource not in DERIVED_TAG_SOURCES)
+        trained_on = self.report.get("examples", 0)
+        if not self.report:
+            return llm_tagged >= settings.CLASSIFIER_MIN_EXAMPLES
+        return llm_tagged - trained_on >= settings.CLASSIFIER_RETRAIN_EVERY
+    
+    async def retrain_if_needed(self, emails: List[EmailInternal]) -> Optional[Dict]:
+        """Retrain off the event loop when due (run as a background task after ingest)"""
+        if self._training or not self.needs_retraining(emails):
+            return None
+        self._training = True
+        try:
+            return await asyncio.to_thread(self.train, emails)
+        except Exception as e:
+            print(f"Warning: Failed to retrain local classifier: {e}")
+            return None
+        finally:
+            self._training = False
+    
+    # ========== Internals ==========
+    
+    def _features(self, email: EmailInternal) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashed word uni/bigrams (subject tokens kept apart), log-scaled, L2-normalized"""
+        tokens = []
+        for prefix, text in (("s:", email.subject), ("", email.body)):
+            words = TOKEN_PATTERN.findall(text.lower())
+            tokens.extend(prefix + word for word in words)
+            tokens.extend(f"{prefix}{a} {b}" for a, b in zip(words, words[1:]))
+        tokens.append("from:" + email.sender.lower())
+        
+        hashed = Counter(zlib.crc32(token.encode('utf-8')) % self.NUM_FEATURES for token in tokens)
+        indices = np.fromiter(hashed.keys(), dtype=np.int64, count=len(hashed))
+        values = np.log1p(np.fromiter(hashed.values(), dtype=np.float32, count=len(hashed)))
+        norm = np.linalg.norm(values)
+        return indices, values / norm if norm else values
+    
+    def _select_labels(self, label_lists: List[List[str]]) -> List[str]:
+        """Labels with enough examples, using their most common spelling"""
+        counts = Counter(label.lower() for labels in label_lists for label in labels)
+        spellings = Counter(label for labels in label_lists for label in labels)
+        selected = []
+        for label_lower, count in counts.most_common():
+            if count >= self.MIN_LABEL_EXAMPLES:
+                selected.append(max(
+                    (s for s in spellings if s.lower() == label_lower),
+                    key=lambda s: spellings[s]
+                ))
+        return selected
+    
+    def _fit(self, features, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """One-vs-rest logistic regression by sparse SGD"""
+        num_labels = targets.shape[1]
+        weights = np.zeros((num_labels, self.NUM_FEATURES), dtype=np.float32)
+        prior = np.clip(targets.mean(axis=0), 1e-3, 1 - 1e-3)
+        bias = np.log(prior / (1 - prior)).astype(np.float32)
+        
+        rng = np.random.default_rng(0)
+        for epoch in range(self.EPOCHS):
+            rate = self.LEARNING_RATE / (1 + epoch)
+            for row in rng.permutation(len(features)):
+                indices, values = features[row]
+                gradient = self._sigmoid(weights[:, indices] @ values + bias) - targets[row]
+                weights[:, indices] -= rate * np.outer(gradient, values)
+                bias -= rate * gradient
+        return weights, bias
+    
+    def _evaluate(self, weights, bias, features, targets: np.ndarray) -> Dict:
+        threshold = settings.CLASSIFIER_CONFIDENCE_THRESHOLD
+        if not features:
+            return {"holdout_size": 0, "holdout_accuracy": None,
+                    "confident_coverage": None, "confident_accuracy": None,
+                    "confidence_threshold": threshold}
+        
+        correct, confident, confident_correct = 0, 0, 0
+        for (indices, values), target in zip(features, targets):
+            probabilities = self._sigmoid(weights[:, indices] @ values + bias)
+            exact = bool(np.all((probabilities >= 0.5) == (target >= 0.5)))
+            correct += exact
+            if np.min(np.maximum(probabilities, 1 - probabilities)) >= threshold:
+                confident += 1
+                confident_correct += exact
+        
+        return {
+            "holdout_size": len(features),
+            "holdout_accuracy": round(correct / len(features), 3),  # exact tag-set match
+            "confident_coverage": round(confident / len(features), 3),  # share served without the LLM
+            "confident_accuracy": round(confident_correct / confident, 3) if confident else None,
+            "confidence_threshold": threshold,
+        }
+    
+    @staticmethod
+    def _sigmoid(z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+    
+    def _save(self) -> None:
+        labels, weights, bias = self._model
+        self.model_path.parent.mkdir(parents=True, exist_ok=True)
+        # Replaced atomically: other processes (or a rebuilt tenant) may be loading it
+        temp = self.model_path.with_name(f".{self.model_path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    weights=weights,
+                    bias=bias,
+                    labels=np.array(labels),
+                    report=np.array(json.dumps(self.report))
+                )
+            os.replace(temp, self.model_path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+    
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.model_path.exists():
+            return
+        try:
+            with np.load(self.model_path) as data:
+                self._model = (
+                    [str(label) for label in data["labels"]],
+                    data["weights"],
+                    data["bias"]
+                )
+                self.report = json.loads(str(data["report"]))
+        except Exception as e:
+            print(f"Warning: Failed to load classifier from {self.model_path}: {e}")
@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from app.config import settings
+from app.models import (
+    DigestItem, DigestItemInternal, DigestSection, DigestSectionInternal, EmailInternal,
+    InboxDigest, InboxDigestInternal
+)
+from app.services.file_service import FileService
+from app.services.llm_service import LLMService
+from app.services.metrics import record_cache
+from app.services.threads import conversation_text, group_by_thread
+
+GROUPINGS = ("day", "tag")
+
+
+class DigestService:
+    """
+    Inbox digest, summarized map-reduce style after ingest and served from digest.json
+    
+    Map: each conversation (each email, with threading off) gets a short
+    summary, cached with a hash of its emails, so a refresh only summarizes
+    new or changed conversations: newest first, at most DIGEST_MAP_BUDGET
+    per refresh. A lone near-duplicate email reuses the summary of its
+    cluster representative.
+    
+    Reduce: the summaries of each day (the DIGEST_DAYS most recent) and of
+    each tag are combined into one digest per section. Longer sections are
+    reduced in batches of DIGEST_REDUCE_BATCH whose partial digests are
+    combined in turn. Every reduction is cached by the hash of its input,
+    so new mail redoes only the batches it lands in.
+    """
+    
+    def __init__(self, file_service: FileService, llm_service: LLMService):
+        self.file_service = file_service
+        self.llm_service = llm_service
+        self._lock = asyncio.Lock()  # one refresh at a time; the next starts from its cache
+    
+    # ========== Serving ==========
+    
+    def get_digest(self, by: str = "day", max_items: int = 10) -> InboxDigest:
+        """
+        The stored digest grouped by day or by tag (no LLM calls)
+        
+        Args:
+            by: "day" (newest first) or "tag" (largest first)
+            max_items: Conversations listed per section, newest first
+        """
+        digest = self.file_service.read_digest()
+        sections = digest.days if by == "day" else digest.tags
+        return InboxDigest(
+            by=by,
+            generatedAt=digest.generatedAt,
+            emailCount=digest.emailCount,
+            pendingCount=digest.pendingCount,
+            sections=[
+                DigestSection(
+                    key=section.key,
+                    summary=section.summary,
+                    emailCount=section.emailCount,
+                    itemCount=len(section.itemIds),
+                    items=[
+                        DigestItem(**digest.items[item_id].model_dump(exclude={"contentHash"}))
+                        for item_id in section.itemIds[:max_items]
+                        if item_id in digest.items
+                    ]
+                )
+                for section in sections
+            ]
+        )
+    
+    # ========== Background Refresh ==========
+    
+    async def refresh(self, emails: List[EmailInternal]) -> Dict[str, int]:
+        """
+        Bring the digest up to date with the inbox
+        
+        Intended to run as a background task after ingest.
+        
+        Args:
+            emails: Current inbox
+            
+        Returns:
+            Conversations summarized and reused, sections reduced, and
+            emails still waiting for a summary
+        """
+        if not settings.DIGEST_ENABLED:
+            return {}
+        async with self._lock:
+            return await self._refresh(emails)
+    
+    async def _refresh(self, emails: List[EmailInternal]) -> Dict[str, int]:
+        previous = self.file_service.read_digest()
+        version = self.llm_service.digest_version()
+        semaphore = asyncio.Semaphore(settings.DIGEST_CONCURRENCY)
+        
+        # ----- Map: one summary per conversation -----
+        if settings.THREADING_ENABLED:
+            units = group_by_thread(emails)
+        else:
+            units = {email.id: [email] for email in emails}
+        unit_of = {email.id: unit_id for unit_id, unit in units.items() for email in unit}
+        
+        items: Dict[str, DigestItemInternal] = {}
+        stale = []
+        for unit_id, unit in units.items():
+            content_hash = self._content_hash(version, unit)
+            cached = previous.items.get(unit_id)
+            if cached is not None and cached.contentHash == content_hash:
+                items[unit_id] = self._item(unit_id, unit, cached.summary, content_hash)
+            else:
+                stale.append((unit_id, unit, content_hash))
+        stale.sort(key=lambda entry: entry[1][-1].timestamp, reverse=True)
+        
+        def lone_duplicate(unit: List[EmailInternal]) -> bool:
+            representative = unit_of.get(unit[0].duplicateOf) if len(unit) == 1 else None
+            return representative is not None and len(units[representative]) == 1
+        
+        duplicates = [entry for entry in stale if lone_duplicate(entry[1])]
+        to_summarize = [entry for entry in stale if not lone_duplicate(entry[1])][:settings.DIGEST_MAP_BUDGET]
+        
+        async def summarize(unit_id: str, unit: List[EmailInternal], content_hash: str) -> None:
+            async with semaphore:
+                summary = await self.llm_service.summarize_conversation_async(
+                    unit[0].subject, conversation_text(unit, settings.THREAD_CONTEXT_CHARS)
+                )
+            items[unit_id] = self._item(unit_id, unit, summary, content_hash)
+        
+        results = await asyncio.gather(
+            *(summarize(*entry) for entry in to_summarize), return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            print(f"Warning: {len(failed)} digest summaries failed: {failed[0]}")
+        
+        for unit_id, unit, content_hash in duplicates:
+            representative = items.get(unit_of[unit[0].duplicateOf])
+            if representative is not None:
+                items[unit_id] = self._item(unit_id, unit, representative.summary, content_hash)
+        
+        summarized_ids = {unit_id for unit_id, _, _ in to_summarize}
+        for unit_id in units:
+            record_cache("digest_summary", hit=unit_id in items and unit_id not in summarized_ids)
+        summarized = len(to_summarize) - len(failed)
+        reused = len(items) - summarized
+        
+        # Changed conversations left for a later refresh keep their old
+        # summary (and old hash, so they are retried) meanwhile
+        pending_ids = set()
+        for unit_id, unit, _ in stale:
+            if unit_id in items:
+                continue
+            pending_ids.add(unit_id)
+            cached = previous.items.get(unit_id)
+            if cached is not None:
+                items[unit_id] = self._item(unit_id, unit, cached.summary, cached.contentHash)
+        pending = sum(len(units[unit_id]) for unit_id in pending_ids)
+        
+        # ----- Reduce: one digest per day and per tag -----
+        ordered = sorted(items.values(), key=lambda item: item.timestamp, reverse=True)
+        by_day: Dict[str, List[DigestItemInternal]] = {}
+        by_tag: Dict[str, List[DigestItemInternal]] = {}
+        for item in ordered:
+            by_day.setdefault(self._day(item.timestamp), []).append(item)
+            for tag in item.tags:
+                by_tag.setdefault(tag, []).append(item)
+        recent_days = sorted(by_day, reverse=True)[:settings.DIGEST_DAYS]
+        
+        reductions: Dict[str, str] = {}
+        
+        async def reduce(key: str, heading: str, members: List[DigestItemInternal],
+                         before: Optional[DigestSectionInternal]) -> Optional[DigestSectionInternal]:
+            lines = self._section_lines(members)
+            content_hash = self._hash(version, heading, *lines)
+            if before is not None and before.contentHash == content_hash:
+                record_cache("digest_section", hit=True)
+                return before
+            record_cache("digest_section", hit=False)
+            try:
+                summary = await self._reduce(version, heading, lines, previous.reductions, reductions, semaphore)
+            except Exception as e:
+                print(f"Warning: Failed to reduce digest section {key}: {e}")
+                return before  # served until a later refresh succeeds
+            return DigestSectionInternal(
+                key=key,
+                summary=summary,
+                itemIds=[item.id for item in members],
+                emailCount=sum(len(item.emailIds) for item in members),
+                contentHash=content_hash
+            )
+        
+        previous_days = {section.key: section for section in previous.days}
+        previous_tags = {section.key: section for section in previous.tags}
+        days = await asyncio.gather(*(
+            reduce(day, f"mail from {day}", by_day[day], previous_days.get(day)) for day in recent_days
+        ))
+        tags = await asyncio.gather(*(
+            reduce(tag, f"mail tagged {tag}", members, previous_tags.get(tag))
+            for tag, members in sorted(by_tag.items(), key=lambda entry: -len(entry[1]))
+        ))
+        
+        digest = InboxDigestInternal(
+            generatedAt=self.file_service.generate_current_timestamp(),
+            emailCount=len(emails) - pending,
+            pendingCount=pending,
+            items=items,
+            days=[section for section in days if section is not None],
+            tags=[section for section in tags if section is not None],
+            reductions=reductions
+        )
+        self.file_service.write_digest(digest)
+        print(f"✓ Refreshed digest ({summarized} summaries, {reused} reused, {pending} emails pending)")
+        return {"summarized": summarized, "reused": reused, "pending": pending}
+    
+    async def _reduce(
+        self,
+        version: str,
+        heading: str,
+        lines: List[str],
+        cached: Dict[str, str],
+        reductions: Dict[str, str],
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        """
+        Combine summary lines (newest first) into one digest, in batches when long
+        
+        Batches are cut from the oldest end, so new mail only changes the
+        newest batch and the rest are served from `cached`. Every reduction
+        used is recorded in `reductions` (the next refresh's cache).
+        """
+        batch_size = max(2, settings.DIGEST_REDUCE_BATCH)
+        while len(lines) > batch_size:
+            oldest_first = lines[::-1]
+            batches = [oldest_first[i:i + batch_size][::-1] for i in range(0, len(oldest_first), batch_size)]
+            partials = await asyncio.gather(*(
+                self._combine(version, heading, batch, cached, reductions, semaphore) for batch in batches
+            ))
+            lines = [" ".join(partial.split()) for partial in reversed(partials)]
+        return await self._combine(version, heading, lines, cached, reductions, semaphore)
+    
+    async def _combine(
+        self,
+        version: str,
+        heading: str,
+        lines: List[str],
+        cached: Dict[str, str],
+        reductions: Dict[str, str],
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        key = self._hash(version, heading, *lines)
+        summary = reductions.get(key) or cached.get(key)
+        record_cache("digest_reduction", hit=summary is not None)
+        if summary is None:
+            async with semaphore:
+                summary = await self.llm_service.combine_summaries_async(heading, lines)
+        reductions[key] = summary
+        return summary
+    
+    # ========== Helpers ==========
+    
+    @staticmethod
+    def _item(unit_id: str, unit: List[EmailInternal], summary: str, content_hash: str) -> DigestItemInternal:
+        """Digest entry for a conversation (tags and dates are refreshed even when the summary is reused)"""
+        tags = dict.fromkeys(tag.label for email in unit for tag in email.tags)
+        return DigestItemInternal(
+            id=unit_id,
+            subject=unit[0].subject,
+            summary=summary,
+            emailIds=[email.id for email in unit],
+            tags=list(tags),
+            timestamp=unit[-1].timestamp,
+            contentHash=content_hash
+        )
+    
+    @staticmethod
+    def _section_lines(members: List[DigestItemInternal]) -> List[str]:
+        """One line per distinct summary, newest first, with how many conversations share it"""
+        counts = Counter(f"{item.subject}: {item.summary}" for item in members)
+        return [
+            line if count == 1 else f"{line} ({count} similar)"
+            for line, count in counts.items()
+        ]
+    
+    @classmethod
+    def _content_hash(cls, version: str, unit: List[EmailInternal]) -> str:
+        """Hash of what a conversation summary is made from"""
+        return cls._hash(version, *(
+            f"{email.id}\n{email.sender}\n{email.subject}\n{email.body}" for email in unit
+        ))
+    
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()[:16]
+    
+    @staticmethod
+    def _day(timestamp: str) -> str:
+        """UTC day ("2024-11-24") of an ISO 8601 timestamp"""
+        try:
+            moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            return timestamp[:10]
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+        return moment.date().isoformat()
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+from app.config import settings
+from app.models import DraftEdit, DraftInternal
+from app.services.file_service import FileService
+from app.services.metrics import record_cache
+
+
+class DraftConflictError(Exception):
+    """A save was based on an older revision than the stored draft"""
+    
+    def __init__(self, draft_id: str, revision: int, base_revision: int):
+        super().__init__(f"Draft '{draft_id}' is at revision {revision}, not {base_revision}")
+        self.draft_id = draft_id
+        self.revision = revision
+
+
+def apply_edits(content: str, edits: Iterable[DraftEdit]) -> str:
+    """
+    Apply edits in order, each to the result of the previous
+    
+    Raises:
+        ValueError: An edit falls outside the text it applies to
+    """
+    for edit in edits:
+        if edit.start > edit.end or edit.end > len(content):
+            raise ValueError(
+                f"Edit [{edit.start}, {edit.end}) does not fit a draft of {len(content)} characters"
+            )
+        content = content[:edit.start] + edit.text + content[edit.end:]
+    return content
+
+
+class DraftStore:
+    """
+    Drafts served from memory and written to drafts.json behind the saves
+    
+    The editor autosaves every few seconds. A save only updates the
+    in-memory draft and marks it pending; flush() then writes drafts.json
+    once for everything pending (every DRAFT_FLUSH_INTERVAL seconds, see
+    DraftFlusher, and on shutdown), so a burst of saves costs one write.
+    
+    Every save increments the draft's revision. A save that names the
+    revision it started from (baseRevision) is refused with
+    DraftConflictError when the draft has moved on, instead of overwriting
+    edits made in another tab. Revisions are checked after reloading
+    drafts.json when it changed on disk (another worker process flushed),
+    with pending saves kept on top. A pending draft that another process
+    saved since this one last read it loses to that save at the next
+    flush, under a revision neither process's clients hold, so both get a
+    conflict and reload.
+    
+    Once retired (its tenant evicted, see retire()) the store writes every
+    save through, as no flusher walks it any more.
+    """
+    
+    def __init__(self, file_service: FileService):
+        self.file_service = file_service
+        self._drafts: Optional[Dict[str, DraftInternal]] = None
+        self._mtime_ns: Optional[int] = None
+        self._pending: Set[str] = set()  # draft IDs saved or deleted since the last flush
+        self._base: Dict[str, Optional[int]] = {}  # pending draft ID -> revision on disk it started from
+        self._retired = False
+        self._lock = threading.Lock()
+    
+    # ========== Reading ==========
+    
+    def list(self) -> List[DraftInternal]:
+        with self._lock:
+            return list(self._loaded().values())
+    
+    def get(self, draft_id: str) -> Optional[DraftInternal]:
+        with self._lock:
+            return self._loaded().get(draft_id)
+    
+    @property
+    def pending(self) -> int:
+        """Drafts with saves not yet written to drafts.json"""
+        return len(self._pending)
+    
+    # ========== Saving ==========
+    
+    def save(self, draft: DraftInternal, base_revision: Optional[int] = None) -> DraftInternal:
+        """
+        Create or replace a draft
+        
+        Args:
+            draft: Draft to store (its revision is assigned here)
+            base_revision: Revision the client edited; None saves unconditionally
+        """
+        with self._lock:
+            current = self._loaded().get(draft.id)
+            self._check_revision(draft.id, current, base_revision)
+            saved = draft.model_copy(update={"revision": (current.revision if current else 0) + 1})
+            self._put(saved, current)
+        self._written_behind()
+        return saved
+    
+    def patch(
+        self,
+        draft_id: str,
+        base_revision: int,
+        edits: List[DraftEdit],
+        email_subject: Optional[str] = None
+    ) -> DraftInternal:
+        """
+        Apply text edits to the revision the client has
+        
+        Raises:
+            KeyError: No such draft
+            DraftConflictError: The draft is no longer at base_revision
+            ValueError: An edit does not fit the content
+        """
+        with self._lock:
+            current = self._loaded().get(draft_id)
+            if current is None:
+                raise KeyError(draft_id)
+            self._check_revision(draft_id, current, base_revision)
+            saved = current.model_copy(update={
+                "content": apply_edits(current.content, edits),
+                "emailSubject": current.emailSubject if email_subject is None else email_subject,
+                "timestamp": self.file_service.generate_current_timestamp(),
+                "revision": current.revision + 1
+            })
+            self._put(saved, current)
+        self._written_behind()
+        return saved
+    
+    def delete(self, draft_id: str) -> bool:
+        """Remove a draft; returns False if it does not exist"""
+        with self._lock:
+            current = self._loaded().pop(draft_id, None)
+            if current is None:
+                return False
+            self._mark_pending(draft_id, current)
+        self._written_behind()
+        return True
+    
+    # ========== Flushing ==========
+    
+    def flush(self) -> int:
+        """
+        Write pending saves to drafts.json; returns the number of drafts they touched
+        
+        Writes drafts.json as it is now on disk with the pending saves on
+        top, so drafts other processes saved meanwhile are kept. On failure
+        the saves stay pending for the next flush.
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            drafts = self._loaded()
+            self.file_service.write_drafts(list(drafts.values()))
+            flushed = len(self._pending)
+            self._pending.clear()
+            self._base.clear()
+            self._mtime_ns = self._stat_mtime()
+            return flushed
+    
+    def retire(self) -> None:
+        """
+        Flush, then write every later save through
+        
+        Called when the tenant is evicted: requests still holding it may
+        save again, and the tenant's next store must see those saves on disk.
+        """
+        self._retired = True
+        self.flush()
+    
+    # ========== Internals ==========
+    
+    def _loaded(self) -> Dict[str, DraftInternal]:
+        """Drafts by ID, reloaded when drafts.json changed on disk (call with _lock held)"""
+        mtime_ns = self._stat_mtime()
+        if self._drafts is not None and mtime_ns == self._mtime_ns:
+            return self._drafts
+        
+        drafts = {}
+        if mtime_ns is not None:
+            drafts = {draft.id: draft for draft in self.file_service.read_drafts_internal()}
+        for draft_id in self._pending:
+            on_disk = drafts.get(draft_id)
+            disk_revision = on_disk.revision if on_disk else None
+            mine = self._drafts.get(draft_id)
+            if disk_revision != self._base.get(draft_id):
+                # Saved (or deleted) by another process since this one read it:
+                # that save wins, bumped past both so every client conflicts
+                print(f"Warning: Draft '{draft_id}' was saved by another process; keeping that version")
+                if on_disk is not None:
+                    revision = max(on_disk.revision, mine.revision if mine else 0) + 1
+                    drafts[draft_id] = on_disk.model_copy(update={"revision": revision})
+                self._base[draft_id] = disk_revision
+            elif mine is not None:
+                drafts[draft_id] = mine
+            else:
+                drafts.pop(draft_id, None)
+        self._drafts, self._mtime_ns = drafts, mtime_ns
+        return drafts
+    
+    def _put(self, draft: DraftInternal, current: Optional[DraftInternal]) -> None:
+        # A hit is a save absorbed by a write already pending
+        record_cache("draft_write", hit=draft.id in self._pending)
+        self._drafts[draft.id] = draft
+        self._mark_pending(draft.id, current)
+    
+    def _mark_pending(self, draft_id: str, current: Optional[DraftInternal]) -> None:
+        if draft_id not in self._pending:
+            self._base[draft_id] = current.revision if current else None
+            self._pending.add(draft_id)
+    
+    def _written_behind(self) -> None:
+        if self._retired or not settings.DRAFT_WRITE_BEHIND:
+            self.flush()
+    
+    @staticmethod
+    def _check_revision(draft_id: str, current: Optional[DraftInternal], base_revision: Optional[int]) -> None:
+        revision = current.revision if current else 0
+        if base_revision is not None and base_revision != revision:
+            raise DraftConflictError(draft_id, revision, base_revision)
+    
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.file_service.drafts_path).st_mtime_ns
+        except OSError:
+            return None
+
+
+class DraftFlusher:
+    """Flushes every loaded tenant's pending draft saves in the background"""
+    
+    def __init__(self, tenants: Any):
+        self.tenants = tenants
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """Start flushing every DRAFT_FLUSH_INTERVAL seconds (called from the app lifespan)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the loop and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        flushed = await asyncio.to_thread(self.flush_all)
+        if flushed:
+            print(f"✓ Flushed {flushed} pending draft(s)")
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DRAFT_FLUSH_INTERVAL)
+            await asyncio.to_thread(self.flush_all)
+    
+    def flush_all(self) -> int:
+        flushed = 0
+        for tenant in self.tenants.loaded():
+            try:
+                flushed += tenant.draft_store.flush()
+            except Exception as e:
+                print(f"Warning: Failed to flush drafts of tenant '{tenant.id}': {e}")
+        return flushed
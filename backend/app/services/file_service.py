@@ -1,21 +1,61 @@
 import json
+import os
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from datetime import datetime, timezone
 from app.config import settings
-from app.models import EmailInternal, DraftInternal, Prompts, Email, Draft, Tag
+from app.services.inbox_snapshot import InboxSnapshot
+from app.services.metrics import record_cache, storage_duration
+from app.services.near_duplicates import NearDuplicateIndex, assign_near_duplicates, sign_emails
+from app.services.search_index import SNIPPET_CHARS, SearchIndex, SearchQuery, highlight
+from app.services.threads import ThreadIndex, assign_threads, conversation_text, group_by_thread, thread_id_of
+from app.services.tracing import span
+from app.models import (
+    EmailInternal, EmailThread, DraftInternal, Prompts, Email, Draft, Tag, PreparedReply, InboxDigestInternal
+)
 import hashlib
 
 class FileService:
     """Handles all JSON file operations and data transformations"""
     
-    def __init__(self):
-        self.inbox_path = settings.INBOX_FILE
-        self.drafts_path = settings.DRAFTS_FILE
-        self.prompts_path = settings.PROMPTS_FILE
+    def __init__(self, data_dir: Optional[Path] = None):
+        """
+        Args:
+            data_dir: Directory holding this mailbox's files (a tenant's
+                directory); defaults to the configured top-level data files
+        """
+        if data_dir is None:
+            self.inbox_path = settings.INBOX_FILE
+            self.drafts_path = settings.DRAFTS_FILE
+            self.prompts_path = settings.PROMPTS_FILE
+            self.prepared_replies_path = settings.PREPARED_REPLIES_FILE
+            self.digest_path = settings.DIGEST_FILE
+            self.snapshot_path = settings.INBOX_SNAPSHOT_FILE
+        else:
+            self.inbox_path = data_dir / settings.INBOX_FILE.name
+            self.drafts_path = data_dir / settings.DRAFTS_FILE.name
+            self.prompts_path = data_dir / settings.PROMPTS_FILE.name
+            self.prepared_replies_path = data_dir / settings.PREPARED_REPLIES_FILE.name
+            self.digest_path = data_dir / settings.DIGEST_FILE.name
+            self.snapshot_path = data_dir / settings.INBOX_SNAPSHOT_FILE.name
+        
+        # Memory-mapped inbox snapshot, reopened when another writer replaces it
+        self._snapshot: Optional[InboxSnapshot] = None
+        self._snapshot_lock = threading.Lock()
         
+        # Thread ID -> email IDs (oldest first), rebuilt when inbox.json changes
+        self._thread_members: Dict[str, List[str]] = {}
+        self._thread_members_source: Optional[tuple] = None
+        self._thread_lock = threading.Lock()
+        
+        # Full-text index over the inbox snapshot, brought up to date on search
+        self._search_index = SearchIndex()
+    
     def ensure_files_exist(self) -> None:
         """Create default JSON files if they don't exist"""
+        self.inbox_path.parent.mkdir(parents=True, exist_ok=True)
+        
         # Create inbox.json
         if not self.inbox_path.exists():
             self._write_json(self.inbox_path, [])
@@ -28,12 +68,7 @@ class FileService:
         
         # Create prompts.json with defaults
         if not self.prompts_path.exists():
-            default_prompts = {
-                "categorization": "Categorize emails as: Urgent (requires immediate action), To-Do (actionable but not urgent), Newsletter (informational), or other. Consider tone, sender authority, and keywords. Return ONLY a JSON array of tag labels like [\"Urgent\", \"To-Do\"].",
-                "reply": "Generate professional, concise replies that are slightly formal but friendly. Keep replies to 2-3 sentences. Match the tone of the original email.",
-                "rag": "You are a helpful assistant with access to the user's email history. Answer questions about tasks, projects, and conversations based on the email content. Be concise and accurate. Only use information from the provided emails."
-            }
-            self._write_json(self.prompts_path, default_prompts)
+            self._write_json(self.prompts_path, settings.DEFAULT_PROMPTS)
             print(f"✓ Created {self.prompts_path}")
     
     # ========== Low-Level File Operations ==========
@@ -41,7 +76,9 @@ class FileService:
     def _read_json(self, filepath: Path) -> Any:
         """Read and parse a JSON file"""
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
+            with span("storage.read", file=filepath.name), \
+                    storage_duration.time(operation="read", file=filepath.name), \
+                    open(filepath, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except FileNotFoundError:
             raise FileNotFoundError(f"File not found: {filepath}")
@@ -51,53 +88,357 @@ class FileService:
     def _write_json(self, filepath: Path, data: Any) -> None:
         """Write data to a JSON file with pretty formatting"""
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
+            with span("storage.write", file=filepath.name), \
+                    storage_duration.time(operation="write", file=filepath.name), \
+                    open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                # Stat of this write itself, not of whatever the path holds by
+                # the time the snapshot is written
+                written = os.fstat(f.fileno())
         except Exception as e:
             raise IOError(f"Failed to write to {filepath}: {str(e)}")
+        
+        if filepath == self.inbox_path and settings.INBOX_SNAPSHOT:
+            try:
+                self._write_snapshot(data, (written.st_mtime_ns, written.st_size))
+            except Exception as e:
+                # inbox.json is the source of truth; readers rebuild a stale snapshot
+                print(f"Warning: Failed to write inbox snapshot: {e}")
+    
+    # ========== Inbox Snapshot ==========
+    
+    def _inbox_stat(self) -> tuple:
+        stat = os.stat(self.inbox_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _write_snapshot(self, emails_data: List[Dict[str, Any]], source: tuple) -> None:
+        """Snapshot emails_data, read from or written to inbox.json when it had stat `source`"""
+        with span("storage.write", file=self.snapshot_path.name), \
+                storage_duration.time(operation="write", file=self.snapshot_path.name):
+            InboxSnapshot.write(self.snapshot_path, emails_data, source)
+    
+    def _inbox_snapshot(self) -> InboxSnapshot:
+        """
+        Memory-mapped snapshot of inbox.json
+        
+        Reuses the current mapping while the snapshot file is unchanged,
+        reopens it after another worker rewrote it, and rebuilds it from
+        inbox.json when inbox.json changed without it (e.g. edited by hand).
+        """
+        with self._snapshot_lock:
+            source = self._inbox_stat()
+            snapshot = self._snapshot
+            try:
+                stat = os.stat(self.snapshot_path)
+                file_id = (stat.st_ino, stat.st_mtime_ns)
+            except FileNotFoundError:
+                file_id = None
+            
+            if snapshot is None or snapshot.file_id != file_id:
+                snapshot = None
+                if file_id is not None:
+                    try:
+                        snapshot = InboxSnapshot(self.snapshot_path)
+                    except ValueError as e:
+                        print(f"Warning: Ignoring inbox snapshot: {e}")
+            
+            fresh = snapshot is not None and snapshot.source == source
+            record_cache("inbox_snapshot", hit=fresh)
+            if not fresh:
+                # Stamped with the stat taken before reading: a write landing
+                # meanwhile leaves the snapshot looking stale, never fresh
+                self._write_snapshot(self._read_json(self.inbox_path), source)
+                snapshot = InboxSnapshot(self.snapshot_path)
+            self._snapshot = snapshot
+            return snapshot
+    
+    def _inbox_records(self) -> Iterable[Dict[str, Any]]:
+        """inbox.json entries, decoded from the snapshot when enabled"""
+        if settings.INBOX_SNAPSHOT:
+            return self._inbox_snapshot()
+        return self._read_json(self.inbox_path)
     
     # ========== Email Operations ==========
     
     def read_emails(self) -> List[Email]:
         """Read emails from inbox.json and convert to frontend format"""
-        emails_data = self._read_json(self.inbox_path)
+        emails_data = self._inbox_records()
         
         # Convert internal format to API format
-        emails = []
-        for email_dict in emails_data:
-            # Parse as internal model
-            email_internal = EmailInternal(**email_dict)
-            
-            # Convert to API model with computed date
-            email_api = Email(
-                id=email_internal.id,
-                sender=email_internal.sender,
-                senderAvatar=email_internal.senderAvatar,
-                subject=email_internal.subject,
-                body=email_internal.body,
-                timestamp=email_internal.timestamp,
-                date=self.format_relative_date(email_internal.timestamp),
-                tags=email_internal.tags,
-                read=email_internal.read,
-                preview=email_internal.preview
-            )
-            emails.append(email_api)
-        
-        return emails
+        return [self.to_api_email(EmailInternal(**email_dict)) for email_dict in emails_data]
+    
+    def to_api_email(self, email_internal: EmailInternal) -> Email:
+        """Convert a stored email to the API model with computed date"""
+        return Email(
+            id=email_internal.id,
+            sender=email_internal.sender,
+            senderAvatar=email_internal.senderAvatar,
+            subject=email_internal.subject,
+            body=email_internal.body,
+            timestamp=email_internal.timestamp,
+            date=self.format_relative_date(email_internal.timestamp),
+            tags=email_internal.tags,
+            read=email_internal.read,
+            preview=email_internal.preview,
+            threadId=thread_id_of(email_internal)
+        )
     
     def write_emails(self, emails: List[EmailInternal]) -> None:
-        """Write emails to inbox.json (internal format only)"""
+        """
+        Write emails to inbox.json (internal format only)
+        
+        New emails are threaded and, when NEAR_DUPLICATES_ENABLED, signed and
+        matched to a near-duplicate cluster.
+        """
+        assign_threads(emails)
+        if settings.NEAR_DUPLICATES_ENABLED:
+            assign_near_duplicates(emails, settings.NEAR_DUPLICATE_MAX_DISTANCE)
         emails_data = [email.model_dump() for email in emails]
         self._write_json(self.inbox_path, emails_data)
     
+    def merge_categorized_emails(self, emails: List[EmailInternal]) -> List[EmailInternal]:
+        """
+        Save tags worked out from an earlier read of the inbox
+        
+        Ingest awaits the LLM between reading and writing, during which
+        uploads, deletes, imports and tag edits (also from other processes)
+        may have changed inbox.json. The inbox is re-read and only emails
+        still present take the results: tags (and tagSource) when still
+        untagged, threadId, simhash and duplicateOf when still unset.
+        Emails added meanwhile are kept, deleted ones stay deleted.
+        
+        Returns:
+            The inbox as written
+        """
+        results = {email.id: email for email in emails}
+        current = [EmailInternal(**e) for e in self._read_json(self.inbox_path)]
+        for email in current:
+            result = results.get(email.id)
+            if result is None:
+                continue
+            if not email.tags and result.tags:
+                email.tags, email.tagSource = result.tags, result.tagSource
+            if email.threadId is None:
+                email.threadId = result.threadId
+            if email.simhash is None:
+                email.simhash, email.duplicateOf = result.simhash, result.duplicateOf
+        self.write_emails(current)
+        return current
+    
+    def write_emails_stream(self, emails: Iterable[EmailInternal], replace: bool = False) -> Tuple[int, int]:
+        """
+        Add emails to inbox.json one at a time, for imports too large to hold in memory
+        
+        Writes a new inbox.json alongside the old one (existing emails first,
+        unless replace) and swaps it in at the end. Emails whose ID is
+        already present are skipped. New emails are threaded (and matched to
+        a near-duplicate cluster) as they are written. The inbox snapshot is
+        rebuilt on the next read.
+        
+        Returns:
+            (emails written, duplicates skipped)
+        """
+        temp = self.inbox_path.with_name(f".{self.inbox_path.name}.{os.getpid()}.tmp")
+        seen = set()
+        threads = ThreadIndex()
+        duplicates = NearDuplicateIndex(settings.NEAR_DUPLICATE_MAX_DISTANCE) if settings.NEAR_DUPLICATES_ENABLED else None
+        written = skipped = 0
+        try:
+            with span("storage.write", file=self.inbox_path.name), \
+                    storage_duration.time(operation="write", file=self.inbox_path.name), \
+                    open(temp, 'w', encoding='utf-8') as f:
+                f.write("[")
+                
+                def append(email_dict: Dict[str, Any]) -> None:
+                    # Same layout as json.dump(..., indent=2) of the whole list
+                    f.write("," if seen else "")
+                    f.write("\n  " + json.dumps(email_dict, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                    seen.add(email_dict["id"])
+                
+                if not replace and self.inbox_path.exists():
+                    for email_dict in self._inbox_records():
+                        email = EmailInternal(**email_dict)
+                        changed = False
+                        if email.threadId:
+                            threads.add(email, email.threadId)
+                        else:
+                            threads.assign(email)  # written before threading
+                            changed = True
+                        if duplicates is not None:
+                            if email.simhash is None:
+                                sign_emails([email])  # written before near-duplicate detection
+                                duplicates.assign(email)
+                                changed = True
+                            elif email.simhash and not email.duplicateOf:
+                                duplicates.add(email.id, int(email.simhash, 16))
+                        append(email.model_dump() if changed else email_dict)
+                for email in emails:
+                    if email.id in seen:
+                        skipped += 1
+                        continue
+                    if not email.threadId:
+                        threads.assign(email)
+                    else:
+                        threads.add(email, email.threadId)
+                    if duplicates is not None:
+                        if email.simhash is None:
+                            sign_emails([email])
+                        duplicates.assign(email)
+                    append(email.model_dump())
+                    written += 1
+                f.write("\n]" if seen else "]")
+            os.replace(temp, self.inbox_path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+        return written, skipped
+    
     def get_email_by_id(self, email_id: str) -> EmailInternal | None:
         """Get a single email by ID"""
+        if settings.INBOX_SNAPSHOT:
+            email_dict = self._inbox_snapshot().find(email_id)
+            return EmailInternal(**email_dict) if email_dict is not None else None
+        
         emails_data = self._read_json(self.inbox_path)
         for email_dict in emails_data:
             if email_dict.get('id') == email_id:
                 return EmailInternal(**email_dict)
         return None
     
+    # ========== Thread Operations ==========
+    
+    def _thread_map(self) -> Dict[str, List[str]]:
+        """Email IDs of each thread, oldest first (cached until inbox.json changes)"""
+        with self._thread_lock:
+            source = self._inbox_stat()
+            fresh = source == self._thread_members_source
+            record_cache("thread_index", hit=fresh)
+            if not fresh:
+                emails = [EmailInternal(**e) for e in self._inbox_records()]
+                self._thread_members = {
+                    thread_id: [email.id for email in thread]
+                    for thread_id, thread in group_by_thread(emails).items()
+                }
+                self._thread_members_source = source
+            return self._thread_members
+    
+    def read_threads(self) -> List[EmailThread]:
+        """Emails grouped into conversations, most recently active first"""
+        emails = [EmailInternal(**e) for e in self._inbox_records()]
+        
+        threads = []
+        for thread_id, thread in group_by_thread(emails).items():
+            latest = thread[-1]
+            tags = {}
+            for email in thread:
+                for tag in email.tags:
+                    tags.setdefault(tag.label.lower(), tag)
+            
+            threads.append(EmailThread(
+                id=thread_id,
+                subject=thread[0].subject,
+                participants=list(dict.fromkeys(email.sender for email in thread)),
+                emailIds=[email.id for email in thread],
+                count=len(thread),
+                unreadCount=sum(not email.read for email in thread),
+                tags=list(tags.values()),
+                senderAvatar=latest.senderAvatar,
+                preview=latest.preview,
+                timestamp=latest.timestamp,
+                date=self.format_relative_date(latest.timestamp)
+            ))
+        
+        threads.sort(key=lambda thread: thread.timestamp, reverse=True)
+        return threads
+    
+    def read_thread(self, thread_id: str) -> List[EmailInternal]:
+        """Emails in a thread, oldest first (empty if there is no such thread)"""
+        emails = (self.get_email_by_id(email_id) for email_id in self._thread_map().get(thread_id, []))
+        return [email for email in emails if email is not None]
+    
+    def thread_contexts(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Collapse vector search hits into one context entry per conversation
+        
+        Hits from the same thread are merged, and a hit in a longer thread is
+        replaced by the whole conversation with repeated quoted text removed.
+        Each entry lists the emails it covers under "emailIds".
+        """
+        thread_map = self._thread_map()
+        contexts = []
+        used = set()
+        for hit in hits:
+            email = self.get_email_by_id(hit["id"])
+            thread_id = thread_id_of(email) if email is not None else None
+            if thread_id in used:
+                continue
+            member_ids = thread_map.get(thread_id, [])
+            if len(member_ids) < 2:
+                contexts.append({**hit, "emailIds": [hit["id"]]})
+                continue
+            
+            used.add(thread_id)
+            thread = self.read_thread(thread_id)
+            contexts.append({
+                "id": hit["id"],
+                "sender": ", ".join(dict.fromkeys(e.sender for e in thread)),
+                "subject": thread[0].subject,
+                "body": conversation_text(thread, settings.THREAD_CONTEXT_CHARS),
+                "timestamp": thread[-1].timestamp,
+                "emailIds": [e.id for e in thread]
+            })
+        return contexts
+    
+    # ========== Search ==========
+    
+    def sync_search_index(self) -> None:
+        """Apply inbox.json changes since the last search to the search index"""
+        snapshot = self._inbox_snapshot()
+        fresh = snapshot.source == self._search_index.source
+        record_cache("search_index", hit=fresh)
+        with span("search.sync"):
+            self._search_index.sync(snapshot)
+    
+    def search_emails(
+        self,
+        query: str,
+        tags: Optional[List[str]] = None,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Tuple[int, List[Tuple[EmailInternal, str, str]]]:
+        """
+        Full-text search over sender, subject and body, newest first
+        
+        Args:
+            query: Words, "exact phrases" and prefix* terms, all required
+            tags: Tag labels the emails must have
+            after / before: Timestamp range (after inclusive, before exclusive)
+            
+        Returns:
+            (total matches, [(email, highlighted body snippet, highlighted subject)])
+        """
+        self.sync_search_index()
+        parsed = SearchQuery.parse(query)
+        with span("search.query"):
+            total, records = self._search_index.search(
+                parsed,
+                tags=tags,
+                after=after.timestamp() if after is not None else None,
+                before=before.timestamp() if before is not None else None,
+                limit=limit,
+                offset=offset
+            )
+        
+        pattern = parsed.pattern()
+        hits = []
+        for record in records:
+            email = EmailInternal(**record)
+            hits.append((email, highlight(email.body, pattern, SNIPPET_CHARS), highlight(email.subject, pattern)))
+        return total, hits
+    
     # ========== Draft Operations ==========
     
     def read_drafts(self) -> List[Draft]:
@@ -115,12 +456,17 @@ class FileService:
                 emailSubject=draft_internal.emailSubject,
                 content=draft_internal.content,
                 timestamp=draft_internal.timestamp,
-                lastSaved=self.format_relative_date(draft_internal.timestamp)
+                lastSaved=self.format_relative_date(draft_internal.timestamp),
+                revision=draft_internal.revision
             )
             drafts.append(draft_api)
         
         return drafts
     
+    def read_drafts_internal(self) -> List[DraftInternal]:
+        """Read drafts from drafts.json in storage format"""
+        return [DraftInternal(**draft_dict) for draft_dict in self._read_json(self.drafts_path)]
+    
     def write_drafts(self, drafts: List[DraftInternal]) -> None:
         """Write drafts to drafts.json (internal format only)"""
         drafts_data = [draft.model_dump() for draft in drafts]
@@ -158,6 +504,37 @@ class FileService:
         """Write prompts to prompts.json"""
         self._write_json(self.prompts_path, prompts.model_dump())
     
+    # ========== Prepared Reply Operations ==========
+    
+    def read_prepared_replies(self) -> Dict[str, PreparedReply]:
+        """Read pre-generated replies keyed by email ID"""
+        if not self.prepared_replies_path.exists():
+            return {}
+        replies_data = self._read_json(self.prepared_replies_path)
+        return {
+            reply_dict['emailId']: PreparedReply(**reply_dict)
+            for reply_dict in replies_data
+        }
+    
+    def write_prepared_replies(self, replies: Dict[str, PreparedReply]) -> None:
+        """Write pre-generated replies to prepared_replies.json"""
+        self._write_json(
+            self.prepared_replies_path,
+            [reply.model_dump() for reply in replies.values()]
+        )
+    
+    # ========== Digest Operations ==========
+    
+    def read_digest(self) -> InboxDigestInternal:
+        """Read the stored inbox digest (empty before the first refresh)"""
+        if not self.digest_path.exists():
+            return InboxDigestInternal()
+        return InboxDigestInternal(**self._read_json(self.digest_path))
+    
+    def write_digest(self, digest: InboxDigestInternal) -> None:
+        """Write the inbox digest to digest.json"""
+        self._write_json(self.digest_path, digest.model_dump())
+    
     # ========== Utility Functions ==========
     
     @staticmethod
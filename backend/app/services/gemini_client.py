@@ -0,0 +1,324 @@
+import httpx
+import json
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Dict, Any, Optional
+from app.config import settings
+from app.services.cassette import CassetteTransport, cassette_for
+from app.services.metrics import llm_tokens, track_upstream
+from app.services.resilience import (
+    AdaptiveRateLimiter, call_with_retry, gemini_embed_limiter,
+    gemini_generate_limiter, parse_duration
+)
+
+
+class GeminiAPIError(Exception):
+    """Non-2xx response from the Gemini REST API"""
+    
+    def __init__(
+        self,
+        status_code: int,
+        message: str,
+        headers: Optional[Dict[str, str]] = None,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(f"Gemini API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+        self.headers = headers or {}
+        self.retry_after = retry_after
+
+
+@dataclass
+class GenerationResult:
+    """Text and token usage returned by a generateContent call"""
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+class GeminiClient:
+    """
+    Async client for the Gemini REST API
+    
+    One instance is shared by LLMService and VectorService so every call goes
+    through the same pooled HTTP transport (keep-alive connections, HTTP/2
+    multiplexing when available). Each call accepts its own timeout, and is
+    rate limited and retried with backoff (see app/services/resilience.py).
+    """
+    
+    def __init__(self, api_key: str = None, base_url: str = None):
+        self.api_key = api_key if api_key is not None else settings.GEMINI_API_KEY
+        self.base_url = (base_url or settings.GEMINI_API_BASE).rstrip('/')
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    # ========== Connection Pool ==========
+    
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The pooled HTTP client (created on first use)"""
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+            transport = None
+            cassette = cassette_for("gemini")
+            if cassette is not None:
+                # Record through the real pooled transport, or replay without one
+                inner = (
+                    httpx.AsyncHTTPTransport(http2=settings.HTTP2_ENABLED, limits=limits)
+                    if cassette.mode == "record" else None
+                )
+                transport = CassetteTransport(cassette, inner)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                http2=settings.HTTP2_ENABLED,
+                limits=limits,
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=10.0),
+                transport=transport
+            )
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close pooled connections (called on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    # ========== API Calls ==========
+    
+    async def generate_content(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        timeout: float = None
+    ) -> GenerationResult:
+        """
+        Call models/{model}:generateContent
+        
+        Args:
+            model: Model name (e.g. 'gemini-2.5-pro')
+            prompt: Full prompt text
+            generation_config: SDK-style config ('temperature', 'max_output_tokens', ...)
+            timeout: Seconds before the call is abandoned (default LLM_TIMEOUT_SECONDS)
+            
+        Returns:
+            GenerationResult with the candidate text and token counts
+        """
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": self._to_rest_config(generation_config)
+        }
+        data = await self._post(
+            f"/{self._model_path(model)}:generateContent",
+            payload,
+            timeout or settings.LLM_TIMEOUT_SECONDS,
+            gemini_generate_limiter,
+            "generate"
+        )
+        
+        usage = data.get("usageMetadata", {})
+        self._record_usage(model, usage)
+        return GenerationResult(
+            text=self._candidate_text(data),
+            prompt_tokens=usage.get("promptTokenCount", 0),
+            output_tokens=usage.get("candidatesTokenCount", 0)
+        )
+    
+    async def stream_generate_content(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        timeout: float = None
+    ) -> AsyncIterator[str]:
+        """
+        Call models/{model}:streamGenerateContent over server-sent events
+        
+        Opening the stream is rate limited and retried like any other call;
+        once text has started arriving a failure propagates to the caller,
+        since retrying would repeat text that was already delivered.
+        
+        Yields:
+            Text chunks as Gemini produces them
+        """
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": self._to_rest_config(generation_config)
+        }
+        request = self.http.build_request(
+            "POST",
+            f"/{self._model_path(model)}:streamGenerateContent",
+            params={"alt": "sse"},
+            json=payload,
+            timeout=timeout or settings.LLM_TIMEOUT_SECONDS
+        )
+        
+        async def open_stream() -> httpx.Response:
+            response = await self.http.send(request, stream=True)
+            gemini_generate_limiter.observe_headers(response.headers)
+            if response.status_code >= 400:
+                await response.aread()
+                await response.aclose()
+                raise GeminiAPIError(
+                    response.status_code,
+                    self._error_message(response),
+                    dict(response.headers),
+                    self._retry_delay(response)
+                )
+            return response
+        
+        with track_upstream("gemini", "stream_generate"):
+            response = await call_with_retry("gemini", open_stream, gemini_generate_limiter)
+            usage = {}
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[len("data:"):])
+                    usage = data.get("usageMetadata", usage)
+                    candidates = data.get("candidates") or []
+                    parts = candidates[0].get("content", {}).get("parts", []) if candidates else []
+                    text = "".join(part.get("text", "") for part in parts)
+                    if text:
+                        yield text
+            finally:
+                await response.aclose()
+                self._record_usage(model, usage)
+    
+    async def embed_content(
+        self,
+        text: str,
+        task_type: str = "retrieval_document",
+        model: str = None,
+        timeout: float = None
+    ) -> List[float]:
+        """Call {model}:embedContent and return the embedding values"""
+        model_path = self._model_path(model or settings.GEMINI_EMBEDDING_MODEL)
+        payload = {
+            "model": model_path,
+            "content": {"parts": [{"text": text}]},
+            "taskType": task_type.upper()
+        }
+        data = await self._post(
+            f"/{model_path}:embedContent",
+            payload,
+            timeout or settings.EMBEDDING_TIMEOUT_SECONDS,
+            gemini_embed_limiter,
+            "embed"
+        )
+        return data["embedding"]["values"]
+    
+    async def batch_embed_contents(
+        self,
+        texts: List[str],
+        task_type: str = "retrieval_document",
+        model: str = None,
+        timeout: float = None
+    ) -> List[List[float]]:
+        """Call {model}:batchEmbedContents (max 100 texts per call)"""
+        model_path = self._model_path(model or settings.GEMINI_EMBEDDING_MODEL)
+        payload = {
+            "requests": [
+                {
+                    "model": model_path,
+                    "content": {"parts": [{"text": text}]},
+                    "taskType": task_type.upper()
+                }
+                for text in texts
+            ]
+        }
+        data = await self._post(
+            f"/{model_path}:batchEmbedContents",
+            payload,
+            timeout or settings.EMBEDDING_TIMEOUT_SECONDS,
+            gemini_embed_limiter,
+            "batch_embed"
+        )
+        return [embedding["values"] for embedding in data["embeddings"]]
+    
+    async def get_model(self, model: str, timeout: float = None) -> Dict[str, Any]:
+        """
+        Fetch model metadata (models/{model}); used as a cheap health probe
+        
+        Single attempt, not rate limited and no tokens spent, so probing
+        never competes with real traffic for quota.
+        """
+        response = await self.http.get(f"/{self._model_path(model)}", timeout=timeout or 5.0)
+        if response.status_code >= 400:
+            raise GeminiAPIError(response.status_code, self._error_message(response), dict(response.headers))
+        return response.json()
+    
+    # ========== Helpers ==========
+    
+    async def _post(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: float,
+        limiter: AdaptiveRateLimiter,
+        operation: str
+    ) -> Dict[str, Any]:
+        """POST with rate limiting, per-attempt timeout and jittered retries"""
+        async def attempt() -> Dict[str, Any]:
+            response = await self.http.post(path, json=payload, timeout=timeout)
+            limiter.observe_headers(response.headers)
+            if response.status_code >= 400:
+                raise GeminiAPIError(
+                    response.status_code,
+                    self._error_message(response),
+                    dict(response.headers),
+                    self._retry_delay(response)
+                )
+            return response.json()
+        
+        with track_upstream("gemini", operation):
+            return await call_with_retry("gemini", attempt, limiter)
+    
+    @staticmethod
+    def _record_usage(model: str, usage: Dict[str, Any]) -> None:
+        llm_tokens.inc(usage.get("promptTokenCount", 0), model=model, direction="prompt")
+        llm_tokens.inc(usage.get("candidatesTokenCount", 0), model=model, direction="output")
+    
+    @staticmethod
+    def _model_path(model: str) -> str:
+        return model if model.startswith("models/") else f"models/{model}"
+    
+    @staticmethod
+    def _to_rest_config(generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert SDK snake_case keys (max_output_tokens) to REST camelCase"""
+        rest_config = {}
+        for key, value in generation_config.items():
+            head, *rest = key.split('_')
+            rest_config[head + ''.join(part.capitalize() for part in rest)] = value
+        return rest_config
+    
+    @staticmethod
+    def _candidate_text(data: Dict[str, Any]) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            reason = data.get("promptFeedback", {}).get("blockReason", "no candidates returned")
+            raise ValueError(f"Gemini returned no text: {reason}")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+    
+    @staticmethod
+    def _retry_delay(response: httpx.Response) -> Optional[float]:
+        """Delay requested by a google.rpc.RetryInfo error detail, if any"""
+        try:
+            for detail in response.json()["error"].get("details", []):
+                if detail.get("@type", "").endswith("RetryInfo"):
+                    return parse_duration(detail["retryDelay"])
+        except Exception:
+            pass
+        return None
+    
+    @staticmethod
+    def _error_message(response: httpx.Response) -> str:
+        try:
+            return response.json()["error"]["message"]
+        except Exception:
+            return response.text[:200]
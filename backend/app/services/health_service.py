@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+from app.config import settings
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of the latest check of one dependency"""
+    status: str = "unknown"  # unknown | ok | failing
+    latency_ms: Optional[float] = None
+    checked_at: Optional[str] = None
+    error: Optional[str] = None
+    consecutive_failures: int = 0
+    _checked_monotonic: float = field(default=0.0, repr=False)
+    
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class HealthMonitor:
+    """
+    Background dependency probes behind /health/ready
+    
+    The store, vector backend and LLM backend are each checked every
+    HEALTH_PROBE_INTERVAL seconds from a background task, and readiness is
+    answered from the cached results. Health checks therefore cost nothing
+    upstream and never wait on a slow dependency, however often the load
+    balancer polls.
+    """
+    
+    def __init__(self, file_service, vector_service, gemini_client):
+        self.file_service = file_service
+        self.vector_service = vector_service
+        self.gemini_client = gemini_client
+        self.probes: Dict[str, Callable[[], Awaitable[None]]] = {
+            "store": self._probe_store,
+            "vector": self._probe_vector,
+            "llm": self._probe_llm,
+        }
+        self.results: Dict[str, ProbeResult] = {name: ProbeResult() for name in self.probes}
+        self._task: Optional[asyncio.Task] = None
+    
+    # ========== Lifecycle ==========
+    
+    def start(self) -> None:
+        """Start probing in the background (called from the app lifespan)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL)
+    
+    # ========== Probing ==========
+    
+    async def probe_all(self) -> None:
+        """Run every probe once, concurrently"""
+        await asyncio.gather(*(self._probe(name, probe) for name, probe in self.probes.items()))
+    
+    async def _probe(self, name: str, probe: Callable[[], Awaitable[None]]) -> None:
+        result = self.results[name]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe(), timeout=settings.HEALTH_PROBE_TIMEOUT)
+            result.status = "ok"
+            result.error = None
+            result.consecutive_failures = 0
+        except Exception as e:
+            result.consecutive_failures += 1
+            result.error = str(e) or type(e).__name__
+            # Tolerate a single blip before reporting the dependency as failing
+            if result.consecutive_failures >= settings.HEALTH_FAILURE_THRESHOLD or result.status == "unknown":
+                result.status = "failing"
+        result.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        result.checked_at = datetime.now(timezone.utc).isoformat()
+        result._checked_monotonic = time.monotonic()
+    
+    async def _probe_store(self) -> None:
+        """Prompts file readable and data directory writable"""
+        def check() -> None:
+            self.file_service.read_prompts()
+            if not os.access(settings.DATA_DIR, os.W_OK):
+                raise PermissionError(f"{settings.DATA_DIR} is not writable")
+        await asyncio.to_thread(check)
+    
+    async def _probe_vector(self) -> None:
+        """Pinecone reachable (index stats; connects on first probe)"""
+        await asyncio.to_thread(lambda: self.vector_service.index.describe_index_stats())
+    
+    async def _probe_llm(self) -> None:
+        """Gemini reachable and the reply model available (metadata only, no tokens)"""
+        await self.gemini_client.get_model(
+            settings.MODEL_ROUTES["reply"], timeout=settings.HEALTH_PROBE_TIMEOUT
+        )
+    
+    # ========== Reporting ==========
+    
+    def readiness(self) -> dict:
+        """
+        Cached readiness report
+        
+        Ready only when every probe has run, is passing and is fresh (a stalled
+        probe loop counts as not ready).
+        """
+        stale_after = settings.HEALTH_PROBE_INTERVAL * 3 + settings.HEALTH_PROBE_TIMEOUT
+        now = time.monotonic()
+        checks = {}
+        for name, result in self.results.items():
+            report = result.to_dict()
+            if result.status != "unknown" and now - result._checked_monotonic > stale_after:
+                report["status"] = "stale"
+            checks[name] = report
+        
+        statuses = {check["status"] for check in checks.values()}
+        if statuses == {"ok"}:
+            status = "ready"
+        elif "unknown" in statuses:
+            status = "starting"
+        else:
+            status = "degraded"
+        return {"status": status, "ready": status == "ready", "checks": checks}
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+
+class InboxSnapshot:
+    """
+    Read-only, memory-mapped binary copy of inbox.json
+    
+    Layout (little-endian):
+        header   magic, version, record count, inbox.json mtime_ns and size
+        keys     uint64 hash of each email ID, sorted (binary-searched by find)
+        rows     uint32 record number of each key
+        offsets  uint64 start of each field of each record, then the end
+        blobs    field values back to back (strings as UTF-8, the rest as JSON)
+        
+    Every uvicorn worker maps the same file, so its pages are held once in
+    the OS page cache however many workers run. Opening one only reads the
+    header; records are decoded when accessed. Snapshots are replaced
+    atomically (write to a temp file, then rename), so a reader keeps the
+    version it mapped until it reopens.
+    """
+    
+    MAGIC = b"INBXSNAP"
+    VERSION = 3
+    HEADER = struct.Struct("<8sIIqq")
+    
+    # Field order within a record; JSON_FIELDS are stored JSON-encoded
+    FIELDS = (
+        "id", "sender", "senderAvatar", "subject", "body", "timestamp",
+        "tags", "read", "preview", "tagSource",
+        "threadId", "messageId", "inReplyTo", "references",
+        "simhash", "duplicateOf"
+    )
+    JSON_FIELDS = frozenset({
+        "tags", "read", "tagSource", "threadId", "messageId", "inReplyTo", "references",
+        "simhash", "duplicateOf"
+    })
+    DEFAULTS = {
+        "tags": [], "read": False, "tagSource": None,
+        "threadId": None, "messageId": None, "inReplyTo": None, "references": [],
+        "simhash": None, "duplicateOf": None
+    }
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Identifies the file this mapping came from (a rewrite replaces it)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+        
+        magic, version, self.count, mtime_ns, size = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{self.path} is not an inbox snapshot (version {self.VERSION})")
+        # Stat of the inbox.json this snapshot was built from
+        self.source = (mtime_ns, size)
+        
+        position = self.HEADER.size
+        self._keys = np.frombuffer(self._map, dtype='<u8', count=self.count, offset=position)
+        position += 8 * self.count
+        self._rows = np.frombuffer(self._map, dtype='<u4', count=self.count, offset=position)
+        position += self._padded(4 * self.count)
+        offset_count = self.count * len(self.FIELDS) + 1
+        self._offsets = np.frombuffer(self._map, dtype='<u8', count=offset_count, offset=position)
+        self._blobs_start = position + 8 * offset_count
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(self.count):
+            yield self.record(row)
+    
+    def record(self, row: int, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Decode one email (same dict as its inbox.json entry), or only some fields"""
+        width = len(self.FIELDS)
+        bounds = self._offsets[row * width:(row + 1) * width + 1].tolist()
+        start = self._blobs_start
+        record = {}
+        for i, name in enumerate(self.FIELDS):
+            if fields is not None and name not in fields:
+                continue
+            text = self._map[start + bounds[i]:start + bounds[i + 1]].decode('utf-8')
+            record[name] = json.loads(text) if name in self.JSON_FIELDS else text
+        return record
+    
+    def find(self, email_id: str) -> Optional[Dict[str, Any]]:
+        """Decode the email with this ID, or None"""
+        key = self.id_key(email_id)
+        i = int(np.searchsorted(self._keys, key))
+        width = len(self.FIELDS)
+        id_index = self.FIELDS.index("id")
+        while i < self.count and self._keys[i] == key:
+            row = int(self._rows[i])
+            start = self._blobs_start + int(self._offsets[row * width + id_index])
+            end = self._blobs_start + int(self._offsets[row * width + id_index + 1])
+            if self._map[start:end].decode('utf-8') == email_id:
+                return self.record(row)
+            i += 1
+        return None
+    
+    def row_keys(self) -> np.ndarray:
+        """ID hash (see id_key) of every record, in inbox order"""
+        keys = np.empty(self.count, dtype='<u8')
+        keys[self._rows] = self._keys
+        return keys
+    
+    def digests(self, first: str, last: str) -> np.ndarray:
+        """
+        CRC32 of the fields from `first` to `last` (in FIELDS order) of every record
+        
+        Computed on the stored bytes without decoding, so callers can find
+        the records that changed between two snapshots cheaply.
+        """
+        width = len(self.FIELDS)
+        rows = np.arange(self.count) * width
+        starts = (self._offsets[rows + self.FIELDS.index(first)] + self._blobs_start).tolist()
+        ends = (self._offsets[rows + self.FIELDS.index(last) + 1] + self._blobs_start).tolist()
+        view = memoryview(self._map)
+        try:
+            return np.fromiter(
+                (zlib.crc32(view[start:end]) for start, end in zip(starts, ends)),
+                dtype='<u4', count=self.count
+            )
+        finally:
+            view.release()
+    
+    @staticmethod
+    def id_key(email_id: str) -> int:
+        return int.from_bytes(hashlib.blake2b(email_id.encode('utf-8'), digest_size=8).digest(), 'little')
+    
+    @staticmethod
+    def _padded(size: int) -> int:
+        return (size + 7) // 8 * 8
+    
+    @classmethod
+    def write(cls, path: Path, emails: List[Dict[str, Any]], source: Tuple[int, int]) -> None:
+        """
+        Write a snapshot of emails (inbox.json entries) atomically
+        
+        Args:
+            path: Snapshot file to replace
+            emails: Email dicts in inbox order
+            source: (st_mtime_ns, st_size) of the inbox.json they were read from
+        """
+        path = Path(path)
+        offsets = []
+        blobs = []
+        position = 0
+        for email in emails:
+            for name in cls.FIELDS:
+                value = email.get(name, cls.DEFAULTS.get(name))
+                if name in cls.JSON_FIELDS:
+                    value = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+                blob = value.encode('utf-8')
+                offsets.append(position)
+                blobs.append(blob)
+                position += len(blob)
+        offsets.append(position)
+        
+        keys = np.fromiter((cls.id_key(e["id"]) for e in emails), dtype='<u8', count=len(emails))
+        order = np.argsort(keys, kind='stable')
+        rows_bytes = order.astype('<u4').tobytes()
+        
+        temp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp, 'wb') as f:
+                f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(emails), *source))
+                f.write(keys[order].tobytes())
+                f.write(rows_bytes.ljust(cls._padded(len(rows_bytes)), b'\0'))
+                f.write(np.asarray(offsets, dtype='<u8').tobytes())
+                f.writelines(blobs)
+            os.replace(temp, path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
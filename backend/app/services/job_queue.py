@@ -0,0 +1,223 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.models import Job
+from app.services.metrics import job_queue_depth
+
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite database
+    
+    Shared by the API (which enqueues) and worker processes (which claim and
+    run jobs); SQLite's locking makes each claim atomic across processes.
+    Jobs run highest priority first, then oldest first. A claimed job holds
+    a lease that its worker renews while running; if the worker dies the
+    lease expires and the job is retried. Failed attempts are retried with
+    exponential backoff until max_attempts is reached.
+    """
+    
+    STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            tenant TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            idempotency_key TEXT,
+            result TEXT,
+            error TEXT,
+            run_after REAL NOT NULL,
+            lease_until REAL,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency
+            ON jobs (tenant, idempotency_key) WHERE idempotency_key IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, created_at);
+    """
+    
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or settings.JOB_DB_FILE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection per thread (the API calls in from worker threads too)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        for status in self.STATUSES:
+            job_queue_depth.set_function(lambda status=status: self.count(status), status=status)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    # ========== Producers ==========
+    
+    def enqueue(
+        self,
+        job_type: str,
+        tenant: str,
+        payload: Optional[Dict[str, Any]] = None,
+        priority: int = 0,
+        idempotency_key: Optional[str] = None,
+        max_attempts: Optional[int] = None
+    ) -> Tuple[Job, bool]:
+        """
+        Queue a job
+        
+        Returns:
+            (job, created); with an idempotency key already used by this
+            tenant, the existing job and False
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, type, tenant, payload, priority, status, max_attempts, "
+                "idempotency_key, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, job_type, tenant, json.dumps(payload or {}), priority,
+                 max_attempts or settings.JOB_MAX_ATTEMPTS, idempotency_key, now, now, now)
+            )
+        except sqlite3.IntegrityError:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE tenant = ? AND idempotency_key = ?", (tenant, idempotency_key)
+            ).fetchone()
+            return self._to_job(row), False
+        return self.get(job_id), True
+    
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started; False if it is no longer queued"""
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (now, now, job_id)
+        )
+        return cursor.rowcount == 1
+    
+    # ========== Workers ==========
+    
+    def claim(self, worker: str) -> Optional[Job]:
+        """Lease the next runnable job to a worker, or None if there is none"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker stopped renewing the lease have used up an attempt
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker lost (lease expired)', "
+                "updated_at = ?, finished_at = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                (now, now, now)
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                "lease_until = ?, updated_at = ? WHERE id = ?",
+                (worker, now + settings.JOB_LEASE_SECONDS, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+    
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extend a running job's lease; False if the worker no longer holds it"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + settings.JOB_LEASE_SECONDS, time.time(), job_id, worker)
+        )
+        return cursor.rowcount == 1
+    
+    def complete(self, job_id: str, worker: str, result: Any = None) -> None:
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status = 'succeeded', result = ?, lease_until = NULL, "
+            "updated_at = ?, finished_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result, default=str), now, now, job_id, worker)
+        )
+    
+    def fail(self, job_id: str, worker: str, error: str) -> None:
+        """Record a failed attempt; requeue with backoff unless attempts are used up"""
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET error = ?, lease_until = NULL, updated_at = ?, "
+            "status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+            "run_after = ? * (1 << (attempts - 1)) + ?, "
+            "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, now, settings.JOB_RETRY_BACKOFF, now, now, job_id, worker)
+        )
+    
+    # ========== Queries ==========
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+    
+    def list(self, tenant: str, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        """A tenant's jobs, newest first"""
+        query = "SELECT * FROM jobs WHERE tenant = ?"
+        params: list = [tenant]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [self._to_job(row) for row in self._connect().execute(query, params)]
+    
+    def count(self, status: str) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+    
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        def iso(value: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(value, timezone.utc).isoformat() if value is not None else None
+        
+        return Job(
+            id=row["id"],
+            type=row["type"],
+            tenant=row["tenant"],
+            payload=json.loads(row["payload"]),
+            priority=row["priority"],
+            status=row["status"],
+            attempts=row["attempts"],
+            maxAttempts=row["max_attempts"],
+            idempotencyKey=row["idempotency_key"],
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+            createdAt=iso(row["created_at"]),
+            updatedAt=iso(row["updated_at"]),
+            finishedAt=iso(row["finished_at"])
+        )
@@ -0,0 +1,38 @@
+import threading
+from typing import Any, Callable
+
+
+class LazyService:
+    """
+    Stand-in for a global service that builds it on first attribute access
+    
+    Lets routers import the global services at startup while construction
+    (and anything the constructor touches) waits until the service is first
+    used, or is warmed up ahead of time with `resolve()`.
+    """
+    
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+    
+    def resolve(self) -> Any:
+        """The underlying service, built on first call"""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    object.__setattr__(self, "_instance", self._factory())
+                instance = self._instance
+        return instance
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+    
+    def __repr__(self) -> str:
+        if self._instance is None:
+            return "<LazyService (not built)>"
+        return f"<LazyService {self._instance!r}>"
@@ -1,8 +1,47 @@
-import google.generativeai as genai
-from typing import List
+from collections import deque
+from typing import TYPE_CHECKING, AsyncIterator, List, Tuple
+import hashlib
 import json
+import time
 from app.config import settings
 from app.models import Tag
+from app.services.gemini_client import GeminiAPIError, GeminiClient, GenerationResult
+from app.services.metrics import llm_fallbacks
+from app.services.resilience import UpstreamUnavailableError
+from app.services.singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+class TierStats:
+    """Call count, latency and error tracking for one model tier"""
+    
+    def __init__(self, model: str, window: int = 1000):
+        self.model = model
+        self.calls = 0
+        self.errors = 0
+        self._latencies_ms = deque(maxlen=window)  # most recent calls only
+    
+    def record(self, latency_ms: float, error: bool = False) -> None:
+        self.calls += 1
+        self.errors += int(error)
+        self._latencies_ms.append(latency_ms)
+    
+    def summary(self) -> dict:
+        latencies = sorted(self._latencies_ms)
+        
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1)
+        
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+        }
 
 class LLMService:
     """Wrapper for Google Gemini AI operations"""
@@ -18,10 +57,57 @@ class LLMService:
         "default": "bg-gray-100 text-gray-700"
     }
     
-    def __init__(self):
-        # Configure Gemini
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+    def __init__(self, client: GeminiClient = None):
+        # SDK models for the sync methods, created on first use so importing
+        # this module does not pay for the google.generativeai import
+        self._sync_models = {}
+        
+        # Shared async client (pooled HTTP transport) for the *_async methods
+        self.client = client or GeminiClient()
+        
+        # Identical concurrent requests (double-clicks, several tabs) share one call
+        self.in_flight = SingleFlight("llm_generate")
+        
+        # Categorization cascade statistics
+        self.tier_stats = {
+            tier: TierStats(self.model_for(tier))
+            for tier in ("categorization_fast", "categorization")
+        }
+        self.cascade_total = 0
+        self.cascade_escalations = 0
+    
+    # ========== Model Routing ==========
+    
+    def model_for(self, task: str) -> str:
+        """Model configured for a task ('categorization', 'reply', 'rag', ...)"""
+        return settings.MODEL_ROUTES.get(task, settings.GEMINI_MODEL)
+    
+    @property
+    def model(self) -> "genai.GenerativeModel":
+        """SDK model for GEMINI_MODEL"""
+        return self._get_sync_model(settings.GEMINI_MODEL)
+    
+    def _sync_model(self, task: str) -> "genai.GenerativeModel":
+        """SDK model object for a task (created once per model name)"""
+        return self._get_sync_model(self.model_for(task))
+    
+    def _get_sync_model(self, name: str) -> "genai.GenerativeModel":
+        if name not in self._sync_models:
+            import google.generativeai as genai
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            self._sync_models[name] = genai.GenerativeModel(name)
+        return self._sync_models[name]
+    
+    def cascade_stats(self) -> dict:
+        """Per-tier latency and the categorization escalation rate"""
+        return {
+            "enabled": settings.CATEGORIZATION_CASCADE,
+            "confidence_threshold": settings.CATEGORIZATION_CONFIDENCE_THRESHOLD,
+            "categorizations": self.cascade_total,
+            "escalations": self.cascade_escalations,
+            "escalation_rate": round(self.cascade_escalations / self.cascade_total, 3) if self.cascade_total else 0.0,
+            "tiers": {tier: stats.summary() for tier, stats in self.tier_stats.items()},
+        }
     
     def categorize_email(self, email_body: str, subject: str, categorization_prompt: str) -> List[Tag]:
         """
@@ -36,51 +122,55 @@ class LLMService:
             List of Tag objects with label and color
         """
         try:
-            # Construct the prompt
-            full_prompt = f"""{categorization_prompt}
-
-Subject: {subject}
-
-Email Body:
-{email_body}
-
-Return ONLY a JSON array of tag labels, nothing else. Example: ["Urgent", "Work"]"""
-            
             # Call Gemini
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config={
-                    'temperature': settings.TEMPERATURE_CATEGORIZATION,
-                    'max_output_tokens': 1000,
-                    'response_mime_type': 'application/json'
-                }
+            response = self._sync_model("categorization").generate_content(
+                self._build_categorization_prompt(email_body, subject, categorization_prompt),
+                generation_config=self._categorization_config()
             )
             
-            # Parse response
-            response_text = response.text.strip()
-            
-            # Remove markdown code blocks if present
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
+            return self._parse_tags(response.text)
             
-            # Parse JSON
-            tag_labels = json.loads(response_text)
-            
-            # Convert to Tag objects with colors
-            tags = []
-            for label in tag_labels:
-                if isinstance(label, str):
-                    color = self._get_tag_color(label)
-                    tags.append(Tag(label=label, color=color))
+        except Exception as e:
+            print(f"Error categorizing email: {e}")
+            llm_fallbacks.inc(task="categorization")
+            # Return default tag on error
+            return [Tag(label="Uncategorized", color=self.TAG_COLORS["default"])]
+    
+    async def categorize_email_async(self, email_body: str, subject: str, categorization_prompt: str) -> List[Tag]:
+        """
+        Awaitable version of categorize_email (uses the pooled async client)
+        
+        With CATEGORIZATION_CASCADE on, the fast model answers first with a
+        confidence score; only answers below CATEGORIZATION_CONFIDENCE_THRESHOLD
+        (or fast-tier failures) are escalated to the Pro model.
+        
+        Unlike the sync version, upstream failures (quota, timeouts, API
+        errors that survive retries) are raised instead of being turned into
+        an "Uncategorized" tag, so callers can leave the email for a later run.
+        """
+        try:
+            if settings.CATEGORIZATION_CASCADE:
+                self.cascade_total += 1
+                try:
+                    tags, confidence = await self._categorize_fast(email_body, subject, categorization_prompt)
+                    if confidence >= settings.CATEGORIZATION_CONFIDENCE_THRESHOLD:
+                        return tags
+                except Exception as e:
+                    print(f"Fast categorization failed, escalating: {e}")
+                self.cascade_escalations += 1
             
-            return tags if tags else [Tag(label="Uncategorized", color=self.TAG_COLORS["default"])]
+            result = await self._timed_generate(
+                "categorization",
+                self._build_categorization_prompt(email_body, subject, categorization_prompt),
+                self._categorization_config()
+            )
+            return self._parse_tags(result.text)
             
+        except (UpstreamUnavailableError, GeminiAPIError):
+            raise
         except Exception as e:
             print(f"Error categorizing email: {e}")
-            # Return default tag on error
+            llm_fallbacks.inc(task="categorization")
             return [Tag(label="Uncategorized", color=self.TAG_COLORS["default"])]
     
     def generate_reply(self, sender: str, subject: str, email_body: str, reply_prompt: str) -> str:
@@ -97,32 +187,74 @@ Return ONLY a JSON array of tag labels, nothing else. Example: ["Urgent", "Work"
             Generated reply text
         """
         try:
-            # Construct the prompt
-            full_prompt = f"""{reply_prompt}
-
-Original Email:
-From: {sender}
-Subject: {subject}
-
-{email_body}
-
-Generate a professional reply:"""
-            
             # Call Gemini
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config={
-                    'temperature': settings.TEMPERATURE_REPLY,
-                    'max_output_tokens': settings.MAX_TOKENS,
-                }
+            response = self._sync_model("reply").generate_content(
+                self._build_reply_prompt(sender, subject, email_body, reply_prompt),
+                generation_config=self._reply_config()
             )
             
             return response.text.strip()
             
         except Exception as e:
             print(f"Error generating reply: {e}")
+            llm_fallbacks.inc(task="reply")
+            return f"Thank you for your email, {sender}. I appreciate your message and will respond soon."
+    
+    async def generate_reply_async(
+        self,
+        sender: str,
+        subject: str,
+        email_body: str,
+        reply_prompt: str,
+        fallback: bool = True
+    ) -> str:
+        """
+        Awaitable version of generate_reply (uses the pooled async client)
+        
+        Upstream failures are raised rather than answered with a canned reply.
+        
+        Args:
+            fallback: Answer other failures (e.g. a blocked response) with a
+                canned reply; with False they raise, as does an empty reply,
+                for callers that store the result
+        """
+        try:
+            result = await self._generate(
+                self.model_for("reply"),
+                self._build_reply_prompt(sender, subject, email_body, reply_prompt),
+                self._reply_config()
+            )
+            reply = result.text.strip()
+            if not reply and not fallback:
+                raise ValueError("Gemini returned an empty reply")
+            return reply
+            
+        except (UpstreamUnavailableError, GeminiAPIError):
+            raise
+        except Exception as e:
+            if not fallback:
+                raise
+            print(f"Error generating reply: {e}")
+            llm_fallbacks.inc(task="reply")
             return f"Thank you for your email, {sender}. I appreciate your message and will respond soon."
     
+    async def stream_reply(self, sender: str, subject: str, email_body: str, reply_prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a reply as Gemini generates it
+        
+        Unlike generate_reply_async there is no canned fallback: errors
+        propagate so the caller can report them on the open stream.
+        
+        Yields:
+            Reply text chunks
+        """
+        async for chunk in self.client.stream_generate_content(
+            self.model_for("reply"),
+            self._build_reply_prompt(sender, subject, email_body, reply_prompt),
+            self._reply_config()
+        ):
+            yield chunk
+    
     def answer_with_context(self, question: str, context_emails: List[dict], rag_prompt: str) -> str:
         """
         Answer a question using email context (RAG)
@@ -136,14 +268,163 @@ Generate a professional reply:"""
             AI-generated answer
         """
         try:
-            # Format context emails
-            context_text = "\n\n---\n\n".join([
-                f"Email from {email['sender']}:\nSubject: {email['subject']}\n{email['body']}"
-                for email in context_emails
-            ])
+            # Call Gemini
+            response = self._sync_model("rag").generate_content(
+                self._build_rag_prompt(question, context_emails, rag_prompt),
+                generation_config=self._rag_config()
+            )
+            
+            return response.text.strip()
             
-            # Construct the prompt
-            full_prompt = f"""{rag_prompt}
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            llm_fallbacks.inc(task="rag")
+            return "I'm sorry, I couldn't find relevant information in your emails to answer that question."
+    
+    async def answer_with_context_async(self, question: str, context_emails: List[dict], rag_prompt: str) -> str:
+        """
+        Awaitable version of answer_with_context (uses the pooled async client)
+        
+        Upstream failures are raised rather than answered with a canned reply.
+        """
+        try:
+            result = await self._generate(
+                self.model_for("rag"),
+                self._build_rag_prompt(question, context_emails, rag_prompt),
+                self._rag_config()
+            )
+            return result.text.strip()
+            
+        except (UpstreamUnavailableError, GeminiAPIError):
+            raise
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            llm_fallbacks.inc(task="rag")
+            return "I'm sorry, I couldn't find relevant information in your emails to answer that question."
+    
+    async def summarize_conversation_async(self, subject: str, conversation: str) -> str:
+        """
+        Summarize one conversation for the inbox digest (map stage)
+        
+        Like stream_reply there is no canned fallback: errors propagate so
+        the conversation is retried on the next refresh instead of a
+        placeholder being cached as its summary.
+        """
+        result = await self._generate(
+            self.model_for("digest_map"),
+            self._build_digest_map_prompt(subject, conversation),
+            self._digest_config()
+        )
+        return result.text.strip()
+    
+    async def combine_summaries_async(self, heading: str, summaries: List[str]) -> str:
+        """
+        Combine conversation summaries into one digest (reduce stage)
+        
+        Args:
+            heading: What the summaries cover, e.g. "mail from 2024-11-24"
+            summaries: One line per conversation (or per partial digest)
+        """
+        result = await self._generate(
+            self.model_for("digest_reduce"),
+            self._build_digest_reduce_prompt(heading, summaries),
+            self._digest_config()
+        )
+        return result.text.strip()
+    
+    def digest_version(self) -> str:
+        """Hash of the digest prompts and models; cached summaries from another version are redone"""
+        content = "\n".join([
+            self.model_for("digest_map"),
+            self._build_digest_map_prompt("", ""),
+            self.model_for("digest_reduce"),
+            self._build_digest_reduce_prompt("", [])
+        ])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+    
+    async def _generate(self, model: str, prompt: str, generation_config: dict) -> GenerationResult:
+        """Call Gemini, coalescing identical in-flight requests"""
+        key = SingleFlight.make_key("generate", model, prompt, generation_config)
+        return await self.in_flight.do(
+            key,
+            lambda: self.client.generate_content(model, prompt, generation_config)
+        )
+    
+    async def _timed_generate(self, tier: str, prompt: str, generation_config: dict) -> GenerationResult:
+        """_generate on a categorization tier, recording latency and errors"""
+        start = time.perf_counter()
+        try:
+            result = await self._generate(self.model_for(tier), prompt, generation_config)
+        except Exception:
+            self.tier_stats[tier].record((time.perf_counter() - start) * 1000, error=True)
+            raise
+        self.tier_stats[tier].record((time.perf_counter() - start) * 1000)
+        return result
+    
+    async def _categorize_fast(self, email_body: str, subject: str, categorization_prompt: str) -> Tuple[List[Tag], float]:
+        """First cascade tier: tags plus the fast model's self-reported confidence"""
+        result = await self._timed_generate(
+            "categorization_fast",
+            self._build_fast_categorization_prompt(email_body, subject, categorization_prompt),
+            self._categorization_config()
+        )
+        data = json.loads(self._strip_code_fence(result.text))
+        if not isinstance(data, dict):
+            return [], 0.0  # no confidence given: escalate
+        
+        tags = [
+            Tag(label=label, color=self._get_tag_color(label))
+            for label in data.get("tags", []) if isinstance(label, str)
+        ]
+        confidence = float(data.get("confidence", 0.0))
+        return tags, confidence if tags else 0.0
+    
+    # ========== Prompt Construction ==========
+    
+    @staticmethod
+    def _build_categorization_prompt(email_body: str, subject: str, categorization_prompt: str) -> str:
+        return f"""{categorization_prompt}
+
+Subject: {subject}
+
+Email Body:
+{email_body}
+
+Return ONLY a JSON array of tag labels, nothing else. Example: ["Urgent", "Work"]"""
+    
+    @staticmethod
+    def _build_fast_categorization_prompt(email_body: str, subject: str, categorization_prompt: str) -> str:
+        return f"""{categorization_prompt}
+
+Subject: {subject}
+
+Email Body:
+{email_body}
+
+Return ONLY a JSON object, nothing else. Example: {{"tags": ["Urgent", "Work"], "confidence": 0.9}}
+"confidence" is a number from 0 to 1 saying how sure you are that the tags are correct."""
+    
+    @staticmethod
+    def _build_reply_prompt(sender: str, subject: str, email_body: str, reply_prompt: str) -> str:
+        return f"""{reply_prompt}
+
+Original Email:
+From: {sender}
+Subject: {subject}
+
+{email_body}
+
+Generate a professional reply:"""
+    
+    @staticmethod
+    def _build_rag_prompt(question: str, context_emails: List[dict], rag_prompt: str) -> str:
+        # Format context emails
+        context_text = "\n\n---\n\n".join([
+            f"Email from {email['sender']}:\nSubject: {email['subject']}\n{email['body']}"
+            for email in context_emails
+        ])
+        
+        return f"""{rag_prompt}
 
 Here are the relevant emails from the inbox:
 
@@ -154,21 +435,89 @@ Here are the relevant emails from the inbox:
 User Question: {question}
 
 Answer:"""
-            
-            # Call Gemini
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config={
-                    'temperature': 0.5,
-                    'max_output_tokens': settings.MAX_TOKENS,
-                }
-            )
-            
-            return response.text.strip()
-            
-        except Exception as e:
-            print(f"Error answering question: {e}")
-            return "I'm sorry, I couldn't find relevant information in your emails to answer that question."
+    
+    @staticmethod
+    def _build_digest_map_prompt(subject: str, conversation: str) -> str:
+        return f"""Summarize this email conversation for the reader's inbox digest in one or two sentences.
+Say who wants what, and any decision, deadline or action needed from the reader. No preamble.
+
+Subject: {subject}
+
+{conversation}
+
+Summary:"""
+    
+    @staticmethod
+    def _build_digest_reduce_prompt(heading: str, summaries: List[str]) -> str:
+        summary_text = "\n".join(f"- {summary}" for summary in summaries)
+        return f"""Below are summaries of the conversations in {heading}.
+Write a short digest of them: at most 5 bullet points, most important first.
+Group related conversations, and keep deadlines and actions needed from the reader. No preamble.
+
+{summary_text}
+
+Digest:"""
+    
+    @staticmethod
+    def _categorization_config() -> dict:
+        return {
+            'temperature': settings.TEMPERATURE_CATEGORIZATION,
+            'max_output_tokens': 1000,
+            'response_mime_type': 'application/json'
+        }
+    
+    @staticmethod
+    def _reply_config() -> dict:
+        return {
+            'temperature': settings.TEMPERATURE_REPLY,
+            'max_output_tokens': settings.MAX_TOKENS,
+        }
+    
+    @staticmethod
+    def _rag_config() -> dict:
+        return {
+            'temperature': 0.5,
+            'max_output_tokens': settings.MAX_TOKENS,
+        }
+    
+    @staticmethod
+    def _digest_config() -> dict:
+        return {
+            'temperature': 0.3,
+            'max_output_tokens': settings.MAX_TOKENS,
+        }
+    
+    # ========== Response Parsing ==========
+    
+    def _parse_tags(self, response_text: str) -> List[Tag]:
+        """
+        Parse a JSON array of tag labels into Tag objects with colors
+        """
+        # Parse JSON
+        tag_labels = json.loads(self._strip_code_fence(response_text))
+        
+        # Convert to Tag objects with colors
+        tags = []
+        for label in tag_labels:
+            if isinstance(label, str):
+                color = self._get_tag_color(label)
+                tags.append(Tag(label=label, color=color))
+        
+        if not tags:
+            llm_fallbacks.inc(task="categorization")
+            return [Tag(label="Uncategorized", color=self.TAG_COLORS["default"])]
+        return tags
+    
+    @staticmethod
+    def _strip_code_fence(response_text: str) -> str:
+        """Remove markdown code blocks if present"""
+        response_text = response_text.strip()
+        if response_text.startswith('```'):
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+            response_text = response_text.strip()
+        return response_text
     
     def _get_tag_color(self, label: str) -> str:
         """
@@ -176,4 +525,3 @@ Answer:"""
         """
         label_lower = label.lower().strip()
         return self.TAG_COLORS.get(label_lower, self.TAG_COLORS["default"])
-
@@ -0,0 +1,325 @@
+import os
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class LocalVectorIndex:
+    """
+    In-memory cosine similarity index with optional compression
+    
+    Stored vectors can be shrunk with PCA (fewer dimensions) and/or
+    quantized to float16 or int8. Searches scan the compressed codes to pick
+    `top_k * rerank_factor` candidates, then re-rank those candidates exactly
+    against the full float32 vectors. When `full_precision_path` is set the
+    float32 vectors live on disk (read through a memory map), so only the
+    compressed codes stay resident. The file is an unnamed temporary file
+    created next to that path, private to this index: other processes (and
+    other indexes in this one) never map or truncate it.
+    """
+    
+    QUANTIZATIONS = ("none", "float16", "int8")
+    
+    # Number of vectors needed before PCA / int8 scales are fitted.
+    # Until then searches run exactly over the float32 vectors.
+    MIN_TRAINING_VECTORS = 1024
+    
+    # Upper bound on vectors sampled for fitting (SVD cost grows with it)
+    MAX_TRAINING_VECTORS = 20000
+    
+    # Rows scored per step when scanning compressed codes (keeps the
+    # dequantized chunk small enough to stay in cache)
+    SCAN_CHUNK_ROWS = 4096
+    
+    def __init__(
+        self,
+        dimension: int,
+        quantization: str = "none",
+        pca_dim: int = 0,
+        rerank_factor: int = 4,
+        full_precision_path: Optional[Path] = None
+    ):
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization '{quantization}', expected one of {self.QUANTIZATIONS}"
+            )
+        if pca_dim < 0 or pca_dim >= dimension:
+            raise ValueError(f"pca_dim must be between 0 and {dimension - 1}")
+        
+        self.dimension = dimension
+        self.quantization = quantization
+        self.pca_dim = pca_dim
+        self.rerank_factor = max(1, rerank_factor)
+        self.full_precision_path = full_precision_path
+        self._full_file = None
+        
+        self.clear()
+    
+    # ========== Properties ==========
+    
+    @property
+    def compressed(self) -> bool:
+        """True when searches scan codes instead of the raw float32 vectors"""
+        return self.quantization != "none" or self.pca_dim > 0
+    
+    @property
+    def trained(self) -> bool:
+        return self._trained
+    
+    @property
+    def code_dimension(self) -> int:
+        return self.pca_dim or self.dimension
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    # ========== Mutations ==========
+    
+    def clear(self) -> None:
+        """Drop every vector (and the PCA / quantization fit)"""
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._positions: Dict[str, int] = {}
+        self._count = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes = np.zeros((0, self.code_dimension), dtype=self._code_dtype())
+        self._full_memory = np.zeros((0, self.dimension), dtype=np.float32)
+        self._full_view: Optional[np.ndarray] = None
+        self._mean: Optional[np.ndarray] = None
+        self._components: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+        self._trained = not self.compressed
+        
+        if self.full_precision_path is not None:
+            self.full_precision_path.parent.mkdir(parents=True, exist_ok=True)
+            # A fresh file rather than truncating the old one: searches may
+            # still be reading through a map of it
+            if self._full_file is not None:
+                self._full_file.close()
+            self._full_file = tempfile.TemporaryFile(
+                dir=self.full_precision_path.parent, prefix=f"{self.full_precision_path.name}."
+            )
+    
+    def add(
+        self,
+        ids: List[str],
+        vectors: List[List[float]],
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """
+        Add or replace vectors
+        
+        Args:
+            ids: Vector IDs (existing IDs are overwritten in place)
+            vectors: Raw embeddings, `dimension` floats each
+            metadata: Optional metadata dict per vector, returned by search
+        """
+        if not ids:
+            return
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension))
+        metadata = metadata or [None] * len(ids)
+        
+        rows = []
+        for vector_id, meta in zip(ids, metadata):
+            row = self._positions.get(vector_id)
+            if row is None:
+                row = self._allocate_row()
+                self._ids[row] = vector_id
+                self._positions[vector_id] = row
+            self._metadata[row] = meta
+            self._alive[row] = True
+            rows.append(row)
+        
+        rows = np.asarray(rows, dtype=np.int64)
+        self._write_full(rows, matrix)
+        
+        if self._trained and self.compressed:
+            self._codes[rows] = self._encode(matrix)
+        elif not self._trained and len(self) >= self.MIN_TRAINING_VECTORS:
+            self.train()
+    
+    def remove(self, ids: List[str]) -> None:
+        """Remove vectors by ID (unknown IDs are ignored)"""
+        for vector_id in ids:
+            row = self._positions.pop(vector_id, None)
+            if row is not None:
+                self._alive[row] = False
+                self._ids[row] = None
+                self._metadata[row] = None
+    
+    def train(self) -> None:
+        """
+        Fit PCA components and int8 scales on the stored vectors,
+        then re-encode every stored vector
+        """
+        if not self.compressed or self._count == 0:
+            return
+        
+        full = self._full_rows()
+        live = np.flatnonzero(self._alive[:self._count])
+        if len(live) > self.MAX_TRAINING_VECTORS:
+            live = np.sort(np.random.default_rng(0).choice(live, self.MAX_TRAINING_VECTORS, replace=False))
+        sample = np.asarray(full[live])
+        
+        if self.pca_dim:
+            self._mean = sample.mean(axis=0)
+            # Right singular vectors = principal axes
+            _, _, vt = np.linalg.svd(sample - self._mean, full_matrices=False)
+            components = vt[:self.pca_dim]
+            if components.shape[0] < self.pca_dim:
+                # Fewer samples than requested dims: pad with zero axes
+                padding = np.zeros((self.pca_dim - components.shape[0], self.dimension), dtype=np.float32)
+                components = np.vstack([components, padding])
+            self._components = components.astype(np.float32)
+        
+        if self.quantization == "int8":
+            projected = self._project(sample)
+            max_abs = np.abs(projected).max(axis=0)
+            self._scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        
+        self._trained = True
+        for start in range(0, self._count, self.SCAN_CHUNK_ROWS):
+            stop = min(start + self.SCAN_CHUNK_ROWS, self._count)
+            self._codes[start:stop] = self._encode(full[start:stop])
+    
+    # ========== Search ==========
+    
+    def search(self, vector: List[float], top_k: int) -> List[Tuple[str, float, Optional[Dict[str, Any]]]]:
+        """
+        Find the most similar stored vectors
+        
+        Args:
+            vector: Query embedding
+            top_k: Number of results
+            
+        Returns:
+            List of (id, cosine score, metadata), best first
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+        
+        query = self._normalize(np.asarray(vector, dtype=np.float32).reshape(1, self.dimension))[0]
+        full = self._full_rows()
+        
+        if self._trained and self.compressed:
+            approx = self._approximate_scores(query)
+            candidates = self._top_rows(approx, top_k * self.rerank_factor)
+            candidates.sort()  # sequential reads from the memory map
+            exact = full[candidates] @ query
+            order = np.argsort(-exact)[:top_k]
+            rows, scores = candidates[order], exact[order]
+        else:
+            scores_all = full[:self._count] @ query
+            scores_all[~self._alive[:self._count]] = -np.inf
+            rows = self._top_rows(scores_all, top_k)
+            scores = scores_all[rows]
+        
+        return [
+            (self._ids[row], float(score), self._metadata[row])
+            for row, score in zip(rows, scores)
+        ]
+    
+    def memory_bytes(self) -> int:
+        """Approximate resident bytes used by vector data"""
+        total = self._codes[:self._count].nbytes if self.compressed else 0
+        if self.full_precision_path is None:
+            total += self._full_memory[:self._count].nbytes
+        return total
+    
+    # ========== Internals ==========
+    
+    def _code_dtype(self):
+        return {"none": np.float32, "float16": np.float16, "int8": np.int8}[self.quantization]
+    
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def _allocate_row(self) -> int:
+        """Reserve the next row, growing the backing arrays geometrically"""
+        row = self._count
+        capacity = len(self._alive)
+        if row >= capacity:
+            new_capacity = max(1024, capacity * 2)
+            self._alive = np.resize(self._alive, new_capacity)
+            self._alive[capacity:] = False
+            if self.compressed:
+                codes = np.zeros((new_capacity, self.code_dimension), dtype=self._codes.dtype)
+                codes[:capacity] = self._codes
+                self._codes = codes
+            if self.full_precision_path is None:
+                full = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+                full[:capacity] = self._full_memory
+                self._full_memory = full
+        self._ids.append(None)
+        self._metadata.append(None)
+        self._count += 1
+        return row
+    
+    def _write_full(self, rows: np.ndarray, matrix: np.ndarray) -> None:
+        if self.full_precision_path is None:
+            self._full_memory[rows] = matrix
+            return
+        
+        # Positional writes: np.memmap moves the file offset when mapping
+        row_bytes = self.dimension * 4
+        fd = self._full_file.fileno()
+        for row, values in zip(rows, matrix):
+            os.pwrite(fd, values.tobytes(), int(row) * row_bytes)
+        self._full_view = None  # re-map on next read
+    
+    def _full_rows(self) -> np.ndarray:
+        """float32 vectors for rows [0, count) — in memory or memory-mapped"""
+        if self.full_precision_path is None:
+            return self._full_memory
+        if self._full_view is None or self._full_view.shape[0] != self._count:
+            self._full_view = np.memmap(
+                self._full_file, dtype=np.float32, mode='r',
+                shape=(self._count, self.dimension)
+            )
+        return self._full_view
+    
+    def _project(self, matrix: np.ndarray) -> np.ndarray:
+        if self._components is None:
+            return matrix
+        return (matrix - self._mean) @ self._components.T
+    
+    def _encode(self, matrix: np.ndarray) -> np.ndarray:
+        projected = self._project(matrix)
+        if self.quantization == "int8":
+            return np.clip(np.rint(projected / self._scale), -127, 127).astype(np.int8)
+        return projected.astype(self._codes.dtype)
+    
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Score every row against the compressed codes
+        
+        The query is rotated but not centred: codes hold (x - mean) @ C, so
+        q @ C scores (x - mean) . q, which ranks rows like x . q (the mean
+        only shifts every score by the same mean . q). Centring the query
+        too would also subtract x . mean, penalising rows close to the mean.
+        """
+        projected = query if self._components is None else query @ self._components.T
+        projected = projected.astype(np.float32)
+        if self._scale is not None:
+            # Fold the int8 dequantization scale into the query
+            projected = projected * self._scale
+        
+        scores = np.empty(self._count, dtype=np.float32)
+        for start in range(0, self._count, self.SCAN_CHUNK_ROWS):
+            stop = min(start + self.SCAN_CHUNK_ROWS, self._count)
+            scores[start:stop] = self._codes[start:stop].astype(np.float32) @ projected
+        scores[~self._alive[:self._count]] = -np.inf
+        return scores
+    
+    def _top_rows(self, scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(self))
+        if k >= len(scores):
+            top = np.argsort(-scores)
+        else:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        return top[np.isfinite(scores[top])][:k]
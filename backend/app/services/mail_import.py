@@ -0,0 +1,293 @@
+import hashlib
+import html
+import itertools
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email import policy
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesParser
+from email.utils import getaddresses, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional
+from app.config import settings
+from app.models import EmailInternal
+from app.services.file_service import FileService
+from app.services.near_duplicates import email_signature
+from app.services.threads import parse_message_ids
+
+FORMATS = ("mbox", "eml")
+
+# mboxrd escapes body lines starting with "From " as ">From ", ">>From ", ...
+_ESCAPED_FROM = re.compile(rb"^>+From ")
+_HTML_TAGS = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_BLANK_LINES = re.compile(r"\n\s*\n\s*\n+")
+
+
+# ========== Readers ==========
+
+def detect_format(path: Path) -> str:
+    """eml for a directory or .eml file, mbox otherwise"""
+    path = Path(path)
+    return "eml" if path.is_dir() or path.suffix.lower() == ".eml" else "mbox"
+
+
+def iter_mbox(path: Path) -> Iterator[bytes]:
+    """
+    Yield the raw bytes of each message in an mbox file, reading line by line
+    
+    Messages start at a "From " line at the top of the file or after a
+    blank line; escaped ">From " body lines are unescaped.
+    """
+    lines: List[bytes] = []
+    previous_blank = True
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b"From ") and previous_blank:
+                if lines:
+                    yield b"".join(lines)
+                lines = []
+                previous_blank = False
+                continue
+            if _ESCAPED_FROM.match(line):
+                line = line[1:]
+            lines.append(line)
+            previous_blank = not line.strip()
+    if lines:
+        yield b"".join(lines)
+
+
+def iter_eml(path: Path) -> Iterator[bytes]:
+    """Yield the raw bytes of an .eml file, or of every .eml file under a directory"""
+    path = Path(path)
+    if path.is_file():
+        yield path.read_bytes()
+        return
+    for file in sorted(path.rglob("*.eml")):
+        yield file.read_bytes()
+
+
+# ========== Parsing ==========
+
+def parse_message(raw: bytes) -> Optional[EmailInternal]:
+    """
+    Decode one RFC 822 message into an email, or None if it is unreadable
+    
+    Runs in the importer's worker processes, so it only uses module-level
+    state. The ID is derived from the Message-ID header (or the content when
+    there is none), so importing the same export twice adds nothing new.
+    
+    Uses the compat32 policy and decodes only the headers we keep; the
+    default policy parses every header into objects and is several times
+    slower.
+    """
+    try:
+        message = BytesParser(policy=policy.compat32).parsebytes(raw)
+        sender = _sender(message)
+        body = _body_text(message)
+        message_id = _header(message, "Message-ID").strip() or hashlib.sha1(raw).hexdigest()
+        in_reply_to = parse_message_ids(_header(message, "In-Reply-To"))
+        subject = " ".join(_header(message, "Subject").split()) or "(no subject)"
+        return EmailInternal(
+            id="m" + hashlib.sha1(message_id.encode('utf-8')).hexdigest()[:16],
+            sender=sender,
+            senderAvatar=FileService.generate_avatar_url(sender),
+            subject=subject,
+            body=body,
+            timestamp=_timestamp(message),
+            preview=FileService.create_preview(body),
+            messageId=next(iter(parse_message_ids(message_id)), None),
+            inReplyTo=in_reply_to[0] if in_reply_to else None,
+            references=parse_message_ids(_header(message, "References")),
+            # Signed here so the work is spread over the parser processes
+            simhash=email_signature(subject, body) if settings.NEAR_DUPLICATES_ENABLED else None
+        )
+    except Exception:
+        return None
+
+
+def _decode_words(value: str) -> str:
+    """Decode RFC 2047 encoded words ("=?utf-8?q?...?=")"""
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeError, ValueError):
+        return value
+
+
+def _header(message: Message, name: str) -> str:
+    value = message.get(name)
+    return "" if value is None else _decode_words(str(value))
+
+
+def _sender(message: Message) -> str:
+    """Display name of the first From address, else the address itself"""
+    for name, address in getaddresses([str(message.get("From", ""))]):
+        if name or address:
+            return _decode_words(name) or address
+    return "Unknown"
+
+
+def _body_part(message: Message) -> Optional[Message]:
+    """First inline text/plain part, else the first inline text/html part"""
+    html_part = None
+    for part in message.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return part
+        if content_type == "text/html" and html_part is None:
+            html_part = part
+    return html_part
+
+
+def _body_text(message: Message) -> str:
+    part = _body_part(message)
+    if part is None:
+        return ""
+    payload = part.get_payload(decode=True) or b""
+    try:
+        text = payload.decode(part.get_content_charset() or 'utf-8')
+    except (LookupError, UnicodeError):
+        # Unknown or wrong charset
+        text = payload.decode('utf-8', errors='replace')
+    if part.get_content_subtype() == "html":
+        text = html.unescape(_HTML_TAGS.sub(" ", text))
+    text = text.replace("\r\n", "\n").strip()
+    return _BLANK_LINES.sub("\n\n", text)
+
+
+def _timestamp(message: Message) -> str:
+    """Date header as an ISO 8601 UTC timestamp (now if missing or invalid)"""
+    try:
+        sent = parsedate_to_datetime(str(message.get("Date", "")))
+        if sent.tzinfo is None:
+            sent = sent.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError, IndexError):
+        sent = datetime.now(timezone.utc)
+    return sent.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# ========== Import ==========
+
+@dataclass
+class ImportReport:
+    """Outcome of importing one mailbox export"""
+    format: str
+    messages: int = 0  # messages read from the export
+    imported: int = 0  # new emails written to the inbox
+    duplicates: int = 0  # already in the inbox (or repeated in the export)
+    failed: int = 0  # could not be parsed
+    seconds: float = 0.0
+    
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+    
+    def to_dict(self) -> dict:
+        return {
+            "format": self.format,
+            "messages": self.messages,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "messages_per_second": round(self.messages_per_second, 1),
+        }
+
+
+def _batched(items: Iterable[bytes], size: int) -> Iterator[List[bytes]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parse_batches(raw_messages: Iterable[bytes], workers: int, batch_size: int) -> Iterator[List[Optional[EmailInternal]]]:
+    """
+    Parse messages in batches, across processes when workers > 1
+    
+    One batch is parsed while the next is read, so at most two batches of
+    raw messages are held in memory. Exports that fit in one batch are parsed
+    inline rather than paying for process start-up.
+    """
+    batches = _batched(raw_messages, batch_size)
+    first = next(batches, None)
+    if first is None:
+        return
+    if workers <= 1 or len(first) < batch_size:
+        yield [parse_message(raw) for raw in first]
+        for batch in batches:
+            yield [parse_message(raw) for raw in batch]
+        return
+    
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        pending = None
+        for batch in itertools.chain([first], batches):
+            submitted = pool.map(parse_message, batch, chunksize=max(1, len(batch) // (workers * 4)))
+            if pending is not None:
+                yield list(pending)
+            pending = submitted
+        if pending is not None:
+            yield list(pending)
+
+
+def import_mailbox(
+    path: Path,
+    file_service: FileService,
+    mailbox_format: Optional[str] = None,
+    replace: bool = False,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """
+    Stream an mbox file or EML directory into the inbox
+    
+    Args:
+        path: mbox file, .eml file or directory of .eml files
+        file_service: Inbox to write to
+        mailbox_format: "mbox" or "eml" (detected from the path if omitted)
+        replace: Replace the inbox instead of adding to it
+        workers: Parser processes (default IMPORT_WORKERS; 0 = one per core)
+        batch_size: Messages parsed and written per batch (default IMPORT_BATCH_SIZE)
+        progress: Called with the running report after each batch
+        
+    Blocking; imported emails are untagged until the next ingest.
+    """
+    mailbox_format = mailbox_format or detect_format(path)
+    if mailbox_format not in FORMATS:
+        raise ValueError(f"Unknown format '{mailbox_format}' (choose from {', '.join(FORMATS)})")
+    workers = workers if workers is not None else settings.IMPORT_WORKERS
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    
+    report = ImportReport(format=mailbox_format)
+    start = time.perf_counter()
+    raw_messages = iter_mbox(path) if mailbox_format == "mbox" else iter_eml(path)
+    
+    def parsed() -> Iterator[EmailInternal]:
+        for batch in _parse_batches(raw_messages, workers, batch_size):
+            report.messages += len(batch)
+            for email in batch:
+                if email is None:
+                    report.failed += 1
+                else:
+                    yield email
+            report.seconds = time.perf_counter() - start
+            if progress is not None:
+                progress(report)
+    
+    report.imported, report.duplicates = file_service.write_emails_stream(parsed(), replace=replace)
+    report.seconds = time.perf_counter() - start
+    return report
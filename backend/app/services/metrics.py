@@ -0,0 +1,308 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+from app.services.tracing import span
+
+# Latency buckets in seconds, from local file I/O up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """Base for labelled metrics rendered in Prometheus text format"""
+    
+    kind = ""
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+    
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{self._escape(value)}"' for name, value in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value:g}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; optionally read from a callback at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: Dict[LabelValues, Callable[[], float]] = {}
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        """Report fn() for these labels whenever metrics are rendered"""
+        self._callbacks[self._key(labels)] = fn
+    
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        if key in self._callbacks:
+            return float(self._callbacks[key]())
+        return self._values.get(key, 0.0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, fn in self._callbacks.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return [f"{self.name}{self._format_labels(key)} {value:g}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observations (latencies) in cumulative buckets"""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+    
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+    
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+    
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(lambda elapsed: self.observe(elapsed, **labels))
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, on_done: Callable[[float], None]):
+        self._on_done = on_done
+        self._start = 0.0
+    
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self._on_done(time.perf_counter() - self._start)
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them for the /metrics endpoint"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+    
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+    
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+    
+    def _register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _UpstreamCall:
+    """Times one upstream call, tracking in-flight count and failures (and a trace span)"""
+    
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+        self._start = 0.0
+        self._span = span(f"{upstream}.{operation}")
+    
+    def __enter__(self) -> "_UpstreamCall":
+        upstream_in_flight.inc(upstream=self.upstream)
+        self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self._start
+        self._span.__exit__(exc_type, exc, tb)
+        upstream_in_flight.dec(upstream=self.upstream)
+        outcome = "success" if exc_type is None else "error"
+        upstream_duration.observe(elapsed, upstream=self.upstream, operation=self.operation, outcome=outcome)
+        if exc_type is not None:
+            upstream_errors.inc(upstream=self.upstream, operation=self.operation, error=exc_type.__name__)
+
+
+def track_upstream(upstream: str, operation: str) -> _UpstreamCall:
+    """
+    Time an upstream call (including its retries) as a context manager
+    
+    Usable around both sync and awaited calls:
+        with track_upstream("gemini", "generate"):
+            await ...
+    """
+    return _UpstreamCall(upstream, operation)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ========== Registry & Metrics ==========
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response (until headers for streamed responses)",
+    ("method", "route", "status")
+)
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being handled"
+)
+upstream_duration = registry.histogram(
+    "upstream_call_duration_seconds",
+    "Upstream call latency including rate-limit waits and retries",
+    ("upstream", "operation", "outcome")
+)
+upstream_in_flight = registry.gauge(
+    "upstream_calls_in_flight", "Upstream calls currently in progress", ("upstream",)
+)
+upstream_errors = registry.counter(
+    "upstream_errors_total", "Upstream calls that failed after retries", ("upstream", "operation", "error")
+)
+storage_duration = registry.histogram(
+    "storage_operation_duration_seconds", "JSON file read/write latency", ("operation", "file")
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Gemini tokens consumed", ("model", "direction")
+)
+llm_fallbacks = registry.counter(
+    "llm_fallbacks_total", "Canned answers returned instead of model output", ("task",)
+)
+cache_lookups = registry.counter(
+    "cache_lookups_total",
+    "Lookups that were served without a new upstream call (hit) or not (miss)",
+    ("cache", "result")
+)
+rate_limiter_rate = registry.gauge(
+    "rate_limiter_requests_per_second", "Current adaptive request rate per upstream", ("limiter",)
+)
+rate_limiter_concurrency = registry.gauge(
+    "rate_limiter_concurrency_limit", "Current adaptive concurrency limit per upstream", ("limiter",)
+)
+tenants_cached = registry.gauge(
+    "tenants_cached", "Non-default tenants whose services are held in memory"
+)
+job_queue_depth = registry.gauge(
+    "jobs", "Background jobs in the queue database by status", ("status",)
+)
+
+
+def register_limiter(limiter) -> None:
+    """Report an AdaptiveRateLimiter's current rate and concurrency limit"""
+    rate_limiter_rate.set_function(lambda: limiter.snapshot()["rate"], limiter=limiter.name)
+    rate_limiter_concurrency.set_function(lambda: limiter.snapshot()["concurrency_limit"], limiter=limiter.name)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
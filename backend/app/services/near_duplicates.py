@@ -0,0 +1,171 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from app.models import EmailInternal
+
+SIGNATURE_BITS = 64
+
+# Emails with fewer distinct words than this are not compared: a short
+# "Thanks, see you then" says too little to be a duplicate of anything
+MIN_FEATURES = 16
+
+# Texts signed per numpy pass (bounds the (features, 64) bit matrix)
+SIGN_CHUNK_TEXTS = 1024
+
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+
+
+def _features(text: str) -> List[str]:
+    """Distinct lowercased words, with digit runs merged ("Order #1234" ~ "Order #5678")"""
+    return list(set(_WORD.findall(_DIGITS.sub("0", text.lower()))))
+
+
+@lru_cache(maxsize=1 << 18)
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def simhashes(texts: List[str]) -> List[Optional[int]]:
+    """
+    64-bit SimHash of each text, or None when it is too short to compare
+    
+    Each distinct word votes on every bit with its hash; a bit is set when
+    most words have it set. Texts sharing most of their words get
+    signatures a few bits apart. Words count once however often they
+    appear, so numbers or repeated boilerplate do not dominate.
+    """
+    signatures: List[Optional[int]] = []
+    for i in range(0, len(texts), SIGN_CHUNK_TEXTS):
+        signatures.extend(_simhash_chunk(texts[i:i + SIGN_CHUNK_TEXTS]))
+    return signatures
+
+
+def _simhash_chunk(texts: List[str]) -> List[Optional[int]]:
+    features = [_features(text) for text in texts]
+    counts = np.array([len(f) for f in features], dtype=np.int64)
+    signatures: List[Optional[int]] = [None] * len(texts)
+    rows = np.flatnonzero(counts >= MIN_FEATURES)
+    if not len(rows):
+        return signatures
+    
+    # Bits of every feature hash in the chunk, (features, 64), summed per text
+    hashes = np.fromiter(
+        (_feature_hash(feature) for row in rows.tolist() for feature in features[row]),
+        dtype='<u8', count=int(counts[rows].sum())
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    starts = np.concatenate(([0], np.cumsum(counts[rows])[:-1]))
+    votes = np.add.reduceat(bits, starts, axis=0, dtype=np.int32)
+    majority = np.packbits(votes * 2 > counts[rows, None], axis=1, bitorder='little')
+    for row, signature in zip(rows.tolist(), majority.view('<u8')[:, 0].tolist()):
+        signatures[row] = signature
+    return signatures
+
+
+def signature_text(subject: str, body: str) -> str:
+    return f"{subject}\n{body}"
+
+
+def email_signature(subject: str, body: str) -> str:
+    """Stored form of an email's signature: 16 hex digits, "" when too short to compare"""
+    signature = simhashes([signature_text(subject, body)])[0]
+    return format_signature(signature)
+
+
+def format_signature(signature: Optional[int]) -> str:
+    return "" if signature is None else f"{signature:016x}"
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of cluster representatives by SimHash
+    
+    The 64 signature bits are cut into max_distance + 1 bands. Two
+    signatures at most max_distance bits apart agree on at least one whole
+    band, so looking up each band of a signature finds every representative
+    within that distance while comparing only a few candidates.
+    
+    Only representatives are indexed (the first email of each cluster), and
+    a near-duplicate points at its representative, so clusters cannot drift
+    through a chain of small differences.
+    """
+    
+    def __init__(self, max_distance: int = 4):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        bounds = [SIGNATURE_BITS * i // bands for i in range(bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._signatures: List[int] = []
+        self._ids: List[str] = []
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    @classmethod
+    def build(cls, emails: Iterable[EmailInternal], max_distance: int = 4) -> "NearDuplicateIndex":
+        """Index the signed emails that represent their cluster"""
+        index = cls(max_distance)
+        for email in emails:
+            if email.simhash and not email.duplicateOf:
+                index.add(email.id, int(email.simhash, 16))
+        return index
+    
+    def add(self, email_id: str, signature: int) -> None:
+        position = len(self._ids)
+        self._ids.append(email_id)
+        self._signatures.append(signature)
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            buckets.setdefault((signature >> shift) & mask, []).append(position)
+    
+    def find(self, signature: int) -> Optional[str]:
+        """ID of the closest representative within max_distance bits, if any"""
+        candidates = set()
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            candidates.update(buckets.get((signature >> shift) & mask, ()))
+        best, best_distance = None, self.max_distance + 1
+        for position in candidates:
+            distance = (self._signatures[position] ^ signature).bit_count()
+            if distance < best_distance:
+                best, best_distance = position, distance
+        return self._ids[best] if best is not None else None
+    
+    def assign(self, email: EmailInternal) -> Optional[str]:
+        """
+        Set and return email.duplicateOf for a signed email
+        
+        An email with no representative close enough starts its own
+        cluster (duplicateOf None).
+        """
+        email.duplicateOf = None
+        if email.simhash:
+            signature = int(email.simhash, 16)
+            email.duplicateOf = self.find(signature)
+            if email.duplicateOf is None:
+                self.add(email.id, signature)
+        return email.duplicateOf
+
+
+def sign_emails(emails: List[EmailInternal]) -> None:
+    """Set simhash on the given emails (batched)"""
+    signatures = simhashes([signature_text(email.subject, email.body) for email in emails])
+    for email, signature in zip(emails, signatures):
+        email.simhash = format_signature(signature)
+
+
+def assign_near_duplicates(emails: List[EmailInternal], max_distance: int = 4) -> int:
+    """
+    Sign emails without a signature and match them to a cluster, oldest first
+    
+    Emails signed earlier keep their cluster, so only new emails are
+    looked up. Returns the number of new emails found to be near-duplicates.
+    """
+    new = sorted((email for email in emails if email.simhash is None), key=lambda email: email.timestamp)
+    if not new:
+        return 0
+    index = NearDuplicateIndex.build(emails, max_distance)
+    sign_emails(new)
+    return sum(index.assign(email) is not None for email in new)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+from app.config import settings
+from app.models import Prompts
+from app.services.file_service import FileService
+from app.services.tracing import span
+
+
+class PromptRegistry:
+    """
+    In-memory, versioned view of prompts.json
+    
+    Routes read prompts from memory instead of disk. Every prompt set has a
+    content-hash version (and each prompt its own), so cached or pre-computed
+    LLM output can be keyed on the prompt that produced it. Edits made to the
+    file outside the API are picked up by checking its mtime at most every
+    PROMPTS_RELOAD_INTERVAL seconds.
+    """
+    
+    def __init__(self, file_service: FileService):
+        self.file_service = file_service
+        self._prompts: Optional[Prompts] = None
+        self._versions: Dict[str, str] = {}
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+    
+    # ========== Reading ==========
+    
+    def get(self) -> Prompts:
+        """Current prompts, reloaded first if the file changed on disk"""
+        with span("prompts.get"):
+            self._reload_if_changed()
+        return self._prompts
+    
+    @property
+    def version(self) -> str:
+        """Version of the whole prompt set"""
+        self._reload_if_changed()
+        return self._versions["prompts"]
+    
+    def version_of(self, name: str) -> str:
+        """Version of a single prompt ('categorization', 'reply' or 'rag')"""
+        self._reload_if_changed()
+        return self._versions[name]
+    
+    def versions(self) -> Dict[str, str]:
+        """Version of the prompt set and of each prompt"""
+        self._reload_if_changed()
+        return dict(self._versions)
+    
+    # ========== Writing ==========
+    
+    def update(self, prompts: Prompts) -> Prompts:
+        """Save new prompts and make them current"""
+        self.file_service.write_prompts(prompts)
+        self._set(prompts, self._stat_mtime())
+        return prompts
+    
+    def reset(self) -> Prompts:
+        """Restore the default prompts"""
+        return self.update(Prompts(**settings.DEFAULT_PROMPTS))
+    
+    # ========== Versioning ==========
+    
+    @staticmethod
+    def content_version(text: str) -> str:
+        """Short content hash used as a prompt version"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+    
+    # ========== Internals ==========
+    
+    def _set(self, prompts: Prompts, mtime_ns: Optional[int]) -> None:
+        versions = {name: self.content_version(text) for name, text in prompts.model_dump().items()}
+        versions["prompts"] = self.content_version(json.dumps(prompts.model_dump(), sort_keys=True))
+        self._prompts = prompts
+        self._versions = versions
+        self._mtime_ns = mtime_ns
+        self._checked_at = time.monotonic()
+    
+    def _reload_if_changed(self) -> None:
+        if self._prompts is not None and time.monotonic() - self._checked_at < settings.PROMPTS_RELOAD_INTERVAL:
+            return
+        self._checked_at = time.monotonic()
+        
+        mtime_ns = self._stat_mtime()
+        if self._prompts is not None and mtime_ns == self._mtime_ns:
+            return
+        
+        try:
+            prompts = self.file_service.read_prompts()
+        except Exception as e:
+            if self._prompts is None:
+                raise
+            # Keep serving the last good prompts while the file is mid-edit or invalid
+            self._mtime_ns = mtime_ns
+            print(f"Warning: Failed to reload prompts, keeping version {self._versions['prompts']}: {e}")
+            return
+        
+        previous = self._versions.get("prompts")
+        self._set(prompts, mtime_ns)
+        if previous and previous != self._versions["prompts"]:
+            print(f"✓ Reloaded prompts (version {self._versions['prompts']})")
+    
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.file_service.prompts_path).st_mtime_ns
+        except OSError:
+            return None
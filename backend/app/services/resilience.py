@@ -0,0 +1,242 @@
+import asyncio
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import httpx
+from app.config import settings
+from app.services.metrics import register_limiter
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying (timeouts, throttling, transient server errors)
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailableError(Exception):
+    """An upstream call failed after retries or ran out of time"""
+    
+    def __init__(self, upstream: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{upstream} unavailable: {message}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket plus AIMD concurrency limit for one upstream API
+    
+    The request rate and the number of calls in flight both start at their
+    configured ceilings. A throttled response (429 / quota exhausted) halves
+    both and pauses the bucket for the server-provided retry delay; each
+    success grows them back additively. Bulk work therefore settles at the
+    fastest rate the quota actually allows.
+    """
+    
+    def __init__(self, name: str, rate: float, max_concurrency: int, burst: float = None):
+        self.name = name
+        self.max_rate = rate
+        self.max_concurrency = max_concurrency
+        self.burst = burst or max(1.0, rate)
+        
+        self._rate = rate
+        self._limit = float(max_concurrency)
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self.throttled_count = 0
+    
+    # ========== Acquire / Release ==========
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a concurrency slot and a token, hold the slot while running"""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < max(1, int(self._limit)))
+            self._in_flight += 1
+        try:
+            await self._take_token()
+            yield
+        finally:
+            async with condition:
+                self._in_flight -= 1
+                condition.notify_all()
+    
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            
+            # Refill the bucket at the current (adaptive) rate
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+    
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+    
+    # ========== Feedback ==========
+    
+    def on_success(self) -> None:
+        """Additive increase after a successful call"""
+        self._rate = min(self.max_rate, self._rate + self.max_rate * 0.05)
+        self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+    
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease after a 429 / quota error"""
+        self.throttled_count += 1
+        self._rate = max(self.max_rate * 0.02, self._rate * 0.5)
+        self._limit = max(1.0, self._limit * 0.5)
+        self._tokens = 0
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+    
+    def observe_headers(self, headers: Dict[str, str]) -> None:
+        """Pause until the quota window resets when the server says none remain"""
+        lowered = {k.lower(): v for k, v in headers.items()}
+        remaining = lowered.get("x-ratelimit-remaining-requests", lowered.get("x-ratelimit-remaining"))
+        reset = lowered.get("x-ratelimit-reset-requests", lowered.get("x-ratelimit-reset"))
+        try:
+            if remaining is not None and reset is not None and int(float(remaining)) <= 0:
+                self._paused_until = max(self._paused_until, time.monotonic() + parse_duration(reset))
+        except ValueError:
+            pass
+    
+    def snapshot(self) -> Dict[str, float]:
+        """Current adaptive state (for logging / metrics)"""
+        return {
+            "rate": round(self._rate, 3),
+            "concurrency_limit": int(self._limit),
+            "in_flight": self._in_flight,
+            "throttled": self.throttled_count,
+        }
+
+
+# ========== Retry ==========
+
+def parse_duration(value) -> float:
+    """Parse '17s', '1.5', '250ms' style durations into seconds"""
+    value = str(value).strip()
+    match = re.fullmatch(r"([\d.]+)\s*(ms|s|m)?", value)
+    if not match:
+        raise ValueError(f"Unrecognized duration: {value}")
+    number, unit = float(match.group(1)), match.group(2) or "s"
+    return number / 1000 if unit == "ms" else number * 60 if unit == "m" else number
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status carried by an SDK / client exception, if any"""
+    for attr in ("status_code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return error_status(error) in RETRYABLE_STATUSES
+
+
+def retry_after_from(error: Exception) -> Optional[float]:
+    """Server-requested delay from a Retry-After header or error body"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    headers = getattr(error, "headers", None) or {}
+    for key, value in dict(headers).items():
+        if key.lower() == "retry-after":
+            try:
+                return parse_duration(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def call_with_retry(
+    upstream: str,
+    operation: Callable[[], Awaitable[T]],
+    limiter: AdaptiveRateLimiter,
+    deadline: float = None,
+    max_attempts: int = None
+) -> T:
+    """
+    Run an upstream call through the rate limiter with jittered retries
+    
+    Args:
+        upstream: Name used in errors and logs (e.g. 'gemini')
+        operation: Zero-argument coroutine factory, called once per attempt
+        limiter: Limiter shared by every call to this upstream
+        deadline: Total seconds allowed, including waits and retries
+        max_attempts: Attempts before giving up
+        
+    Returns:
+        The operation's result
+        
+    Raises:
+        UpstreamUnavailableError: retries exhausted, deadline hit, or a
+            retryable failure persisted; non-retryable errors propagate as-is
+    """
+    deadline = deadline or settings.UPSTREAM_DEADLINE_SECONDS
+    max_attempts = max_attempts or settings.RETRY_MAX_ATTEMPTS
+    give_up_at = time.monotonic() + deadline
+    last_error: Optional[Exception] = None
+    retry_after: Optional[float] = None
+    
+    for attempt in range(max_attempts):
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            break
+        
+        try:
+            async with limiter.slot():
+                remaining = give_up_at - time.monotonic()
+                result = await asyncio.wait_for(operation(), timeout=max(remaining, 0.001))
+            limiter.on_success()
+            return result
+            
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            last_error = e
+            retry_after = retry_after_from(e)
+            if error_status(e) == 429:
+                limiter.on_throttle(retry_after)
+        
+        # Full-jitter exponential backoff, never shorter than the server asked
+        backoff = random.uniform(0, min(settings.RETRY_MAX_DELAY, settings.RETRY_BASE_DELAY * 2 ** attempt))
+        delay = max(backoff, retry_after or 0)
+        if time.monotonic() + delay >= give_up_at:
+            break
+        print(f"Retrying {upstream} call in {delay:.2f}s (attempt {attempt + 1} failed: {last_error})")
+        await asyncio.sleep(delay)
+    
+    raise UpstreamUnavailableError(upstream, str(last_error or "deadline exceeded"), retry_after)
+
+
+# ========== Shared Limiters ==========
+
+gemini_generate_limiter = AdaptiveRateLimiter(
+    "gemini_generate", settings.GEMINI_GENERATE_RPS, settings.UPSTREAM_MAX_CONCURRENCY
+)
+gemini_embed_limiter = AdaptiveRateLimiter(
+    "gemini_embed", settings.GEMINI_EMBED_RPS, settings.UPSTREAM_MAX_CONCURRENCY
+)
+pinecone_limiter = AdaptiveRateLimiter(
+    "pinecone", settings.PINECONE_RPS, settings.UPSTREAM_MAX_CONCURRENCY
+)
+
+for _limiter in (gemini_generate_limiter, gemini_embed_limiter, pinecone_limiter):
+    register_limiter(_limiter)
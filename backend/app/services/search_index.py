@@ -0,0 +1,390 @@
+import bisect
+import html
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.inbox_snapshot import InboxSnapshot
+
+_TOKEN = re.compile(r"\w+")
+_QUERY_PART = re.compile(r'"([^"]*)"?|(\S+)')
+
+# Postings encode (document, position) as document << POSITION_BITS | position
+POSITION_BITS = 20
+POSITION_MASK = (1 << POSITION_BITS) - 1
+MAX_PHRASE_WORDS = 32
+MAX_POSITION = POSITION_MASK - MAX_PHRASE_WORDS  # later words are not indexed
+
+SNIPPET_CHARS = 160
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _timestamp_seconds(timestamp: str) -> float:
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+# ========== Queries ==========
+
+@dataclass
+class SearchQuery:
+    """
+    A parsed search query; an email must match every clause
+    
+    Query syntax:
+        budget review       both words, anywhere in sender, subject or body
+        "budget review"     the exact phrase
+        budg*               any word starting with "budg"
+    Words joined by punctuation (e.g. "q1-budget") are matched as a phrase.
+    """
+    terms: List[str] = field(default_factory=list)
+    prefixes: List[str] = field(default_factory=list)
+    phrases: List[List[str]] = field(default_factory=list)
+    
+    @classmethod
+    def parse(cls, text: str) -> "SearchQuery":
+        query = cls()
+        for match in _QUERY_PART.finditer(text):
+            quoted, raw = match.groups()
+            words = tokenize(quoted if quoted is not None else raw)
+            if not words:
+                continue
+            if raw is not None and raw.endswith("*"):
+                query.prefixes.append(words.pop())
+            if len(words) == 1:
+                query.terms.append(words[0])
+            elif words:
+                query.phrases.append(words)
+        return query
+    
+    def __bool__(self) -> bool:
+        return bool(self.terms or self.prefixes or self.phrases)
+    
+    def pattern(self) -> Optional[re.Pattern]:
+        """Regex matching the query's words in text, for highlighting"""
+        parts = [re.escape(term) + r"\b" for term in self.terms]
+        parts += [re.escape(prefix) + r"\w*" for prefix in self.prefixes]
+        parts += [r"\W+".join(map(re.escape, phrase)) + r"\b" for phrase in self.phrases]
+        if not parts:
+            return None
+        # Longest alternatives first so phrases win over their own words
+        parts.sort(key=len, reverse=True)
+        return re.compile(r"\b(?:" + "|".join(parts) + ")", re.IGNORECASE)
+
+
+def highlight(text: str, pattern: Optional[re.Pattern], window: Optional[int] = None) -> str:
+    """
+    HTML-escape text and wrap query matches in <mark>
+    
+    With a window, returns only about that many characters around the first
+    match (or the start of the text when nothing matches).
+    """
+    if window is not None:
+        text = " ".join(text.split())
+        match = pattern.search(text) if pattern is not None else None
+        start = 0
+        if match is not None and match.start() > window // 3:
+            start = text.rfind(" ", 0, match.start() - window // 3) + 1
+        end = min(len(text), start + window)
+        if end < len(text):
+            end = max(text.rfind(" ", start, end), start + window // 2)
+        text = ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+    if pattern is None:
+        return html.escape(text)
+    
+    pieces = []
+    position = 0
+    for match in pattern.finditer(text):
+        pieces.append(html.escape(text[position:match.start()]))
+        pieces.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        position = match.end()
+    pieces.append(html.escape(text[position:]))
+    return "".join(pieces)
+
+
+# ========== Index ==========
+
+class SearchIndex:
+    """
+    Positional inverted index over the sender, subject and body of an inbox
+    
+    Kept in step with an InboxSnapshot by sync(): records are matched by ID
+    hash and compared by a checksum of their stored bytes, so only added or
+    edited emails are tokenized again. Emails whose tags or timestamp
+    changed only have their filter columns refreshed, and removed
+    emails are masked out until enough accumulate to rebuild.
+    
+    Postings are sorted int64 arrays of document << 20 | position. A term
+    query marks its documents in a boolean mask; a phrase query shifts the
+    positions of one word and binary-searches them in the next word's
+    postings. Sender, subject and body are indexed as one token stream with
+    a gap between fields, so phrases never span two fields.
+    """
+    
+    TEXT_FIELDS = ("sender", "body")  # snapshot field range holding sender, subject and body
+    META_FIELDS = ("timestamp", "tags")
+    INDEXED_FIELDS = ("sender", "subject", "body", "timestamp", "tags")
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+    
+    def _reset(self) -> None:
+        self.snapshot: Optional[InboxSnapshot] = None  # the index is synced to this snapshot
+        self.source: Optional[Tuple[int, int]] = None  # ... built from this inbox.json
+        self._count = 0  # documents allocated (including removed ones)
+        self._keys = np.zeros(0, dtype='<u8')
+        self._text_digest = np.zeros(0, dtype='<u4')
+        self._meta_digest = np.zeros(0, dtype='<u4')
+        self._time = np.zeros(0, dtype=np.float64)
+        self._row = np.zeros(0, dtype=np.int64)  # snapshot record of each document
+        self._alive = np.zeros(0, dtype=bool)
+        self._tags: Dict[str, np.ndarray] = {}
+        self._doc_tags: Dict[int, Tuple[str, ...]] = {}
+        # term -> sorted postings; additions since the last query wait in _pending
+        self._postings: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, List[np.ndarray]] = defaultdict(list)
+        self._vocabulary: List[str] = []  # sorted, for prefix queries
+        self._vocabulary_stale = False
+    
+    def __len__(self) -> int:
+        return int(self._alive[:self._count].sum())
+    
+    # ========== Maintenance ==========
+    
+    def sync(self, snapshot: InboxSnapshot) -> Dict[str, int]:
+        """
+        Bring the index up to date with a snapshot
+        
+        Returns:
+            Counts of documents added, removed and refreshed
+        """
+        with self._lock:
+            if snapshot.source == self.source:
+                self.snapshot = snapshot
+                return {"added": 0, "removed": 0, "refreshed": 0}
+            keys = snapshot.row_keys()
+            text_digest = snapshot.digests(*self.TEXT_FIELDS)
+            meta_digest = snapshot.digests(*self.META_FIELDS)
+            
+            # Existing document of each snapshot record, or -1
+            live = np.flatnonzero(self._alive[:self._count])
+            doc = np.full(len(keys), -1, dtype=np.int64)
+            if len(live):
+                order = np.argsort(self._keys[live])
+                sorted_keys = self._keys[live][order]
+                found = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+                match = sorted_keys[found] == keys
+                doc[match] = live[order][found[match]]
+            match = doc >= 0
+            
+            same_text = np.zeros(len(keys), dtype=bool)
+            same_text[match] = self._text_digest[doc[match]] == text_digest[match]
+            stale = np.ones(self._count, dtype=bool)
+            stale[doc[same_text]] = False
+            removed = np.flatnonzero(stale & self._alive[:self._count])
+            self._alive[removed] = False
+            
+            added_rows = np.flatnonzero(~same_text)
+            if self._count - len(self) > max(len(self), 1000):
+                # Mostly removed documents: start over
+                self._reset()
+                return {**self.sync(snapshot), "removed": len(removed)}
+            
+            # Unchanged text: follow the record to its new row, refresh filters if needed
+            kept_rows = np.flatnonzero(same_text)
+            kept_docs = doc[kept_rows]
+            self._row[kept_docs] = kept_rows
+            changed_meta = kept_rows[self._meta_digest[kept_docs] != meta_digest[kept_rows]]
+            for row in changed_meta.tolist():
+                self._set_meta(int(doc[row]), snapshot.record(row, self.META_FIELDS))
+            self._meta_digest[kept_docs] = meta_digest[kept_rows]
+            
+            self._add(snapshot, added_rows, keys, text_digest, meta_digest)
+            self.snapshot = snapshot
+            self.source = snapshot.source
+            return {"added": len(added_rows), "removed": len(removed), "refreshed": len(changed_meta)}
+    
+    def _grow(self, count: int) -> None:
+        capacity = len(self._keys)
+        if count <= capacity:
+            return
+        capacity = max(count, capacity * 2, 1024)
+        
+        def grown(array: np.ndarray) -> np.ndarray:
+            bigger = np.zeros(capacity, dtype=array.dtype)
+            bigger[:len(array)] = array
+            return bigger
+        
+        self._keys, self._text_digest, self._meta_digest = map(grown, (self._keys, self._text_digest, self._meta_digest))
+        self._time, self._row, self._alive = map(grown, (self._time, self._row, self._alive))
+        self._tags = {tag: grown(mask) for tag, mask in self._tags.items()}
+    
+    def _set_meta(self, doc: int, record: dict) -> None:
+        self._time[doc] = _timestamp_seconds(record.get("timestamp", ""))
+        for tag in self._doc_tags.pop(doc, ()):
+            self._tags[tag][doc] = False
+        tags = tuple({tag["label"].lower() for tag in record.get("tags") or []})
+        for tag in tags:
+            if tag not in self._tags:
+                self._tags[tag] = np.zeros(len(self._keys), dtype=bool)
+            self._tags[tag][doc] = True
+        if tags:
+            self._doc_tags[doc] = tags
+    
+    def _add(self, snapshot: InboxSnapshot, rows: np.ndarray, keys, text_digest, meta_digest) -> None:
+        """Tokenize records into new documents (numbered after all existing ones)"""
+        if not len(rows):
+            return
+        first = self._count
+        self._grow(first + len(rows))
+        docs = np.arange(first, first + len(rows))
+        self._keys[docs] = keys[rows]
+        self._text_digest[docs] = text_digest[rows]
+        self._meta_digest[docs] = meta_digest[rows]
+        self._row[docs] = rows
+        self._alive[docs] = True
+        self._count = first + len(rows)
+        
+        # One token stream per email: sender, subject, body separated by a gap ("")
+        tokens: List[str] = []
+        lengths = []
+        for doc, row in zip(docs.tolist(), rows.tolist()):
+            record = snapshot.record(row, self.INDEXED_FIELDS)
+            self._set_meta(doc, record)
+            start = len(tokens)
+            tokens += tokenize(record.get("sender") or "")
+            tokens.append("")
+            tokens += tokenize(record.get("subject") or "")
+            tokens.append("")
+            tokens += tokenize(record.get("body") or "")
+            lengths.append(len(tokens) - start)
+        
+        lengths = np.asarray(lengths, dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        positions = np.arange(len(tokens), dtype=np.int64) - np.repeat(starts, lengths)
+        encoded = (np.repeat(docs, lengths) << POSITION_BITS) | positions
+        keep = positions <= MAX_POSITION
+        
+        # Group the new postings by term in one sort
+        vocabulary: Dict[str, int] = {"": 0}
+        term_ids = np.fromiter(
+            (vocabulary.setdefault(token, len(vocabulary)) for token in tokens),
+            dtype=np.int64, count=len(tokens)
+        )
+        keep &= term_ids != 0
+        encoded, term_ids = encoded[keep], term_ids[keep]
+        order = np.argsort(term_ids, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)))))
+        grouped = encoded[order]
+        del vocabulary[""]
+        for term, term_id in vocabulary.items():
+            postings = grouped[bounds[term_id]:bounds[term_id + 1]]
+            if term in self._postings:
+                self._pending[term].append(postings)
+            else:
+                self._postings[term] = postings
+                self._vocabulary_stale = True
+    
+    def _term_postings(self, term: str) -> np.ndarray:
+        pending = self._pending.pop(term, None)
+        if pending:
+            self._postings[term] = np.concatenate([self._postings[term], *pending])
+        return self._postings.get(term, np.zeros(0, dtype=np.int64))
+    
+    # ========== Queries ==========
+    
+    def search(
+        self,
+        query: SearchQuery,
+        tags: Optional[List[str]] = None,
+        after: Optional[float] = None,
+        before: Optional[float] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Match a query and filters, newest first
+        
+        Args:
+            query: Parsed query (empty matches every email)
+            tags: Tag labels the email must all have (case-insensitive)
+            after / before: Unix time bounds on the email timestamp
+            
+        Returns:
+            (total matches, emails of the requested page as inbox.json entries)
+        """
+        with self._lock:
+            count = self._count
+            mask = self._alive[:count].copy()
+            for term in query.terms:
+                mask &= self._docs(self._term_postings(term), count)
+            for prefix in query.prefixes:
+                mask &= self._prefix_docs(prefix, count)
+            for phrase in query.phrases:
+                mask &= self._docs(self._phrase_postings(phrase), count)
+            for tag in tags or []:
+                tag_mask = self._tags.get(tag.lower())
+                if tag_mask is None:
+                    return 0, []
+                mask &= tag_mask[:count]
+            if after is not None:
+                mask &= self._time[:count] >= after
+            if before is not None:
+                mask &= self._time[:count] < before
+            
+            matches = np.flatnonzero(mask)
+            total = len(matches)
+            wanted = min(offset + limit, total)
+            if wanted <= 0:
+                return total, []
+            times = -self._time[matches]
+            if wanted < total:
+                top = np.argpartition(times, wanted - 1)[:wanted]
+                top = top[np.argsort(times[top], kind='stable')]
+            else:
+                top = np.argsort(times, kind='stable')
+            return total, [self.snapshot.record(row) for row in self._row[matches[top[offset:]]].tolist()]
+    
+    @staticmethod
+    def _docs(postings: np.ndarray, count: int) -> np.ndarray:
+        mask = np.zeros(count, dtype=bool)
+        mask[postings >> POSITION_BITS] = True
+        return mask
+    
+    def _prefix_docs(self, prefix: str, count: int) -> np.ndarray:
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_stale = False
+        mask = np.zeros(count, dtype=bool)
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            mask[self._term_postings(self._vocabulary[i]) >> POSITION_BITS] = True
+            i += 1
+        return mask
+    
+    def _phrase_postings(self, words: List[str]) -> np.ndarray:
+        """Postings of the phrase's first word where the rest follow in order"""
+        words = words[:MAX_PHRASE_WORDS]
+        postings = [self._term_postings(word) for word in words]
+        # Start from the rarest word, aligned back to the phrase start
+        rarest = min(range(len(words)), key=lambda i: len(postings[i]))
+        candidates = postings[rarest]
+        candidates = candidates[(candidates & POSITION_MASK) >= rarest] - rarest
+        for i, word_postings in enumerate(postings):
+            if i == rarest or not len(candidates):
+                continue
+            if not len(word_postings):
+                return word_postings
+            wanted = candidates + i
+            found = np.minimum(np.searchsorted(word_postings, wanted), len(word_postings) - 1)
+            candidates = candidates[word_postings[found] == wanted]
+        return candidates
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+from app.services.metrics import record_cache
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent async calls into one upstream call
+    
+    The first caller for a key starts the work in its own task; callers that
+    arrive while it is in flight await the same task and get the same result
+    (or exception). The key is forgotten as soon as the call finishes, so
+    this is de-duplication of in-flight work, not a cache.
+    """
+    
+    def __init__(self, name: str = "singleflight"):
+        self.name = name  # cache label in metrics
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.leader_count = 0
+        self.shared_count = 0
+    
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable hash of the call's inputs (prompt, model, config, ...)"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() once per key among concurrent callers
+        
+        Args:
+            key: Identity of the call (see make_key)
+            fn: Zero-argument coroutine factory for the upstream call
+            
+        Returns:
+            The shared result
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leader_count += 1
+            record_cache(self.name, hit=False)
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared_count += 1
+            record_cache(self.name, hit=True)
+        
+        # Shield: one caller disconnecting must not cancel the shared call
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+    
+    def __len__(self) -> int:
+        return len(self._in_flight)
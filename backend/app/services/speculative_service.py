@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+from typing import Dict, List, Optional
+from app.config import settings
+from app.models import EmailInternal, PreparedReply
+from app.services.file_service import FileService
+from app.services.llm_service import LLMService
+from app.services.metrics import record_cache
+from app.services.prompt_registry import PromptRegistry
+
+
+class SpeculativeReplyService:
+    """
+    Pre-generates replies for high-priority emails after ingest
+    
+    Replies are stored with the reply-prompt version and a hash of the email
+    they answer, so /drafts/generate can serve them instantly while both are
+    unchanged. Each run is capped by SPECULATIVE_REPLY_BUDGET, and in-flight
+    generations are cancelled when their email is deleted.
+    """
+    
+    def __init__(self, file_service: FileService, llm_service: LLMService):
+        self.file_service = file_service
+        self.llm_service = llm_service
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    # ========== Serving ==========
+    
+    def get_prepared_reply(self, email: EmailInternal, reply_prompt: str) -> Optional[str]:
+        """
+        Return the pre-generated reply for an email if it is still valid
+        
+        Args:
+            email: The email being replied to
+            reply_prompt: Current reply prompt
+            
+        Returns:
+            Reply text, or None when missing or stale
+        """
+        try:
+            prepared = self.file_service.read_prepared_replies().get(email.id)
+        except Exception as e:
+            print(f"Warning: Failed to read prepared replies: {e}")
+            return None
+        
+        if prepared and self._is_valid(prepared, email, reply_prompt):
+            record_cache("prepared_replies", hit=True)
+            return prepared.content
+        record_cache("prepared_replies", hit=False)
+        return None
+    
+    # ========== Background Generation ==========
+    
+    async def pregenerate(self, emails: List[EmailInternal], reply_prompt: str) -> int:
+        """
+        Generate replies for Urgent / To-Do emails that lack a valid one
+        
+        Intended to run as a background task after ingest.
+        
+        Args:
+            emails: Current inbox
+            reply_prompt: Reply prompt to generate with
+            
+        Returns:
+            Number of replies generated
+        """
+        if not settings.SPECULATIVE_REPLIES_ENABLED or settings.SPECULATIVE_REPLY_BUDGET <= 0:
+            return 0
+        
+        prepared = self.file_service.read_prepared_replies()
+        
+        # Forget replies for emails that are gone or have changed
+        emails_by_id = {email.id: email for email in emails}
+        prepared = {
+            email_id: reply for email_id, reply in prepared.items()
+            if email_id in emails_by_id and self._is_valid(reply, emails_by_id[email_id], reply_prompt)
+        }
+        self.file_service.write_prepared_replies(prepared)
+        
+        # Newest high-priority emails first, within budget
+        candidates = sorted(
+            (
+                email for email in emails
+                if email.id not in prepared
+                and email.id not in self._tasks
+                and any(tag.label.lower() in settings.SPECULATIVE_REPLY_TAGS for tag in email.tags)
+            ),
+            key=lambda email: email.timestamp,
+            reverse=True
+        )[:settings.SPECULATIVE_REPLY_BUDGET]
+        
+        if not candidates:
+            return 0
+        
+        semaphore = asyncio.Semaphore(settings.SPECULATIVE_REPLY_CONCURRENCY)
+        
+        async def generate(email: EmailInternal) -> None:
+            async with semaphore:
+                content = await self.llm_service.generate_reply_async(
+                    sender=email.sender,
+                    subject=email.subject,
+                    email_body=email.body,
+                    reply_prompt=reply_prompt,
+                    fallback=False  # a canned reply must not be served as a prepared one
+                )
+            self._store(PreparedReply(
+                emailId=email.id,
+                content=content,
+                promptVersion=self.prompt_version(reply_prompt),
+                emailHash=self.email_hash(email),
+                timestamp=self.file_service.generate_current_timestamp()
+            ))
+        
+        tasks = []
+        for email in candidates:
+            task = asyncio.ensure_future(generate(email))
+            self._tasks[email.id] = task
+            task.add_done_callback(lambda done, email_id=email.id: self._forget(email_id, done))
+            tasks.append(task)
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        generated = sum(1 for result in results if not isinstance(result, BaseException))
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            print(f"Warning: {len(failed)} speculative replies failed: {failed[0]}")
+        print(f"✓ Pre-generated {generated} replies")
+        return generated
+    
+    def cancel(self, email_id: str) -> None:
+        """Cancel pending generation and drop any stored reply for an email"""
+        task = self._tasks.pop(email_id, None)
+        if task is not None:
+            task.cancel()
+        
+        prepared = self.file_service.read_prepared_replies()
+        if prepared.pop(email_id, None) is not None:
+            self.file_service.write_prepared_replies(prepared)
+    
+    # ========== Helpers ==========
+    
+    def _store(self, reply: PreparedReply) -> None:
+        # Skip emails deleted while their reply was being generated
+        if reply.emailId not in self._tasks:
+            return
+        prepared = self.file_service.read_prepared_replies()
+        prepared[reply.emailId] = reply
+        self.file_service.write_prepared_replies(prepared)
+    
+    def _forget(self, email_id: str, task: asyncio.Task) -> None:
+        if self._tasks.get(email_id) is task:
+            del self._tasks[email_id]
+    
+    def _is_valid(self, prepared: PreparedReply, email: EmailInternal, reply_prompt: str) -> bool:
+        return (
+            prepared.promptVersion == self.prompt_version(reply_prompt)
+            and prepared.emailHash == self.email_hash(email)
+        )
+    
+    @staticmethod
+    def prompt_version(prompt: str) -> str:
+        # Same content hash the prompt registry reports for the reply prompt
+        return PromptRegistry.content_version(prompt)
+    
+    @staticmethod
+    def email_hash(email: EmailInternal) -> str:
+        content = f"{email.sender}\n{email.subject}\n{email.body}"
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
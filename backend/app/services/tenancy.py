@@ -0,0 +1,223 @@
+import re
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.services.classifier_service import ClassifierService
+from app.services.digest_service import DigestService
+from app.services.draft_store import DraftStore
+from app.services.file_service import FileService
+from app.services.gemini_client import GeminiClient
+from app.services.llm_service import LLMService
+from app.services.metrics import record_cache, tenants_cached
+from app.services.prompt_registry import PromptRegistry
+from app.services.speculative_service import SpeculativeReplyService
+from app.services.vector_service import VectorService
+
+# Tenant of the request being handled (set by the tenant middleware in main.py)
+_active_tenant: ContextVar[Optional["Tenant"]] = ContextVar("active_tenant", default=None)
+
+# Safe as a directory name and a Pinecone namespace
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Return tenant_id if usable as a tenant, else raise ValueError"""
+    if not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(
+            "Tenant ID must be 1-64 letters, digits, '-' or '_', starting with a letter or digit"
+        )
+    return tenant_id
+
+
+class Tenant:
+    """
+    One mailbox's services
+    
+    The default tenant keeps the top-level data files and Pinecone's default
+    namespace, so single-mailbox deployments are unchanged. Every other
+    tenant gets a directory under TENANTS_DIR and a namespace named after it.
+    
+    Building a second Tenant over the same directory is safe (the registry
+    does when a request outlives its tenant's eviction): every service keeps
+    its state in files it shares with other processes anyway.
+    """
+    
+    def __init__(
+        self,
+        tenant_id: str,
+        gemini_client: GeminiClient,
+        llm_service: LLMService,
+        default: "Tenant" = None
+    ):
+        self.id = tenant_id
+        self.users = 0  # requests and jobs using the tenant (see TenantRegistry.hold)
+        if default is None:
+            data_dir, namespace = None, ""
+            self.file_service = FileService()
+        else:
+            data_dir, namespace = settings.TENANTS_DIR / tenant_id, tenant_id
+            self.file_service = FileService(data_dir)
+            self.file_service.ensure_files_exist()
+        
+        self.prompt_registry = PromptRegistry(self.file_service)
+        self.draft_store = DraftStore(self.file_service)
+        self.vector_service = VectorService(
+            gemini_client,
+            namespace=namespace,
+            vectors_path=data_dir / settings.VECTORS_FILE.name if data_dir else None,
+            parent=default.vector_service if default else None,
+            changes_path=data_dir / settings.VECTOR_CHANGES_FILE.name if data_dir else None
+        )
+        self.speculative_service = SpeculativeReplyService(self.file_service, llm_service)
+        self.digest_service = DigestService(self.file_service, llm_service)
+        self.classifier_service = ClassifierService(
+            data_dir / settings.CLASSIFIER_FILE.name if data_dir else None
+        )
+
+
+class TenantRegistry:
+    """
+    Per-tenant services, built on first use and cached for hot tenants
+    
+    At most TENANT_CACHE_SIZE tenants are held in memory besides the default
+    one; the least recently used is evicted when a new one is loaded. Only
+    tenants no request or job is using are evicted, so the cache can run
+    over its size while they are busy and shrinks back as they finish. An
+    evicted tenant loses only in-memory state (prompt cache, classifier
+    model, local vector index), which is rebuilt from its files on its next
+    request; its draft store is retired (pending saves flushed, later ones
+    written through).
+    """
+    
+    def __init__(self, gemini_client: GeminiClient, llm_service: LLMService, capacity: int = None):
+        self.gemini_client = gemini_client
+        self.llm_service = llm_service
+        self.capacity = capacity if capacity is not None else settings.TENANT_CACHE_SIZE
+        self._default: Tenant = None
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        tenants_cached.set_function(lambda: len(self._tenants))
+    
+    @property
+    def default(self) -> Tenant:
+        """The default tenant (never evicted)"""
+        if self._default is None:
+            with self._lock:
+                if self._default is None:
+                    self._default = Tenant(settings.DEFAULT_TENANT, self.gemini_client, self.llm_service)
+        return self._default
+    
+    def get(self, tenant_id: str, hold: bool = False) -> Tenant:
+        """
+        The tenant's services, loading them if needed
+        
+        With hold=True the tenant is also held (see hold()) before another
+        thread can evict it.
+        """
+        if tenant_id == settings.DEFAULT_TENANT:
+            return self.default
+        default = self.default
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            record_cache("tenant", hit=tenant is not None)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+            else:
+                tenant = Tenant(tenant_id, self.gemini_client, self.llm_service, default)
+                self._tenants[tenant_id] = tenant
+            if hold:
+                tenant.users += 1
+            evicted = self._evict_idle()
+        self._retire(evicted)
+        return tenant
+    
+    def hold(self, tenant: Tenant) -> None:
+        """Keep a loaded tenant from being evicted until release()"""
+        with self._lock:
+            tenant.users += 1
+    
+    def release(self, tenant: Tenant) -> None:
+        """Undo one hold(), evicting the tenant if the cache is over size and it is now idle"""
+        if tenant is self._default:
+            return
+        with self._lock:
+            tenant.users -= 1
+            evicted = self._evict_idle()
+        self._retire(evicted)
+    
+    def loaded(self) -> List[Tenant]:
+        """Tenants currently in memory (the default one once built)"""
+        with self._lock:
+            tenants = list(self._tenants.values())
+        return ([self._default] if self._default is not None else []) + tenants
+    
+    def activate(self, tenant_id: str):
+        """Make tenant_id current (and held) for this request; returns a token for deactivate"""
+        return _active_tenant.set(self.get(tenant_id, hold=True))
+    
+    def deactivate(self, token) -> None:
+        tenant = _active_tenant.get()
+        _active_tenant.reset(token)
+        if tenant is not None:
+            self.release(tenant)
+    
+    def current(self) -> Tenant:
+        """The tenant of the request being handled (default outside requests)"""
+        tenant = _active_tenant.get()
+        return tenant if tenant is not None else self.default
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._tenants),
+            "capacity": self.capacity,
+            "evictions": self.evictions,
+        }
+    
+    def _evict_idle(self) -> List[Tenant]:
+        """Drop least recently used idle tenants until within capacity (call with _lock held)"""
+        evicted = []
+        for tenant_id, tenant in list(self._tenants.items()):
+            if len(self._tenants) <= self.capacity:
+                break
+            if tenant.users == 0:
+                del self._tenants[tenant_id]
+                evicted.append(tenant)
+                self.evictions += 1
+        return evicted
+    
+    @staticmethod
+    def _retire(evicted: List[Tenant]) -> None:
+        for old in evicted:
+            try:
+                old.draft_store.retire()
+            except Exception as e:
+                print(f"Warning: Failed to flush drafts of evicted tenant '{old.id}': {e}")
+
+
+class TenantScoped:
+    """
+    Stand-in for a per-tenant service that resolves to the current tenant's
+    
+    Lets routers keep importing `file_service`, `vector_service` etc. from
+    app.services while each request reaches its own tenant's instance.
+    """
+    
+    def __init__(self, tenants: Any, attribute: str):
+        object.__setattr__(self, "_tenants", tenants)
+        object.__setattr__(self, "_attribute", attribute)
+    
+    def resolve(self) -> Any:
+        """The current tenant's service"""
+        return getattr(self._tenants.current(), self._attribute)
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+    
+    def __repr__(self) -> str:
+        return f"<TenantScoped {self._attribute} of {self._tenants.current().id!r}>"
@@ -0,0 +1,187 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.models import EmailInternal
+
+# Reply / forward prefixes in common mail clients and languages, or a list tag
+_SUBJECT_PREFIX = re.compile(
+    r"^\s*(?:(?P<reply>(?:re|fwd?|aw|wg|sv|vs|tr|rif|antw)\s*(?:\[\d+\]|\(\d+\))?\s*[:：])|\[[^\]]*\])\s*",
+    re.IGNORECASE
+)
+_MESSAGE_ID = re.compile(r"<[^<>\s]+>")
+# "On Mon, Jan 1, 2024 at 9:00 AM Sarah <s@x.com> wrote:"
+_ATTRIBUTION = re.compile(r"^\s*On\b.{0,200}\bwrote:\s*$", re.IGNORECASE)
+# Outlook-style forwarded / replied-to original; everything below it is quoted
+_ORIGINAL_MESSAGE = re.compile(r"^\s*-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}\s*$", re.IGNORECASE)
+_QUOTE_MARKS = re.compile(r"^\s*(?:>\s?)+")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*\n+")
+
+
+def normalize_subject(subject: str) -> str:
+    """Subject without Re:/Fwd:/[list] prefixes, whitespace-collapsed and case-folded"""
+    return _split_subject(subject)[1]
+
+
+def _split_subject(subject: str) -> Tuple[bool, str]:
+    """(whether it had a Re:/Fwd: prefix, normalized subject)"""
+    is_reply = False
+    while match := _SUBJECT_PREFIX.match(subject):
+        if not match.group(0):
+            break
+        is_reply = is_reply or match.group("reply") is not None
+        subject = subject[match.end():]
+    return is_reply, " ".join(subject.split()).casefold()
+
+
+def parse_message_ids(value: Optional[str]) -> List[str]:
+    """Message IDs ("<...>") in a Message-ID, In-Reply-To or References header"""
+    return _MESSAGE_ID.findall(value or "")
+
+
+def thread_id_of(email: EmailInternal) -> str:
+    """The email's thread (emails written before threading are their own thread)"""
+    return email.threadId or f"t{email.id}"
+
+
+class ThreadIndex:
+    """
+    Message ID and normalized subject -> thread ID, for assigning new emails
+    
+    Reply headers are trusted first: an email joins the thread of any
+    message it replies to or references, or that already references it
+    (so a parent imported after its replies still joins them). Without a
+    match, a reply ("Re:", "Fwd:", ...) joins the thread with the same
+    normalized subject; other emails start their own thread, named after
+    themselves, so recurring notifications with one subject stay apart.
+    """
+    
+    def __init__(self):
+        self.by_message: Dict[str, str] = {}
+        self.by_subject: Dict[str, str] = {}
+    
+    @classmethod
+    def build(cls, emails: Iterable[EmailInternal]) -> "ThreadIndex":
+        """Index the emails that already belong to a thread"""
+        index = cls()
+        for email in emails:
+            if email.threadId:
+                index.add(email, email.threadId)
+        return index
+    
+    def add(self, email: EmailInternal, thread_id: str) -> None:
+        for message_id in self._message_ids(email):
+            self.by_message.setdefault(message_id, thread_id)
+        subject = normalize_subject(email.subject)
+        if subject:
+            self.by_subject.setdefault(subject, thread_id)
+    
+    def assign(self, email: EmailInternal) -> str:
+        """Set and return email.threadId, indexing the email"""
+        thread_id = next(
+            (self.by_message[m] for m in self._message_ids(email) if m in self.by_message),
+            None
+        )
+        if thread_id is None:
+            is_reply, subject = _split_subject(email.subject)
+            if is_reply:
+                thread_id = self.by_subject.get(subject)
+        email.threadId = thread_id or f"t{email.id}"
+        self.add(email, email.threadId)
+        return email.threadId
+    
+    @staticmethod
+    def _message_ids(email: EmailInternal) -> List[str]:
+        ids = [email.messageId, email.inReplyTo, *email.references]
+        return [message_id for message_id in ids if message_id]
+
+
+def assign_threads(emails: List[EmailInternal]) -> int:
+    """
+    Give each email without a thread one, oldest first
+    
+    Emails that already have a thread keep it, so only new emails are
+    matched. Returns the number of emails assigned.
+    """
+    index = ThreadIndex.build(emails)
+    new = sorted((email for email in emails if not email.threadId), key=lambda email: email.timestamp)
+    for email in new:
+        index.assign(email)
+    return len(new)
+
+
+def group_by_thread(emails: Iterable[EmailInternal]) -> Dict[str, List[EmailInternal]]:
+    """Emails by thread ID, each thread oldest first"""
+    threads: Dict[str, List[EmailInternal]] = {}
+    for email in emails:
+        threads.setdefault(thread_id_of(email), []).append(email)
+    for thread in threads.values():
+        thread.sort(key=lambda email: email.timestamp)
+    return threads
+
+
+# ========== Quoted Text ==========
+
+def collapse_quotes(bodies: List[str]) -> List[str]:
+    """
+    Remove quoted text already present earlier in the thread
+    
+    Args:
+        bodies: Message bodies of one thread, oldest first
+        
+    Returns:
+        The bodies with quoted lines (">" prefixed, or below an "Original
+        Message" separator) dropped when an earlier message already has the
+        same line. Attribution lines ("On ... wrote:") go with their quotes.
+    """
+    seen = set()
+    collapsed = []
+    for body in bodies:
+        lines = body.replace("\r\n", "\n").split("\n")
+        kept = []  # (line, quoted)
+        below_original = False
+        for line in lines:
+            if _ORIGINAL_MESSAGE.match(line):
+                below_original = True
+                kept.append((line, True))
+                continue
+            quoted = below_original or bool(_QUOTE_MARKS.match(line))
+            text = _quote_text(line)
+            if quoted and (not text or text in seen):
+                continue
+            kept.append((line, quoted))
+        
+        # Drop separators and attributions left with nothing quoted under them
+        result = []
+        for i, (line, quoted) in enumerate(kept):
+            if _ORIGINAL_MESSAGE.match(line) or _ATTRIBUTION.match(line):
+                following = next((q for other, q in kept[i + 1:] if other.strip()), False)
+                if not following:
+                    continue
+            result.append(line)
+        
+        seen.update(text for text in map(_quote_text, lines) if text)
+        text = _BLANK_LINES.sub("\n\n", "\n".join(result)).strip()
+        collapsed.append(text)
+    return collapsed
+
+
+def _quote_text(line: str) -> str:
+    return " ".join(_QUOTE_MARKS.sub("", line).split())
+
+
+def conversation_text(emails: List[EmailInternal], max_chars: int) -> str:
+    """
+    A thread as one text for the LLM: each message with sender and date,
+    oldest first, quotes collapsed
+    
+    When longer than max_chars the oldest messages are cut, since the
+    latest ones matter most for tagging and answering.
+    """
+    bodies = collapse_quotes([email.body for email in emails])
+    messages = [
+        f"From {email.sender} ({email.timestamp}):\n{body}"
+        for email, body in zip(emails, bodies)
+    ]
+    text = "\n\n---\n\n".join(messages)
+    if len(text) > max_chars:
+        text = "[earlier messages omitted]\n" + text[-max_chars:]
+    return text
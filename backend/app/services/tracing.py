@@ -0,0 +1,226 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.config import settings
+
+# Trace of the request being handled; copied into tasks and worker threads
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+@dataclass
+class Span:
+    """One timed operation inside a request"""
+    name: str
+    start_ms: float  # offset from the start of the request
+    duration_ms: float
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start_ms, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+
+class Trace:
+    """
+    Spans recorded while handling one request
+    
+    Spans from concurrent tasks and worker threads may overlap; start_ms
+    offsets keep the timeline, and the Server-Timing header sums durations
+    per span name.
+    """
+    
+    # Server-Timing entries per response (browsers show them in devtools)
+    MAX_HEADER_ENTRIES = 20
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+    
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+    
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+    
+    def server_timing(self, total_ms: float) -> str:
+        """Server-Timing header value: total time plus summed time per span name"""
+        totals: Dict[str, List[float]] = {}
+        with self._lock:
+            for span in self.spans:
+                entry = totals.setdefault(span.name, [0.0, 0])
+                entry[0] += span.duration_ms
+                entry[1] += 1
+        entries = [f"total;dur={total_ms:.1f}"]
+        for name, (duration, count) in list(totals.items())[:self.MAX_HEADER_ENTRIES]:
+            desc = f';desc="{count} calls"' if count > 1 else ""
+            entries.append(f"{name};dur={duration:.1f}{desc}")
+        return ", ".join(entries)
+    
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"spans": [span.to_dict() for span in self.spans]}
+
+
+class _SpanTimer:
+    """Context manager recording a span on the current trace (no-op outside a request)"""
+    
+    __slots__ = ("name", "attrs", "_trace", "_start")
+    
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self._trace = None
+        self._start = 0.0
+    
+    def __enter__(self) -> "_SpanTimer":
+        self._trace = _current_trace.get()
+        if self._trace is not None:
+            self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._trace is None:
+            return
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._trace.add(Span(
+            self.name,
+            (self._start - self._trace.start) * 1000,
+            (end - self._start) * 1000,
+            self.attrs
+        ))
+
+
+def span(name: str, **attrs: Any) -> _SpanTimer:
+    """
+    Time a block as a span of the current request
+    
+    Usable around both sync and awaited calls:
+        with span("pinecone.query"):
+            await ...
+    """
+    return _SpanTimer(name, attrs)
+
+
+def start_trace() -> tuple:
+    """Begin tracing the current request; returns (trace, token for end_trace)"""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token) -> None:
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+# ========== Trace Log ==========
+
+_log_lock = threading.Lock()
+
+
+def log_trace(trace: Trace, method: str, route: str, status: int, total_ms: float) -> None:
+    """
+    Append the trace to TRACE_LOG_FILE (JSON lines)
+    
+    Requests slower than TRACE_SLOW_MS are always logged; others are logged
+    at TRACE_LOG_SAMPLE_RATE.
+    """
+    if not settings.TRACE_LOG_FILE:
+        return
+    slow = total_ms >= settings.TRACE_SLOW_MS
+    if not slow and random.random() >= settings.TRACE_LOG_SAMPLE_RATE:
+        return
+    line = json.dumps({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "method": method,
+        "route": route,
+        "status": status,
+        "duration_ms": round(total_ms, 3),
+        "slow": slow,
+        **trace.to_dict(),
+    })
+    with _log_lock, open(settings.TRACE_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(line + "\n")
+
+
+# ========== Slow-Request Profiling ==========
+
+class StackSampler:
+    """
+    Samples the stacks of every thread at a fixed interval
+    
+    Started for a sampled fraction of requests (TRACE_PROFILE_SAMPLE_RATE)
+    and kept only when the request turns out slower than TRACE_SLOW_MS.
+    Requests share the event loop, so a profile also shows whatever else
+    was running at the time. Output is in collapsed-stack format
+    ("thread;outer;inner count"), readable by flamegraph.pl and speedscope.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+    
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+    
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+    
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+
+def maybe_start_profiler() -> Optional[StackSampler]:
+    if settings.TRACE_PROFILE_SAMPLE_RATE and random.random() < settings.TRACE_PROFILE_SAMPLE_RATE:
+        return StackSampler(settings.TRACE_PROFILE_INTERVAL_MS / 1000).start()
+    return None
+
+
+def finish_profiler(sampler: StackSampler, method: str, route: str, total_ms: float) -> Optional[Path]:
+    """Stop sampling; write the profile if the request was slow"""
+    samples = sampler.stop()
+    if total_ms < settings.TRACE_SLOW_MS or not samples:
+        return None
+    directory = Path(settings.TRACE_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    path = directory / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{method}-{slug}-{total_ms:.0f}ms.folded"
+    path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+    return path
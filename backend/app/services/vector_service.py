@@ -1,27 +1,117 @@
-import pinecone
-from pinecone import Pinecone, ServerlessSpec
-import google.generativeai as genai
-from typing import List, Dict, Any
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 from app.config import settings
 from app.models import EmailInternal
+from app.services.cassette import CassetteIndex, cassette_for
+from app.services.gemini_client import GeminiClient
+from app.services.metrics import record_cache, track_upstream
+from app.services.resilience import UpstreamUnavailableError, call_with_retry, error_status, pinecone_limiter
+from app.services.singleflight import SingleFlight
 
 class VectorService:
-    """Handles Pinecone vector operations for RAG"""
+    """
+    Handles Pinecone vector operations for RAG
     
-    def __init__(self):
-        # Initialize Pinecone
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+    Construction does no network I/O: the Pinecone SDK is imported and the
+    index connected (or created) on first use of `index`, or ahead of time
+    by `warm_up()`.
+    
+    Each tenant has its own VectorService writing to its own Pinecone
+    namespace; they all share one index connection (see `parent`).
+    
+    With LOCAL_VECTOR_INDEX, queries are answered from an in-memory copy of
+    the namespace once it has been loaded from Pinecone (in the background,
+    on warm-up or first query); until then they go to Pinecone. Every
+    process appends to a shared change log (`changes_path`) when it changes
+    the namespace, so a process whose copy missed another's change falls
+    back to Pinecone and reloads.
+    """
+    
+    # Gemini batchEmbedContents accepts at most 100 texts per call
+    EMBED_BATCH_SIZE = 100
+    UPSERT_BATCH_SIZE = 100
+    # Pinecone lists at most 100 IDs per page
+    LIST_PAGE_SIZE = 100
+    
+    def __init__(
+        self,
+        client: GeminiClient = None,
+        namespace: str = "",
+        vectors_path: Optional[Path] = None,
+        parent: Optional["VectorService"] = None,
+        changes_path: Optional[Path] = None
+    ):
+        """
+        Args:
+            client: Shared Gemini client for embeddings
+            namespace: Pinecone namespace for this mailbox ("" = default)
+            vectors_path: Local index re-rank file (default settings.VECTORS_FILE)
+            parent: Service whose Pinecone connection to share (tenants share
+                the default tenant's); None to own the connection
+            changes_path: Change log of this namespace (default settings.VECTOR_CHANGES_FILE)
+        """
+        # Pinecone client and index are connected lazily (see `index`)
+        self.pc = None
+        self._index = None
+        self._index_lock = threading.Lock()
         self.index_name = settings.PINECONE_INDEX_NAME
+        self.namespace = namespace
+        self.parent = parent
         
-        # Initialize Gemini for embeddings
-        genai.configure(api_key=settings.GEMINI_API_KEY)
+        # Shared async client for embeddings
+        self.client = client or GeminiClient()
+        self.in_flight = SingleFlight("query_embedding")  # coalesces identical concurrent query embeddings
         
-        # Initialize index
-        self._initialize_index()
+        # Optional in-memory mirror of the index for local similarity search
+        self.vectors_path = vectors_path or settings.VECTORS_FILE
+        self.changes_path = changes_path or settings.VECTOR_CHANGES_FILE
+        self.local_index = None
+        self._local_version: Optional[int] = None  # change count the local index reflects; None until loaded
+        self._local_loading = False
+        self._local_lock = threading.Lock()
+        if settings.LOCAL_VECTOR_INDEX:
+            self.local_index = self._new_local_index()
+    
+    @property
+    def index(self):
+        """The Pinecone index, connected on first use (blocking: call from a worker thread)"""
+        if self.parent is not None:
+            return self.parent.index
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    cassette = cassette_for("pinecone")
+                    if cassette is not None and cassette.mode == "replay":
+                        # Served from the cassette; Pinecone is never contacted
+                        self._index = CassetteIndex(cassette)
+                    else:
+                        self._initialize_index()
+                        if cassette is not None:
+                            self._index = CassetteIndex(cassette, self._index)
+        return self._index
+    
+    def warm_up(self) -> None:
+        """Connect to Pinecone ahead of the first request (and start loading the local index)"""
+        self.index
+        if self.local_index is not None:
+            self._schedule_local_load()
     
     def _initialize_index(self) -> None:
         """Create Pinecone index if it doesn't exist"""
+        from pinecone import Pinecone, ServerlessSpec
+        
         try:
+            self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+            
+            # Known index host (e.g. a local or mock server): connect directly
+            if settings.PINECONE_HOST:
+                self._index = self.pc.Index(host=settings.PINECONE_HOST)
+                return
+            
             # Check if index exists
             existing_indexes = self.pc.list_indexes()
             index_names = [idx['name'] for idx in existing_indexes]
@@ -40,7 +130,7 @@ class VectorService:
                 print(f"✓ Created Pinecone index: {self.index_name}")
             
             # Connect to index
-            self.index = self.pc.Index(self.index_name)
+            self._index = self.pc.Index(self.index_name)
             
         except Exception as e:
             print(f"Error initializing Pinecone index: {e}")
@@ -48,7 +138,10 @@ class VectorService:
     
     def _generate_embedding(self, text: str) -> List[float]:
         """Generate embedding using Gemini"""
+        import google.generativeai as genai
+        
         try:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
             result = genai.embed_content(
                 model=settings.GEMINI_EMBEDDING_MODEL,
                 content=text,
@@ -59,6 +152,15 @@ class VectorService:
             print(f"Error generating embedding: {e}")
             raise
     
+    async def _generate_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings through the pooled async client, batched"""
+        embeddings = []
+        for i in range(0, len(texts), self.EMBED_BATCH_SIZE):
+            embeddings.extend(
+                await self.client.batch_embed_contents(texts[i:i + self.EMBED_BATCH_SIZE])
+            )
+        return embeddings
+    
     def upsert_emails(self, emails: List[EmailInternal]) -> None:
         """
         Add or update emails in the vector database
@@ -67,42 +169,113 @@ class VectorService:
             emails: List of emails to index
         """
         try:
-            vectors = []
+            # Generate embeddings (subject and body combined)
+            texts, slots = self._embedding_plan(emails)
+            unique = [self._generate_embedding(text) for text in texts]
+            embeddings = [unique[slot] for slot in slots]
             
+            vectors = self._build_vectors(emails, embeddings)
+            self._store_vectors(vectors)
+            
+            print(f"✓ Upserted {len(vectors)} emails to Pinecone")
+            
+        except Exception as e:
+            print(f"Error upserting emails: {e}")
+            raise
+    
+    async def upsert_emails_async(self, emails: List[EmailInternal]) -> None:
+        """
+        Awaitable version of upsert_emails
+        
+        Embeddings are generated in batches through the pooled async client;
+        the Pinecone SDK is synchronous, so its upserts run in a worker thread
+        (rate limited and retried like every other upstream call).
+        """
+        try:
+            texts, slots = self._embedding_plan(emails)
+            unique = await self._generate_embeddings_async(texts)
+            embeddings = [unique[slot] for slot in slots]
+            
+            vectors = self._build_vectors(emails, embeddings)
+            # Each batch is retried on its own so a transient error late in a
+            # bulk upsert does not resend the batches that already landed
+            with self._changing():
+                for i in range(0, len(vectors), self.UPSERT_BATCH_SIZE):
+                    batch = vectors[i:i + self.UPSERT_BATCH_SIZE]
+                    await self._pinecone_call(
+                        "upsert", lambda batch=batch: self.index.upsert(vectors=batch, namespace=self.namespace)
+                    )
+                self._add_to_local_index(vectors)
+            
+            print(f"✓ Upserted {len(vectors)} emails to Pinecone")
+            
+        except Exception as e:
+            print(f"Error upserting emails: {e}")
+            raise
+    
+    @staticmethod
+    def _embedding_text(email: EmailInternal) -> str:
+        """Combine subject and body for embedding"""
+        return f"{email.subject}\n\n{email.body}"
+    
+    @classmethod
+    def _embedding_plan(cls, emails: List[EmailInternal]) -> Tuple[List[str], List[int]]:
+        """
+        Texts to embed, and for each email the index of its embedding
+        
+        With NEAR_DUPLICATE_EMBEDDINGS, a near-duplicate whose cluster
+        representative is in the same batch shares its embedding instead of
+        being embedded again.
+        """
+        representatives = set()
+        if settings.NEAR_DUPLICATES_ENABLED and settings.NEAR_DUPLICATE_EMBEDDINGS:
+            representatives = {email.id for email in emails if not email.duplicateOf}
+        texts = []
+        slot_of = {}
+        for email in emails:
+            if email.duplicateOf not in representatives:
+                slot_of[email.id] = len(texts)
+                texts.append(cls._embedding_text(email))
+        if representatives:
             for email in emails:
-                # Combine subject and body for embedding
-                text_to_embed = f"{email.subject}\n\n{email.body}"
-                
-                # Generate embedding
-                embedding = self._generate_embedding(text_to_embed)
-                
-                # Prepare metadata (must be JSON-serializable)
-                metadata = {
+                record_cache("duplicate_embedding", hit=email.id not in slot_of)
+        slots = [slot_of.get(email.id, slot_of.get(email.duplicateOf)) for email in emails]
+        return texts, slots
+    
+    @staticmethod
+    def _build_vectors(emails: List[EmailInternal], embeddings: List[List[float]]) -> List[Dict[str, Any]]:
+        """Pair embeddings with Pinecone metadata (must be JSON-serializable)"""
+        return [
+            {
+                "id": email.id,
+                "values": embedding,
+                "metadata": {
                     "id": email.id,
                     "sender": email.sender,
                     "subject": email.subject,
                     "body": email.body[:500],  # Truncate for metadata limits
                     "timestamp": email.timestamp
                 }
-                
-                # Add to batch
-                vectors.append({
-                    "id": email.id,
-                    "values": embedding,
-                    "metadata": metadata
-                })
-            
-            # Upsert in batches of 100
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                self.index.upsert(vectors=batch)
-            
-            print(f"✓ Upserted {len(vectors)} emails to Pinecone")
+            }
+            for email, embedding in zip(emails, embeddings)
+        ]
+    
+    def _store_vectors(self, vectors: List[Dict[str, Any]]) -> None:
+        """Upsert vectors to Pinecone (batches of 100) and the local index"""
+        with self._changing():
+            for i in range(0, len(vectors), self.UPSERT_BATCH_SIZE):
+                batch = vectors[i:i + self.UPSERT_BATCH_SIZE]
+                self.index.upsert(vectors=batch, namespace=self.namespace)
             
-        except Exception as e:
-            print(f"Error upserting emails: {e}")
-            raise
+            self._add_to_local_index(vectors)
+    
+    def _add_to_local_index(self, vectors: List[Dict[str, Any]]) -> None:
+        if self.local_index is not None:
+            self.local_index.add(
+                ids=[v["id"] for v in vectors],
+                vectors=[v["values"] for v in vectors],
+                metadata=[v["metadata"] for v in vectors]
+            )
     
     def search_relevant_emails(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
         """
@@ -122,30 +295,110 @@ class VectorService:
             # Generate query embedding
             query_embedding = self._generate_embedding(query)
             
-            # Search Pinecone
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
+            return self._query_vectors(query_embedding, top_k)
             
-            # Extract metadata from matches
-            emails = []
-            for match in results['matches']:
-                emails.append({
-                    "id": match['metadata']['id'],
-                    "sender": match['metadata']['sender'],
-                    "subject": match['metadata']['subject'],
-                    "body": match['metadata']['body'],
-                    "score": match['score']
-                })
+        except Exception as e:
+            print(f"Error searching emails: {e}")
+            return []
+    
+    async def search_relevant_emails_async(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
+        """Awaitable version of search_relevant_emails"""
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
+        
+        try:
+            query_embedding = await self.in_flight.do(
+                SingleFlight.make_key("embed", settings.GEMINI_EMBEDDING_MODEL, query),
+                lambda: self.client.embed_content(query)
+            )
             
-            return emails
+            # Local index search is in-memory; only Pinecone needs a thread
+            if self._local_ready():
+                with track_upstream("local_index", "query"):
+                    return self._query_local(query_embedding, top_k)
+            return await self._pinecone_call("query", self._query_pinecone, query_embedding, top_k)
             
+        except UpstreamUnavailableError:
+            raise
         except Exception as e:
             print(f"Error searching emails: {e}")
             return []
     
+    async def _pinecone_call(self, operation: str, fn, *args, **kwargs):
+        """
+        Run a blocking Pinecone SDK call in a thread, rate limited and retried
+        
+        fn should look up `self.index` itself so the first-use connection
+        also happens off the event loop.
+        """
+        with track_upstream("pinecone", operation):
+            return await call_with_retry(
+                "pinecone",
+                lambda: asyncio.to_thread(fn, *args, **kwargs),
+                pinecone_limiter
+            )
+    
+    def _query_vectors(self, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+        """Run a similarity query against the local index or Pinecone"""
+        if self._local_ready():
+            return self._query_local(query_embedding, top_k)
+        return self._query_pinecone(query_embedding, top_k)
+    
+    def _query_local(self, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": metadata['id'],
+                "sender": metadata['sender'],
+                "subject": metadata['subject'],
+                "body": metadata['body'],
+                "score": score
+            }
+            for _, score, metadata in self.local_index.search(query_embedding, top_k)
+        ]
+    
+    def _query_pinecone(self, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+        results = self.index.query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True,
+            namespace=self.namespace
+        )
+        
+        # Extract metadata from matches
+        emails = []
+        for match in results['matches']:
+            emails.append({
+                "id": match['metadata']['id'],
+                "sender": match['metadata']['sender'],
+                "subject": match['metadata']['subject'],
+                "body": match['metadata']['body'],
+                "score": match['score']
+            })
+        
+        return emails
+    
+    def _delete_namespace(self) -> None:
+        """Delete every vector in this service's namespace"""
+        try:
+            self.index.delete(delete_all=True, namespace=self.namespace)
+        except Exception as e:
+            # Nothing to clear: a new tenant's namespace does not exist yet
+            if error_status(e) != 404:
+                raise
+    
+    def delete_emails(self, email_ids: List[str]) -> None:
+        """
+        Remove emails from the vector database
+        
+        Args:
+            email_ids: IDs of the emails to remove
+        """
+        with self._changing():
+            with track_upstream("pinecone", "delete"):
+                self.index.delete(ids=email_ids, namespace=self.namespace)
+            if self.local_index is not None:
+                self.local_index.remove(email_ids)
+    
     def rebuild_index(self, emails: List[EmailInternal]) -> None:
         """
         Delete all vectors and re-index all emails
@@ -153,13 +406,150 @@ class VectorService:
         """
         try:
             # Delete all vectors
-            self.index.delete(delete_all=True)
+            with self._changing() as version:
+                self._delete_namespace()
+                self._reset_local_index(version)
             print("✓ Cleared Pinecone index")
             
             # Re-upsert all emails
             if emails:
                 self.upsert_emails(emails)
+                
+        except Exception as e:
+            print(f"Error rebuilding index: {e}")
+            raise
+    
+    async def rebuild_index_async(self, emails: List[EmailInternal]) -> None:
+        """Awaitable version of rebuild_index"""
+        try:
+            with self._changing() as version:
+                await self._pinecone_call("delete_all", self._delete_namespace)
+                self._reset_local_index(version)
+            print("✓ Cleared Pinecone index")
             
+            if emails:
+                await self.upsert_emails_async(emails)
+                
         except Exception as e:
             print(f"Error rebuilding index: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    # ========== Local Index ==========
+    
+    def load_local_index(self) -> int:
+        """
+        Fill a fresh local index from this namespace in Pinecone (blocking)
+        
+        The new index replaces the current one only once complete, so
+        queries never see it half loaded. Returns the number of vectors.
+        """
+        version = self._change_count()
+        local_index = self._new_local_index()
+        token = None
+        while True:
+            with track_upstream("pinecone", "list"):
+                try:
+                    page = self.index.list_paginated(
+                        namespace=self.namespace, limit=self.LIST_PAGE_SIZE, pagination_token=token
+                    )
+                except Exception as e:
+                    # A new tenant's namespace does not exist yet
+                    if error_status(e) != 404:
+                        raise
+                    break
+            ids = [item['id'] for item in page['vectors']]
+            if ids:
+                with track_upstream("pinecone", "fetch"):
+                    fetched = self.index.fetch(ids=ids, namespace=self.namespace)['vectors']
+                vectors = [fetched[vector_id] for vector_id in ids if vector_id in fetched]
+                local_index.add(
+                    ids=[v['id'] for v in vectors],
+                    vectors=[v['values'] for v in vectors],
+                    metadata=[v['metadata'] for v in vectors]
+                )
+            token = (page.get('pagination') or {}).get('next')
+            if not token:
+                break
+        
+        with self._local_lock:
+            self.local_index, self._local_version = local_index, version
+        print(f"✓ Loaded {len(local_index)} vectors into the local index")
+        return len(local_index)
+    
+    def _new_local_index(self):
+        from app.services.local_vector_index import LocalVectorIndex
+        return LocalVectorIndex(
+            dimension=settings.PINECONE_DIMENSION,
+            quantization=settings.VECTOR_QUANTIZATION,
+            pca_dim=settings.VECTOR_PCA_DIM,
+            rerank_factor=settings.VECTOR_RERANK_FACTOR,
+            full_precision_path=self.vectors_path
+        )
+    
+    def _local_ready(self) -> bool:
+        """
+        True when the local index holds every change made to the namespace
+        
+        Otherwise starts (re)loading it in the background; queries go to
+        Pinecone meanwhile.
+        """
+        if self.local_index is None:
+            return False
+        if self._local_version is not None and self._local_version == self._change_count():
+            return True
+        self._schedule_local_load()
+        return False
+    
+    def _schedule_local_load(self) -> None:
+        with self._local_lock:
+            if self._local_loading:
+                return
+            self._local_loading = True
+        threading.Thread(target=self._load_in_background, name="local-index-load", daemon=True).start()
+    
+    def _load_in_background(self) -> None:
+        try:
+            self.load_local_index()
+        except Exception as e:
+            print(f"Warning: Failed to load the local vector index: {e}")
+        finally:
+            self._local_loading = False
+    
+    def _reset_local_index(self, version: int) -> None:
+        """Replace the local index with an empty one matching an emptied namespace"""
+        if self.local_index is not None:
+            with self._local_lock:
+                self.local_index, self._local_version = self._new_local_index(), version
+    
+    def _change_count(self) -> int:
+        """Changes made to this namespace by every process so far (the change log's size)"""
+        try:
+            return os.stat(self.changes_path).st_size
+        except OSError:
+            return 0
+    
+    @contextmanager
+    def _changing(self):
+        """
+        Wrap a change to the namespace (yields the change count before it)
+        
+        Appends one byte to the change log afterwards, even on failure, as
+        part of the change may have landed. This process's local index stays
+        current only if the change succeeded and no other change was logged
+        since the index was.
+        """
+        if self.local_index is None:
+            yield None
+            return
+        version = self._change_count()
+        applied = False
+        try:
+            yield version
+            applied = True
+        finally:
+            self.changes_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.changes_path, 'ab') as f:
+                f.write(b".")
+            with self._local_lock:
+                if applied and self._local_version == version and self._change_count() == version + 1:
+                    self._local_version = version + 1
@@ -0,0 +1,135 @@
+"""
+Background job workers
+
+Worker processes claim jobs from the SQLite queue (app/services/job_queue.py)
+and run them with the job's tenant active, one job at a time each. main.py
+starts JOB_WORKERS of them alongside the API. When running several uvicorn
+workers, set JOB_WORKERS=0 and run one pool separately instead:
+
+    python -m app.worker --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+from typing import List, Optional
+from app.config import settings
+from app.jobs import HANDLERS
+from app.models import Job
+from app.services import file_service, gemini_client, job_queue, tenants
+
+
+async def _keep_lease(job: Job, worker: str) -> None:
+    """Renew the job's lease while it runs so no other worker takes it over"""
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        job_queue.renew(job.id, worker)
+
+
+async def run_job(job: Job, worker: str) -> None:
+    """Run one claimed job and record its outcome"""
+    handler = HANDLERS.get(job.type)
+    if handler is None:
+        job_queue.fail(job.id, worker, f"Unknown job type '{job.type}'")
+        return
+    
+    token = tenants.activate(job.tenant)
+    lease = asyncio.create_task(_keep_lease(job, worker))
+    try:
+        result = await handler(job.payload)
+    except Exception as e:
+        print(f"Warning: Job {job.id} ({job.type}) failed on attempt {job.attempts}: {e}")
+        job_queue.fail(job.id, worker, f"{type(e).__name__}: {e}")
+    else:
+        job_queue.complete(job.id, worker, result)
+        print(f"✓ Job {job.id} ({job.type}) succeeded")
+    finally:
+        lease.cancel()
+        tenants.deactivate(token)
+
+
+async def work(worker: str, stop=None, parent_pid: Optional[int] = None) -> None:
+    """
+    Claim and run jobs until `stop` is set or the parent process exits
+    
+    A job in progress when stopping is finished first.
+    """
+    file_service.ensure_files_exist()
+    print(f"✓ Job worker {worker} started")
+    try:
+        while stop is None or not stop.is_set():
+            if parent_pid is not None and os.getppid() != parent_pid:
+                break
+            job = await asyncio.to_thread(job_queue.claim, worker)
+            if job is None:
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+                continue
+            await run_job(job, worker)
+    finally:
+        await gemini_client.aclose()
+
+
+def _process_main(stop, parent_pid: int) -> None:
+    # Ctrl-C reaches the whole process group; the parent stops us via `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(work(f"{socket.gethostname()}-{os.getpid()}", stop, parent_pid))
+
+
+class WorkerPool:
+    """A set of worker processes sharing one stop signal"""
+    
+    def __init__(self, processes: int):
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self.processes: List[multiprocessing.process.BaseProcess] = [
+            self._context.Process(
+                target=_process_main,
+                args=(self._stop, os.getpid()),
+                name=f"job-worker-{i}",
+                daemon=True
+            )
+            for i in range(processes)
+        ]
+    
+    def start(self) -> "WorkerPool":
+        for process in self.processes:
+            process.start()
+        return self
+    
+    def stop(self, timeout: float = 30) -> None:
+        """
+        Let workers finish their current job, then terminate stragglers
+        
+        Jobs interrupted by termination are retried once their lease expires.
+        """
+        self._stop.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+    
+    def join(self) -> None:
+        for process in self.processes:
+            process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument(
+        "--processes", type=int, default=max(settings.JOB_WORKERS, 1), help="Worker processes"
+    )
+    args = parser.parse_args()
+    
+    pool = WorkerPool(args.processes).start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping job workers...")
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Offline microbenchmarks for the services on synthetic inboxes
+
+Generates inboxes modeled on sample2.json (see benchmarks/synthetic.py) and
+times the hot paths against stand-in Gemini and Pinecone backends (see
+benchmarks/stand_ins.py), so runs need no keys or network and are
+comparable between commits:
+
+    upload        parse + validate an upload file (POST /emails/upload)
+    write         FileService.write_emails
+    read_raw      FileService._read_json on the inbox
+    read          FileService.read_emails (adds computed dates)
+    lookup        FileService.get_email_by_id
+    relative_date FileService.format_relative_date (per call)
+    preview       FileService.create_preview (per call)
+    ingest        POST /emails/ingest (categorize + embed + upsert)
+    retrieval     VectorService.search_relevant_emails_async (per query)
+
+With --record DIR the real Gemini and Pinecone are called instead (keys from
+.env) and every exchange is saved to cassettes in DIR (see
+app/services/cassette.py); --replay DIR then serves those recordings, so
+live-shaped ingest and retrieval runs can be repeated offline. Record and
+replay with the same --sizes and --seed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_services --sizes 1000,10000
+    python -m benchmarks.bench_services --sizes 1000000 --ingest-max 0 --output after.json
+    python -m benchmarks.bench_services --output after.json --compare before.json
+    python -m benchmarks.bench_services --sizes 1000 --record cassettes/
+    python -m benchmarks.bench_services --sizes 1000 --replay cassettes/
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Real keys (for --record) come from .env; stand-ins and replay accept any.
+# Stand-in backends never throttle, so let the limiters run flat out (when
+# recording, the adaptive limiters still back off on 429s).
+load_dotenv()
+for name, value in {
+    "GEMINI_API_KEY": "benchmark",
+    "PINECONE_API_KEY": "benchmark",
+    "GEMINI_GENERATE_RPS": "1000000",
+    "GEMINI_EMBED_RPS": "1000000",
+    "PINECONE_RPS": "1000000",
+    "UPSTREAM_MAX_CONCURRENCY": "1024",
+}.items():
+    os.environ.setdefault(name, value)
+
+import numpy as np
+from fastapi import BackgroundTasks, UploadFile
+
+from app.config import settings
+from app.models import EmailInternal
+from app.routers.emails import ingest_emails, upload_emails
+from app.services import file_service, gemini_client, vector_service
+from benchmarks import stand_ins
+from benchmarks.synthetic import generate_inbox
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Fixed clock for record/replay: request bodies (and so cassette keys) include timestamps
+CASSETTE_NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+QUERIES = [
+    "budget approval deadline",
+    "what are my action items from the project sync",
+    "newsletter about cloud and AI",
+    "who asked me to review something urgently",
+    "meeting notes and test plan",
+]
+
+
+class Timer:
+    """Median of repeated runs of one case"""
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+
+    def run(self, fn, setup=None) -> list:
+        samples = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    async def run_async(self, fn, setup=None) -> list:
+        samples = []
+        for _ in range(self.repeat):
+            if setup:
+                await setup()
+            start = time.perf_counter()
+            await fn()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+
+def result(case: str, size: int, samples: list, ops: int = 1, **extra) -> dict:
+    """One result row; per_op_us is the value to compare across commits"""
+    median = statistics.median(samples)
+    return {
+        "case": case,
+        "size": size,
+        "runs": len(samples),
+        "median_ms": round(median * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "per_op_us": round(median / ops * 1e6, 3),
+        **extra,
+    }
+
+
+def skipped(case: str, size: int, reason: str) -> dict:
+    return {"case": case, "size": size, "skipped": reason}
+
+
+async def bench_size(size: int, args, index: Optional[stand_ins.StandInIndex]) -> list:
+    """Run every case on one inbox size (index is None when recording or replaying)"""
+    timer = Timer(args.repeat)
+    emails = generate_inbox(size, seed=args.seed, now=CASSETTE_NOW if index is None else None)
+    upload = json.dumps(emails).encode()
+    rows = []
+
+    async def do_upload() -> None:
+        await upload_emails(UploadFile(io.BytesIO(upload), filename="inbox.json"))
+
+    rows.append(result("upload", size, await timer.run_async(do_upload), ops=size,
+                       upload_mb=round(len(upload) / 1e6, 2)))
+
+    internal = [EmailInternal(**e) for e in file_service._read_json(file_service.inbox_path)]
+    rows.append(result("write", size, timer.run(lambda: file_service.write_emails(internal)), ops=size,
+                       file_mb=round(file_service.inbox_path.stat().st_size / 1e6, 2)))
+    rows.append(result("read_raw", size, timer.run(lambda: file_service._read_json(file_service.inbox_path)),
+                       ops=size))
+    rows.append(result("read", size, timer.run(file_service.read_emails), ops=size))
+
+    rng = random.Random(args.seed)
+    lookup_ids = [rng.choice(emails)["id"] for _ in range(args.lookups)]
+    rows.append(result("lookup", size, timer.run(lambda: [file_service.get_email_by_id(i) for i in lookup_ids]),
+                       ops=len(lookup_ids)))
+
+    # Pure functions: time a fixed sample so small and large inboxes compare
+    sample = emails[:args.pure_sample]
+    timestamps = [e["timestamp"] for e in sample]
+    bodies = [e["body"] for e in sample]
+    rows.append(result("relative_date", size, timer.run(
+        lambda: [file_service.format_relative_date(t) for t in timestamps]), ops=len(sample)))
+    rows.append(result("preview", size, timer.run(
+        lambda: [file_service.create_preview(b) for b in bodies]), ops=len(bodies)))
+
+    if size <= args.ingest_max:
+        async def reset() -> None:
+            # Fresh untagged inbox (and empty stand-in index) for every run
+            await do_upload()
+            if index is not None:
+                index.delete(delete_all=True)
+
+        async def ingest() -> None:
+            response = await ingest_emails(BackgroundTasks())
+            if response.failed_count:
+                raise RuntimeError(f"Ingest failed for {response.failed_count} emails")
+
+        rows.append(result("ingest", size, await timer.run_async(ingest, setup=reset), ops=size))
+    else:
+        rows.append(skipped("ingest", size, f"size > --ingest-max {args.ingest_max}"))
+
+    if index is None and size > args.ingest_max:
+        rows.append(skipped("retrieval", size, "needs ingest to fill the index when recording or replaying"))
+    elif size <= args.retrieval_max:
+        # Ingest already filled the index through the real upsert path
+        if index is not None and index.describe_index_stats()["total_vector_count"] != size:
+            load_index(index, emails)
+
+        async def retrieve() -> None:
+            for query in QUERIES:
+                await vector_service.search_relevant_emails_async(query)
+
+        rows.append(result("retrieval", size, await timer.run_async(retrieve), ops=len(QUERIES)))
+    else:
+        rows.append(skipped("retrieval", size, f"size > --retrieval-max {args.retrieval_max}"))
+    return rows
+
+
+def load_index(index: stand_ins.StandInIndex, emails: list) -> None:
+    """Bulk load embeddings directly (skips the ingest path for large inboxes)"""
+    index.delete(delete_all=True)
+    batch = 10000
+    for offset in range(0, len(emails), batch):
+        chunk = emails[offset:offset + batch]
+        index.add(
+            [e["id"] for e in chunk],
+            np.asarray([stand_ins.embed(f"{e['subject']} {e['body']}") for e in chunk], dtype=np.float32),
+            [{"id": e["id"], "sender": e["sender"], "subject": e["subject"], "body": e["body"][:1000]}
+             for e in chunk]
+        )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict) -> list:
+    """Per-case change in per_op_us against a previous report"""
+    previous = {(r["case"], r["size"]): r for r in baseline["results"] if "per_op_us" in r}
+    lines = []
+    for row in report["results"]:
+        before = previous.get((row["case"], row["size"]))
+        if before is None or "per_op_us" not in row or not before["per_op_us"]:
+            continue
+        change = (row["per_op_us"] - before["per_op_us"]) / before["per_op_us"] * 100
+        lines.append(f"{row['case']:>14} {row['size']:>8}  {before['per_op_us']:>12.3f} -> "
+                     f"{row['per_op_us']:>12.3f} us/op  {change:+7.1f}%")
+    return lines
+
+
+async def run(args) -> dict:
+    results = []
+    with TemporaryDirectory() as workdir:
+        stand_ins.use_data_dir(settings, Path(workdir))
+        settings.SPECULATIVE_REPLIES_ENABLED = False
+        file_service.ensure_files_exist()
+        if args.record or args.replay:
+            settings.CASSETTE_MODE = "record" if args.record else "replay"
+            settings.CASSETTE_DIR = args.record or args.replay
+            index = None
+        else:
+            index = stand_ins.install(gemini_client, vector_service, latency_ms=args.llm_latency_ms)
+        try:
+            for size in args.sizes:
+                print(f"Benchmarking {size} emails...", file=sys.stderr)
+                # Services print progress; keep the report readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results.extend(await bench_size(size, args, index))
+        finally:
+            await gemini_client.aclose()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "llm_latency_ms": args.llm_latency_ms,
+            "classifier_enabled": settings.CLASSIFIER_ENABLED,
+            "categorization_cascade": settings.CATEGORIZATION_CASCADE,
+            "local_vector_index": settings.LOCAL_VECTOR_INDEX,
+            "inbox_snapshot": settings.INBOX_SNAPSHOT,
+            "backends": settings.CASSETTE_MODE if args.record or args.replay else "stand-in",
+        },
+        "results": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1000, 10000, 100000],
+                        help="Comma-separated inbox sizes (1k to 1M)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lookups", type=int, default=20, help="get_email_by_id calls per run")
+    parser.add_argument("--pure-sample", type=int, default=10000,
+                        help="Emails per run for relative_date / preview")
+    parser.add_argument("--ingest-max", type=int, default=10000, help="Largest size to run ingest on")
+    parser.add_argument("--retrieval-max", type=int, default=100000, help="Largest size to run retrieval on")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Added latency per stand-in Gemini call")
+    parser.add_argument("--record", type=Path, help="Call live Gemini/Pinecone and record cassettes here")
+    parser.add_argument("--replay", type=Path, help="Serve Gemini/Pinecone from cassettes recorded here")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    parser.add_argument("--compare", type=Path, help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+    if args.compare:
+        lines = compare(report, json.loads(args.compare.read_text()))
+        print(f"\nChange vs {args.compare} (per op, lower is better):", file=sys.stderr)
+        for line in lines:
+            print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Import-time and startup-time benchmark for the API
+
+Each run starts a fresh interpreter, times `import main` and then the
+lifespan startup (until the app is ready to serve), and records which heavy
+SDKs were imported along the way. Nothing here needs network access: a run
+that tried to reach Pinecone or Gemini during import or startup would fail
+or blow the budget.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --import-budget-ms 1000 --startup-budget-ms 250
+    python -m benchmarks.bench_startup --output startup.json
+
+Exits with status 1 when the median exceeds a budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that should not be loaded until a request needs them
+DEFERRED_MODULES = ["google.generativeai", "pinecone"]
+
+# Runs in the child interpreter; prints one JSON line
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+with TestClient(main.app):
+    ready = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def run_once() -> dict:
+    env = dict(os.environ)
+    # Startup validates that keys are set; they are never used here
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    env.setdefault("PINECONE_API_KEY", "benchmark")
+    # Measure time to ready, not the background warm-up
+    env["WARMUP_ON_STARTUP"] = "false"
+    
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(values) -> dict:
+    return {
+        "median_ms": round(statistics.median(values), 1),
+        "min_ms": round(min(values), 1),
+        "max_ms": round(max(values), 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1500)
+    parser.add_argument("--startup-budget-ms", type=float, default=500)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here as well")
+    args = parser.parse_args()
+    
+    runs = [run_once() for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "import": summarize([run["import_ms"] for run in runs]),
+        "startup": summarize([run["startup_ms"] for run in runs]),
+        "deferred_modules_loaded": sorted({m for run in runs for m in run["loaded"]}),
+        "budgets": {"import_ms": args.import_budget_ms, "startup_ms": args.startup_budget_ms},
+    }
+    
+    failures = []
+    if report["import"]["median_ms"] > args.import_budget_ms:
+        failures.append(f"import {report['import']['median_ms']}ms > {args.import_budget_ms}ms")
+    if report["startup"]["median_ms"] > args.startup_budget_ms:
+        failures.append(f"startup {report['startup']['median_ms']}ms > {args.startup_budget_ms}ms")
+    if report["deferred_modules_loaded"]:
+        failures.append(f"loaded at startup: {', '.join(report['deferred_modules_loaded'])}")
+    report["within_budget"] = not failures
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output)
+    for failure in failures:
+        print(f"Over budget: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
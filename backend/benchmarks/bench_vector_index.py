@@ -0,0 +1,140 @@
+"""
+Recall / latency / memory benchmark for LocalVectorIndex compression settings
+
+Builds synthetic corpora shaped like Gemini embeddings (low-rank signal plus
+noise, 768 dims), then compares every configuration against exact float32
+search. Real embeddings are not zero-mean, so each configuration also runs on
+a corpus offset by a shared direction (--offset) as well as a centred one.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_index --vectors 100000 --queries 200
+    python -m benchmarks.bench_vector_index --output results.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from app.services.local_vector_index import LocalVectorIndex
+
+DIMENSION = 768
+
+CONFIGURATIONS = [
+    {"quantization": "none", "pca_dim": 0},
+    {"quantization": "float16", "pca_dim": 0},
+    {"quantization": "int8", "pca_dim": 0},
+    {"quantization": "float16", "pca_dim": 256},
+    {"quantization": "int8", "pca_dim": 256},
+    {"quantization": "int8", "pca_dim": 128},
+]
+
+
+def synthetic_embeddings(count: int, rank: int, seed: int, offset: float = 0.0) -> np.ndarray:
+    """
+    Low-rank vectors plus isotropic noise, like real text embeddings
+    
+    offset adds a shared direction to every vector, with that many times the
+    median vector norm, so the corpus is not centred on the origin.
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, DIMENSION)).astype(np.float32)
+    weights = rng.standard_normal((count, rank)).astype(np.float32)
+    noise = 0.1 * rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    vectors = weights @ basis + noise
+    if offset:
+        direction = rng.standard_normal(DIMENSION).astype(np.float32)
+        direction /= np.linalg.norm(direction)
+        vectors += offset * float(np.median(np.linalg.norm(vectors, axis=1))) * direction
+    return vectors
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_configuration(config, corpus_name, corpus, queries, truth, k, rerank_factor, workdir):
+    index = LocalVectorIndex(
+        dimension=DIMENSION,
+        quantization=config["quantization"],
+        pca_dim=config["pca_dim"],
+        rerank_factor=rerank_factor,
+        full_precision_path=Path(workdir) / "vectors.f32"
+    )
+    ids = [str(i) for i in range(len(corpus))]
+    
+    start = time.perf_counter()
+    batch = 10000
+    for offset in range(0, len(corpus), batch):
+        index.add(ids[offset:offset + batch], corpus[offset:offset + batch])
+    build_seconds = time.perf_counter() - start
+    
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = index.search(query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len({int(r[0]) for r in results} & set(expected.tolist()))
+    
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "corpus": corpus_name,
+        **config,
+        "rerank_factor": rerank_factor,
+        "resident_mb": round(index.memory_bytes() / 1e6, 2),
+        "build_seconds": round(build_seconds, 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        f"recall_at_{k}": round(hits / (len(queries) * k), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--rank", type=int, default=96, help="latent rank of the synthetic corpus")
+    parser.add_argument("--offset", type=float, default=1.0,
+                        help="shared offset of the non-centred corpus, in median vector norms")
+    parser.add_argument("--output", type=Path, help="write JSON results to this file")
+    args = parser.parse_args()
+    
+    results = []
+    for corpus_name, offset in (("centred", 0.0), ("offset", args.offset)):
+        corpus = synthetic_embeddings(args.vectors, args.rank, seed=1, offset=offset)
+        queries = corpus[np.random.default_rng(2).choice(len(corpus), args.queries, replace=False)]
+        queries = queries + 0.05 * np.random.default_rng(3).standard_normal(queries.shape).astype(np.float32)
+        truth = exact_top_k(corpus, queries, args.top_k)
+        
+        with TemporaryDirectory() as workdir:
+            for config in CONFIGURATIONS:
+                result = run_configuration(
+                    config, corpus_name, corpus, queries, truth, args.top_k, args.rerank_factor, workdir
+                )
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+    
+    report = {
+        "benchmark": "vector_index",
+        "vectors": args.vectors,
+        "dimension": DIMENSION,
+        "queries": args.queries,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+End-to-end HTTP load test against local Gemini and Pinecone stand-ins
+
+Starts mock Gemini and Pinecone servers (see benchmarks/mock_upstreams.py),
+boots the API under uvicorn pointed at them (GEMINI_API_BASE, PINECONE_HOST)
+with a throwaway DATA_DIR, seeds a synthetic inbox, then drives a weighted
+mix of routes from concurrent virtual users:
+
+    list      GET  /api/emails/
+    generate  POST /api/drafts/generate
+    chat      POST /api/chat/query
+    ingest    POST /api/emails/ingest
+    autosave  POST /api/drafts/  (each user keeps saving its own draft)
+
+Reports throughput, error counts and latency percentiles per route as JSON,
+plus the calls each mock upstream served.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --duration 30 --concurrency 32
+    python -m benchmarks.load_test --gemini-latency-ms 800 --error-rate 0.05 --output load.json
+    python -m benchmarks.load_test --mix list=50,autosave=50 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.mock_upstreams import Faults, MockGemini, MockPinecone
+from benchmarks.synthetic import generate_inbox
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "list=35,generate=15,chat=15,ingest=5,autosave=30"
+
+CHAT_QUERIES = [
+    "What do I need to approve this week?",
+    "Summarize the latest project sync",
+    "Which emails are urgent?",
+    "Any newsletters about AI?",
+    "What deadlines are coming up?",
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route '{name}' (choose from {', '.join(ROUTES)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    """One simulated client issuing requests back to back"""
+
+    def __init__(self, client: httpx.AsyncClient, email_ids: List[str], rng: random.Random):
+        self.client = client
+        self.email_ids = email_ids
+        self.rng = rng
+        self.draft_id = None
+        self.draft_text = ""
+
+    async def list(self) -> httpx.Response:
+        return await self.client.get("/api/emails/")
+
+    async def generate(self) -> httpx.Response:
+        return await self.client.post("/api/drafts/generate", json={"emailId": self.rng.choice(self.email_ids)})
+
+    async def chat(self) -> httpx.Response:
+        return await self.client.post("/api/chat/query", json={"query": self.rng.choice(CHAT_QUERIES)})
+
+    async def ingest(self) -> httpx.Response:
+        return await self.client.post("/api/emails/ingest")
+
+    async def autosave(self) -> httpx.Response:
+        # Typing a little more between saves, like the editor's autosave
+        self.draft_text += self.rng.choice(["Thanks, ", "I will ", "review ", "this ", "today. "])
+        response = await self.client.post("/api/drafts/", json={
+            "id": self.draft_id,
+            "emailReferenceId": self.email_ids[0],
+            "emailSubject": "Re: load test",
+            "content": self.draft_text,
+        })
+        if response.status_code == 200:
+            self.draft_id = response.json()["id"]
+        return response
+
+
+ROUTES = {
+    "list": VirtualUser.list,
+    "generate": VirtualUser.generate,
+    "chat": VirtualUser.chat,
+    "ingest": VirtualUser.ingest,
+    "autosave": VirtualUser.autosave,
+}
+
+
+async def drive(base_url: str, email_ids: List[str], mix: Dict[str, float], args) -> Dict[str, dict]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + args.duration
+
+    async def user(n: int) -> None:
+        rng = random.Random(args.seed + n)
+        vu = VirtualUser(client, email_ids, rng)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await ROUTES[name](vu)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            statuses[name][status] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {}
+    for name in names:
+        values = sorted(latencies[name])
+        errors = sum(count for status, count in statuses[name].items() if not status.startswith("2"))
+        report[name] = {
+            "requests": len(values),
+            "errors": errors,
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 1),
+            "p90_ms": round(percentile(values, 90), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "max_ms": round(values[-1], 1) if values else 0.0,
+            "statuses": dict(statuses[name]),
+        }
+    total = sum(r["requests"] for r in report.values())
+    report["_total"] = {
+        "requests": total,
+        "errors": sum(r["errors"] for r in report.values()),
+        "rps": round(total / elapsed, 2),
+        "elapsed_s": round(elapsed, 2),
+    }
+    return report
+
+
+def start_app(args, gemini: MockGemini, pinecone: MockPinecone, data_dir: Path, log_file) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "load-test",
+        "PINECONE_API_KEY": "load-test",
+        "GEMINI_API_BASE": f"{gemini.url}/v1beta",
+        "PINECONE_HOST": pinecone.url,
+        "DATA_DIR": str(data_dir),
+    })
+    if not args.keep_limits:
+        # Measure the app, not the production quota ceilings
+        for name in ("GEMINI_GENERATE_RPS", "GEMINI_EMBED_RPS", "PINECONE_RPS"):
+            env[name] = "1000000"
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+
+
+async def wait_until_live(base_url: str, app: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if app.poll() is not None:
+                raise RuntimeError("API process exited during startup")
+            try:
+                if (await client.get("/health/live")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"API not live after {timeout}s")
+
+
+async def seed(base_url: str, emails: list) -> None:
+    """Upload the synthetic inbox and run one ingest so chat has an index"""
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        response = await client.post(
+            "/api/emails/upload", files={"file": ("inbox.json", json.dumps(emails), "application/json")}
+        )
+        response.raise_for_status()
+        response = await client.post("/api/emails/ingest")
+        response.raise_for_status()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load after seeding")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"Route weights (default {DEFAULT_MIX})")
+    parser.add_argument("--emails", type=int, default=500, help="Synthetic inbox size")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--gemini-latency-ms", type=float, default=300)
+    parser.add_argument("--pinecone-latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform +/- jitter on both upstreams")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of upstream calls answered 429")
+    parser.add_argument("--keep-limits", action="store_true", help="Keep the configured upstream rate limits")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    gemini = MockGemini(Faults(args.gemini_latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate)).start()
+    pinecone = MockPinecone(Faults(args.pinecone_latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate)).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+    emails = generate_inbox(args.emails, seed=args.seed)
+
+    with TemporaryDirectory() as workdir, open(Path(workdir) / "api.log", "w+") as log_file:
+        app = start_app(args, gemini, pinecone, Path(workdir), log_file)
+        try:
+            asyncio.run(wait_until_live(base_url, app))
+            print(f"Seeding {args.emails} emails...", file=sys.stderr)
+            asyncio.run(seed(base_url, emails))
+            # Count only the calls made under load
+            gemini.calls.clear()
+            pinecone.calls.clear()
+            print(f"Driving {args.concurrency} users for {args.duration}s...", file=sys.stderr)
+            routes = asyncio.run(drive(base_url, [e["id"] for e in emails], args.mix, args))
+        except Exception:
+            log_file.seek(0)
+            print(log_file.read()[-4000:], file=sys.stderr)
+            raise
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+            gemini.stop()
+            pinecone.stop()
+
+    report = {
+        "config": {
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "emails": args.emails,
+            "workers": args.workers,
+            "gemini": vars(gemini.faults),
+            "pinecone": vars(pinecone.faults),
+            "upstream_rate_limits": "configured" if args.keep_limits else "unlimited",
+        },
+        "routes": routes,
+        "upstream_calls": {"gemini": dict(gemini.calls), "pinecone": dict(pinecone.calls)},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
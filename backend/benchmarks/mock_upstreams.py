@@ -0,0 +1,201 @@
+"""
+Local HTTP servers emulating the Gemini REST API and a Pinecone index
+
+Answers come from the stand-ins in benchmarks/stand_ins.py, so the app talks
+real HTTP to them (GEMINI_API_BASE / PINECONE_HOST) with its production
+clients, pools and retry logic. Each server can add latency (with jitter) and
+inject 503 and 429 errors at a configurable rate.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from benchmarks import stand_ins
+
+
+@dataclass
+class Faults:
+    """Latency and error injection for one mock upstream"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0  # fraction answered 503
+    throttle_rate: float = 0.0  # fraction answered 429
+
+    def delay(self) -> None:
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def pick_failure(self) -> Optional[int]:
+        roll = random.random()
+        if roll < self.error_rate:
+            return 503
+        if roll < self.error_rate + self.throttle_rate:
+            return 429
+        return None
+
+
+class MockServer:
+    """Threaded HTTP server around a route(method, path, body) function"""
+
+    name = "mock"
+
+    def __init__(self, faults: Faults = None, host: str = "127.0.0.1", port: int = 0):
+        self.faults = faults or Faults()
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _handle(self):
+                length = int(self.headers.get("content-length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                status, payload, content_type = server.dispatch(self.command, self.path, raw)
+                self.send_response(status)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def dispatch(self, method: str, path: str, raw: bytes) -> Tuple[int, bytes, str]:
+        path, _, query = path.partition("?")
+        operation = self.operation(path)
+        self.faults.delay()
+        failure = self.faults.pick_failure()
+        with self._lock:
+            self.calls[f"{operation} {failure or 200}"] += 1
+        if failure:
+            return failure, json.dumps(self.error_body(failure)).encode(), "application/json"
+        body = json.loads(raw) if raw else {}
+        # GET parameters (repeatable ones, like fetch's ids, stay lists)
+        for name, values in parse_qs(query).items():
+            body[name] = values if name == "ids" else values[-1]
+        return self.route(method, path, body)
+
+    def operation(self, path: str) -> str:
+        return path
+
+    def error_body(self, status: int) -> Dict[str, Any]:
+        return {"error": {"code": status, "message": "Injected failure"}}
+
+    def route(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, bytes, str]:
+        raise NotImplementedError
+
+
+class MockGemini(MockServer):
+    """Gemini REST API (generateContent, streamGenerateContent, embeddings, models)"""
+
+    name = "mock-gemini"
+
+    def operation(self, path: str) -> str:
+        return path.rsplit(":", 1)[-1] if ":" in path else "getModel"
+
+    def error_body(self, status: int) -> Dict[str, Any]:
+        if status == 429:
+            return {"error": {
+                "code": 429,
+                "message": "Resource has been exhausted (injected)",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}],
+            }}
+        return {"error": {"code": 503, "message": "The model is overloaded (injected)", "status": "UNAVAILABLE"}}
+
+    def route(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, bytes, str]:
+        response = stand_ins.gemini_response(path, body)
+        return response.status_code, response.content, response.headers.get("content-type", "application/json")
+
+
+class MockPinecone(MockServer):
+    """Pinecone index data plane (upsert, query, delete, list, fetch, describe_index_stats), one index per namespace"""
+
+    name = "mock-pinecone"
+
+    def __init__(self, faults: Faults = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__(faults, host, port)
+        self.namespaces: Dict[str, stand_ins.StandInIndex] = {}
+        self._index_lock = threading.Lock()
+
+    def operation(self, path: str) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    def route(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, bytes, str]:
+        namespace = body.get("namespace", "")
+        with self._index_lock:
+            index = self.namespaces.get(namespace)
+            if index is None and path in ("/vectors/upsert", "/query"):
+                index = self.namespaces[namespace] = stand_ins.StandInIndex()
+            if path == "/vectors/upsert":
+                result = {"upsertedCount": index.upsert(body["vectors"])["upserted_count"]}
+            elif path == "/query":
+                matches = index.query(
+                    body["vector"], body.get("topK", 10), body.get("includeMetadata", False)
+                )["matches"]
+                result = {"matches": matches, "namespace": namespace}
+            elif path == "/vectors/list":
+                page = index.list_paginated(
+                    int(body.get("limit", 100)), body.get("paginationToken")
+                ) if index is not None else {"vectors": []}
+                result = {**page, "namespace": namespace}
+            elif path == "/vectors/fetch":
+                fetched = index.fetch(body.get("ids", [])) if index is not None else {"vectors": {}}
+                result = {**fetched, "namespace": namespace}
+            elif path == "/vectors/delete":
+                if index is None:
+                    return 404, json.dumps({"message": "Namespace not found"}).encode(), "application/json"
+                index.delete(ids=body.get("ids"), delete_all=body.get("deleteAll", False))
+                result = {}
+            elif path == "/describe_index_stats":
+                counts = {
+                    name: ns.describe_index_stats()["total_vector_count"] for name, ns in self.namespaces.items()
+                }
+                result = {
+                    "dimension": stand_ins.DIMENSION,
+                    "totalVectorCount": sum(counts.values()),
+                    "namespaces": {name: {"vectorCount": count} for name, count in counts.items()},
+                }
+            else:
+                return 404, json.dumps({"message": f"Unknown path {path}"}).encode(), "application/json"
+        return 200, json.dumps(result, default=_to_json).encode(), "application/json"
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
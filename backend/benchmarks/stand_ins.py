@@ -0,0 +1,201 @@
+"""
+Offline stand-ins for the Gemini and Pinecone backends
+
+The services run unchanged: Gemini calls go through the real GeminiClient
+(with an in-process httpx transport answering like the REST API) and vector
+calls through the real VectorService (with an in-memory index exposing the
+Pinecone Index methods it uses). Benchmarks therefore measure the app's own
+orchestration, not the network.
+"""
+import asyncio
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+
+DIMENSION = 768
+
+# Keyword rules standing in for the categorization model
+TAG_KEYWORDS = [
+    ("Urgent", ("urgent", "asap", "immediately", "critical", "deadline")),
+    ("To-Do", ("please review", "action item", "approve", "sign-off", "by end of", "rsvp")),
+    ("Newsletter", ("newsletter", "unsubscribe", "this week", "digest", "top stories")),
+]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def embed(text: str) -> List[float]:
+    """Deterministic hashed bag-of-words embedding (similar texts score higher)"""
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        h = zlib.crc32(token.encode())
+        vector[h % DIMENSION] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+
+def categorize(prompt: str) -> List[str]:
+    # Only look at the email itself, not the instructions around it
+    text = prompt.lower().split("subject:", 1)[-1].split("return only a json", 1)[0]
+    return [label for label, keywords in TAG_KEYWORDS if any(k in text for k in keywords)] or ["Other"]
+
+
+def gemini_response(path: str, body: Dict[str, Any]) -> httpx.Response:
+    """Answer one Gemini REST call the way the real API shapes it"""
+    if path.endswith(":generateContent") or path.endswith(":streamGenerateContent"):
+        prompt = body["contents"][0]["parts"][0]["text"]
+        if "Return ONLY a JSON" in prompt:
+            labels = categorize(prompt)
+            # Fast cascade tier asks for an object with a confidence score
+            text = json.dumps({"tags": labels, "confidence": 0.95} if '"confidence"' in prompt else labels)
+        else:
+            text = "Thanks for the update. I will review this and get back to you shortly."
+        payload = {
+            "candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+        }
+        if path.endswith(":streamGenerateContent"):
+            return httpx.Response(200, text=f"data: {json.dumps(payload)}\n\n",
+                                  headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=payload)
+    if path.endswith(":batchEmbedContents"):
+        return httpx.Response(200, json={"embeddings": [
+            {"values": embed(request["content"]["parts"][0]["text"])} for request in body["requests"]
+        ]})
+    if path.endswith(":embedContent"):
+        return httpx.Response(200, json={"embedding": {"values": embed(body["content"]["parts"][0]["text"])}})
+    if "/models/" in path:
+        return httpx.Response(200, json={"name": path.rsplit("/", 1)[-1]})
+    return httpx.Response(404, json={"error": {"code": 404, "message": f"Unknown path {path}"}})
+
+
+def gemini_transport(latency_ms: float = 0.0) -> httpx.MockTransport:
+    """In-process transport for GeminiClient, optionally adding per-call latency"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        body = json.loads(request.content) if request.content else {}
+        return gemini_response(request.url.path, body)
+    return httpx.MockTransport(handler)
+
+
+class StandInIndex:
+    """In-memory brute-force index with the Pinecone Index methods VectorService uses"""
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._metadata: List[Dict[str, Any]] = []
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._pending: List[np.ndarray] = []
+
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs) -> Dict[str, int]:
+        self.add(
+            [v["id"] for v in vectors],
+            np.asarray([v["values"] for v in vectors], dtype=np.float32),
+            [v.get("metadata", {}) for v in vectors]
+        )
+        return {"upserted_count": len(vectors)}
+
+    def add(self, ids: List[str], vectors: np.ndarray, metadata: List[Dict[str, Any]]) -> None:
+        """Bulk load without building per-vector dicts (used for large inboxes)"""
+        new_rows = []
+        for i, vector_id in enumerate(ids):
+            position = self._positions.get(vector_id)
+            if position is None:
+                self._positions[vector_id] = len(self._ids)
+                self._ids.append(vector_id)
+                self._metadata.append(metadata[i])
+                new_rows.append(i)
+            else:
+                self._flush()
+                self._vectors[position] = vectors[i]
+                self._metadata[position] = metadata[i]
+        if new_rows:
+            # Appended in one concatenate at the next query, not once per batch
+            self._pending.append(vectors[new_rows])
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._vectors = np.concatenate([self._vectors, *self._pending])
+            self._pending = []
+
+    def query(self, vector: List[float], top_k: int, include_metadata: bool = True, **kwargs) -> Dict[str, Any]:
+        self._flush()
+        if not self._ids:
+            return {"matches": []}
+        scores = self._vectors @ np.asarray(vector, dtype=np.float32)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return {"matches": [
+            {"id": self._ids[i], "score": float(scores[i]), "metadata": self._metadata[i] if include_metadata else {}}
+            for i in top
+        ]}
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, **kwargs) -> Dict:
+        self._flush()
+        if delete_all:
+            keep = []
+        else:
+            drop = {self._positions[i] for i in ids or [] if i in self._positions}
+            keep = [p for p in range(len(self._ids)) if p not in drop]
+        self._vectors = self._vectors[keep]
+        self._ids = [self._ids[p] for p in keep]
+        self._metadata = [self._metadata[p] for p in keep]
+        self._positions = {vector_id: p for p, vector_id in enumerate(self._ids)}
+        return {}
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        return {"dimension": self.dimension, "total_vector_count": len(self._ids)}
+
+    def list_paginated(self, limit: int = 100, pagination_token: str = None, **kwargs) -> Dict[str, Any]:
+        start = int(pagination_token or 0)
+        page = {"vectors": [{"id": vector_id} for vector_id in self._ids[start:start + limit]]}
+        if start + limit < len(self._ids):
+            page["pagination"] = {"next": str(start + limit)}
+        return page
+
+    def fetch(self, ids: List[str], **kwargs) -> Dict[str, Any]:
+        self._flush()
+        return {"vectors": {
+            vector_id: {
+                "id": vector_id,
+                "values": self._vectors[self._positions[vector_id]].tolist(),
+                "metadata": self._metadata[self._positions[vector_id]],
+            }
+            for vector_id in ids if vector_id in self._positions
+        }}
+
+
+def use_data_dir(settings, data_dir: Path) -> None:
+    """
+    Point every data file setting at data_dir
+
+    Must run before the services are first used: they read their paths from
+    settings when built.
+    """
+    default_dir = settings.DATA_DIR
+    for name in dir(settings):
+        value = getattr(settings, name)
+        if isinstance(value, Path) and value.parent == default_dir:
+            setattr(settings, name, data_dir / value.name)
+    settings.DATA_DIR = data_dir
+
+
+def install(gemini_client, vector_service, latency_ms: float = 0.0) -> StandInIndex:
+    """Swap the live backends of the (lazy) services for the stand-ins"""
+    gemini_client._client = httpx.AsyncClient(
+        base_url=gemini_client.base_url, transport=gemini_transport(latency_ms)
+    )
+    index = StandInIndex()
+    vector_service._index = index
+    return index
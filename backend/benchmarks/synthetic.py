@@ -0,0 +1,102 @@
+"""
+Synthetic inboxes modeled on sample2.json
+
+Emails are built from the sample's senders, subjects and bodies with
+per-email variation (IDs, dates, numbers, sentence order), so sizes from 1k
+to 1M keep the sample's field shapes and text lengths. Generation is
+deterministic for a given seed.
+"""
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+SAMPLE_FILE = REPO_ROOT / "sample2.json"
+
+# Used when sample2.json is not available (e.g. backend deployed on its own)
+FALLBACK_TEMPLATES = [
+    {
+        "sender": "Jessica Martinez",
+        "subject": "Budget Approval Required - Q1 Marketing Campaign",
+        "body": "Hi Team,\n\nI need your sign-off on the Q1 marketing budget before we can proceed."
+                "\n\nURGENT: Please review and approve by end of day Friday.\n\nBest,\nJessica",
+    },
+    {
+        "sender": "Tech Weekly",
+        "subject": "This Week in Tech: AI, Cloud and More",
+        "body": "Welcome to this week's newsletter.\n\nTop stories:\n- New AI models released"
+                "\n- Cloud pricing changes\n\nUnsubscribe at any time.",
+    },
+    {
+        "sender": "David Kim",
+        "subject": "Project Sync - Notes and Action Items",
+        "body": "Hi all,\n\nThanks for joining today's sync. Action items:\n- Update the roadmap"
+                "\n- Share the test plan by Wednesday\n\nDavid",
+    },
+]
+
+SUBJECT_SUFFIXES = ["", "", "", " (follow-up)", " - reminder", " [action needed]", " #{n}"]
+
+
+def load_templates() -> List[Dict[str, str]]:
+    if SAMPLE_FILE.exists():
+        with open(SAMPLE_FILE, encoding="utf-8") as f:
+            return [
+                {"sender": e["sender"], "subject": e["subject"], "body": e["body"]}
+                for e in json.load(f)
+            ]
+    return FALLBACK_TEMPLATES
+
+
+def iter_emails(count: int, seed: int = 0, days: int = 90, now: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Yield raw upload-format emails (id, sender, subject, body, timestamp)
+
+    Optional fields (senderAvatar, preview, read, tags) are left out so the
+    upload path has to fill them in, as it does for real uploads. Timestamps
+    fall in the `days` before `now` (default: the current time); pass a fixed
+    `now` for inboxes that must be identical between runs (e.g. cassettes).
+    """
+    rng = random.Random(seed)
+    templates = load_templates()
+    now = now or datetime.now(timezone.utc)
+    paragraphs = [template["body"].split("\n\n") for template in templates]
+
+    for i in range(count):
+        t = rng.randrange(len(templates))
+        template = templates[t]
+        parts = list(paragraphs[t])
+        if len(parts) > 3:
+            # Keep greeting and sign-off, shuffle the middle
+            middle = parts[1:-1]
+            rng.shuffle(middle)
+            parts = [parts[0], *middle, parts[-1]]
+        parts.insert(1, f"Ref #{rng.randrange(10_000, 99_999)} - {rng.choice(['re', 'fw', 'update', 'note'])} {i}")
+
+        suffix = rng.choice(SUBJECT_SUFFIXES).replace("{n}", str(rng.randrange(1, 50)))
+        timestamp = now - timedelta(seconds=rng.randrange(days * 86_400))
+        yield {
+            "id": f"s{i}",
+            "sender": template["sender"] if rng.random() < 0.8 else f"{template['sender']} ({rng.randrange(100)})",
+            "subject": template["subject"] + suffix,
+            "body": "\n\n".join(parts),
+            "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+
+
+def generate_inbox(count: int, seed: int = 0, now: Optional[datetime] = None) -> List[Dict]:
+    return list(iter_emails(count, seed, now=now))
+
+
+def write_upload_file(path: Path, count: int, seed: int = 0) -> Path:
+    """Write an upload JSON array without holding every email in memory"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, email in enumerate(iter_emails(count, seed)):
+            if i:
+                f.write(",")
+            json.dump(email, f, ensure_ascii=False)
+        f.write("]")
+    return path
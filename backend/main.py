@@ -1,10 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+import asyncio
+import time
 import uvicorn
 
 from app.config import settings
-from app.services import file_service, llm_service, vector_service
+from app.services import (
+    draft_flusher, file_service, gemini_client, health_monitor, llm_service, tenants, vector_service,
+    warm_up
+)
+from app.services import metrics, tracing
+from app.services.tenancy import validate_tenant_id
+from app.worker import WorkerPool
 from app import routers
 
 
@@ -27,6 +36,22 @@ async def lifespan(app: FastAPI):
         file_service.ensure_files_exist()
         print("✓ Data files initialized")
         
+        # Build services and connect to Pinecone without delaying startup
+        if settings.WARMUP_ON_STARTUP:
+            app.state.warm_up = asyncio.create_task(asyncio.to_thread(warm_up))
+        
+        # Dependency probes behind /health/ready
+        health_monitor.start()
+        
+        # Write autosaved drafts to disk in the background
+        if settings.DRAFT_WRITE_BEHIND:
+            draft_flusher.start()
+        
+        # Worker processes for queued background jobs
+        if settings.JOB_WORKERS > 0:
+            app.state.job_workers = WorkerPool(settings.JOB_WORKERS).start()
+            print(f"✓ Started {settings.JOB_WORKERS} job worker(s)")
+        
         print("=" * 60)
         print("✅ Server ready!")
         print(f"📚 API Docs: http://localhost:8000/docs")
@@ -41,6 +66,11 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("\n👋 Shutting down Email Assistant API...")
+    await health_monitor.stop()
+    await draft_flusher.stop()
+    if getattr(app.state, "job_workers", None) is not None:
+        await asyncio.to_thread(app.state.job_workers.stop)
+    await gemini_client.aclose()
 
 
 # Initialize FastAPI app
@@ -65,6 +95,105 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# ==================== Request Metrics ====================
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-endpoint latency histogram and in-flight gauge"""
+    metrics.http_in_flight.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.http_in_flight.dec()
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=_route_template(request),
+            status=str(status_code)
+        )
+
+
+def _route_template(request: Request) -> str:
+    """Label requests by route (/api/emails/{email_id}), not by raw path"""
+    if "route" not in request.scope:
+        return "unmatched"
+    params = {str(value): name for name, value in request.path_params.items()}
+    return "/".join(
+        "{" + params[segment] + "}" if segment in params else segment
+        for segment in request.url.path.split("/")
+    )
+
+# ==================== Request Tracing ====================
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Per-request spans (storage, prompts, Gemini, Pinecone) returned in a
+    Server-Timing header, optionally logged, and stack-sampled when slow
+    """
+    if not settings.TRACING_ENABLED:
+        return await call_next(request)
+    trace, token = tracing.start_trace()
+    sampler = tracing.maybe_start_profiler()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing(trace.elapsed_ms())
+        return response
+    finally:
+        total_ms = trace.elapsed_ms()
+        tracing.end_trace(token)
+        route = _route_template(request)
+        tracing.log_trace(trace, request.method, route, status_code, total_ms)
+        if sampler is not None:
+            await asyncio.to_thread(tracing.finish_profiler, sampler, request.method, route, total_ms)
+
+# ==================== Tenant Routing ====================
+@app.middleware("http")
+async def route_tenant(request: Request, call_next):
+    """
+    Point /api requests at the mailbox named by the tenant header
+    
+    Without the header requests use DEFAULT_TENANT (the top-level data
+    files), unless TENANT_REQUIRED is set.
+    """
+    if not request.url.path.startswith("/api"):
+        return await call_next(request)
+    tenant_id = request.headers.get(settings.TENANT_HEADER)
+    if tenant_id is None:
+        if settings.TENANT_REQUIRED:
+            return JSONResponse(
+                content={"detail": f"Missing {settings.TENANT_HEADER} header"}, status_code=400
+            )
+        tenant_id = settings.DEFAULT_TENANT
+    try:
+        validate_tenant_id(tenant_id)
+    except ValueError as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=400)
+    token = tenants.activate(tenant_id)
+    try:
+        response = await call_next(request)
+        # Streamed bodies (chat replies) still use the tenant's services after
+        # call_next returns: keep it from being evicted until they are sent
+        tenant = tenants.current()
+        tenants.hold(tenant)
+        response.body_iterator = _released_after(response.body_iterator, tenant)
+        return response
+    finally:
+        tenants.deactivate(token)
+
+
+async def _released_after(body, tenant):
+    """Pass the body through, then release the tenant held for it"""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        tenants.release(tenant)
+
 # ==================== Include Routers ====================
 app.include_router(
     routers.main_router,
@@ -84,10 +213,23 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "liveness": "/health/live",
+        "readiness": "/health/ready"
     }
 
 
+@app.get("/metrics", tags=["System"])
+async def get_metrics():
+    """
+    Metrics in Prometheus text format
+    
+    Endpoint and upstream latency histograms, token counts, cache hit/miss
+    counts, LLM fallbacks, upstream errors and in-flight gauges
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health", tags=["System"])
 async def health_check():
     """
@@ -97,12 +239,14 @@ async def health_check():
         # Check if files are accessible
         file_service.read_prompts()
         
+        # Upstream status from the last background probes (see /health/ready)
+        checks = health_monitor.readiness()["checks"]
         return {
             "status": "healthy",
             "services": {
                 "file_service": "operational",
-                "llm_service": "operational",
-                "vector_service": "operational"
+                "llm_service": checks["llm"]["status"],
+                "vector_service": checks["vector"]["status"]
             }
         }
     except Exception as e:
@@ -112,6 +256,30 @@ async def health_check():
         )
 
 
+
+@app.get("/health/live", tags=["System"])
+async def liveness():
+    """
+    Liveness probe: the process is up and its event loop is responsive
+    
+    Touches no dependency, so a failing upstream never gets a worker restarted
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", tags=["System"])
+async def readiness():
+    """
+    Readiness probe from cached background checks of the store, vector
+    backend and LLM backend (status, last-probe latency and error)
+    
+    Answers 503 until every check passes, or whenever one is failing or
+    stale, so load balancers route away from degraded workers. Never calls
+    an upstream itself.
+    """
+    report = health_monitor.readiness()
+    return JSONResponse(content=report, status_code=200 if report["ready"] else 503)
+
 # ==================== Run Server ====================
 if __name__ == "__main__":
     uvicorn.run(